@@ -0,0 +1,77 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+""" Compares the time it takes to load and parse a command with and without lazy subparser
+construction. Every sample runs in a fresh process and stops right after parsing.
+
+    python measure_parse.py [--loop N] [command ...]
+"""
+
+from __future__ import print_function
+
+import argparse
+import subprocess
+import sys
+
+
+_CHILD = """
+import sys
+import timeit
+from azure.cli.core.application import APPLICATION, Application, Configuration
+
+class _Parsed(Exception):
+    pass
+
+def _stop(**kwargs):
+    raise _Parsed()
+
+APPLICATION.initialize(Configuration())
+APPLICATION.parser.lazy = sys.argv[1] == 'lazy'
+APPLICATION.register(Application.COMMAND_PARSER_PARSED, _stop)
+start = timeit.default_timer()
+try:
+    APPLICATION.execute(sys.argv[2:])
+except _Parsed:
+    pass
+print(timeit.default_timer() - start)
+"""
+
+
+def mean(data):
+    return sum(data) / float(len(data))
+
+
+def pstdev(data):
+    c = mean(data)
+    return (sum((x - c) ** 2 for x in data) / len(data)) ** 0.5
+
+
+def measure(command, lazy, loop):
+    mode = 'lazy' if lazy else 'eager'
+    samples = []
+    for _ in range(loop):
+        output = subprocess.check_output([sys.executable, '-c', _CHILD, mode] + command.split())
+        samples.append(float(output.decode().split()[-1]))
+    print('Command: az {} ({})'.format(command, mode))
+    print('Parse: mean => {:.4f} \t pstdev => {:.4f}'.format(mean(samples), pstdev(samples)))
+    return mean(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--loop', type=int, default=10)
+    parser.add_argument('commands', nargs='*', default=['network vnet list'])
+    args = parser.parse_args()
+
+    for command in args.commands:
+        eager = measure(command, False, args.loop)
+        lazy = measure(command, True, args.loop)
+        print('Speedup: {:.2f}x'.format(eager / lazy))
+        print('')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+""" Measures the CPU time and peak memory of turning a command's result into output data
+(model conversion and result transforms) for a synthetic list of resources.
+
+    python measure_transform.py [--items N] [--loop N] [--query QUERY]
+"""
+
+from __future__ import print_function
+
+import argparse
+import gc
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from azure.mgmt.resource.resources.models import GenericResource, Plan, Sku, Identity
+
+from azure.cli.core.application import Application, Configuration
+from azure.cli.core.commands import CliCommand
+
+_ID = '/subscriptions/00000000-0000-0000-0000-000000000000/resourceGroups/group{}/providers/' \
+      'Microsoft.Compute/virtualMachines/vm{}'
+
+
+def _process_time():
+    return time.process_time() if hasattr(time, 'process_time') else time.clock()
+
+
+def build_resources(count):
+    resources = []
+    for i in range(count):
+        resource = GenericResource(location='westus', tags={'env': 'test', 'index': str(i)},
+                                   plan=Plan(name='plan', publisher='publisher',
+                                             product='product'),
+                                   properties={'provisioningState': 'Succeeded',
+                                               'x509Thumbprint': 'q80qOlLy6m0NsAqeWYUPJqyzUoo='},
+                                   kind='kind', managed_by=None,
+                                   sku=Sku(name='Standard_LRS', tier='Standard'),
+                                   identity=Identity())
+        resource.id = _ID.format(i % 100, i)
+        resource.name = 'vm{}'.format(i)
+        resource.type = 'Microsoft.Compute/virtualMachines'
+        resources.append(resource)
+    return resources
+
+
+def measure(resources, argv, trace_memory=False):
+    """ Returns the CPU seconds or, with `trace_memory`, the peak traced memory in bytes. """
+    command = CliCommand('bench list', lambda _: resources)
+    config = Configuration()
+    config.get_command_table = lambda argv: {'bench list': command}
+    application = Application(config)
+
+    gc.collect()
+    if trace_memory:
+        tracemalloc.start()
+        application.execute(argv)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak
+    start = _process_time()
+    application.execute(argv)
+    return _process_time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=50000)
+    parser.add_argument('--loop', type=int, default=3)
+    parser.add_argument('--query')
+    args = parser.parse_args()
+
+    resources = build_resources(args.items)
+    argv = ['bench', 'list'] + (['--query', args.query] if args.query else [])
+    times = [measure(resources, argv) for _ in range(args.loop)]
+    print('Items: {}'.format(args.items))
+    print('CPU seconds: min => {:.3f} \t max => {:.3f}'.format(min(times), max(times)))
+    # Tracing slows everything down, so memory is measured in a separate run
+    if tracemalloc:
+        peak = measure(resources, argv, trace_memory=True)
+        print('Peak memory: {:.1f} MiB'.format(peak / 1024.0 / 1024.0))
+
+
+if __name__ == '__main__':
+    main()
@@ -47,6 +47,7 @@ def show_help(nouns, parser, is_group):
 
     if len(nouns) == 0:
         print("\nFor version info, use 'az --version'")
+        print("To run many commands in one process, see 'az batch-run -h'")
         help_file.command = ''
 
     print_detailed_help(help_file)
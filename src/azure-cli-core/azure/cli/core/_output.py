@@ -9,10 +9,15 @@ import errno
 import sys
 import platform
 import json
+import re
 import traceback
+import types
 from collections import OrderedDict
+import six
 from six import StringIO, text_type, u, string_types
+from six.moves import zip
 import colorama
+import tabulate as tabulate_module
 from tabulate import tabulate
 
 from azure.cli.core.util import CLIError
@@ -20,6 +25,12 @@ import azure.cli.core.azlogging as azlogging
 
 logger = azlogging.get_az_logger(__name__)
 
+# Number of lines written at a time by the table and TSV writers
+_CHUNK_ROWS = 1000
+_PRINTABLE_ASCII = re.compile(r'[ -~]*\Z')
+# Padding tabulate adds to the width of headers
+_MIN_PADDING = getattr(tabulate_module, 'MIN_PADDING', 2)
+
 
 def _decode_str(output):
     if not isinstance(output, text_type):
@@ -35,12 +46,41 @@ class ComplexEncoder(json.JSONEncoder):
         return json.JSONEncoder.default(self, obj)
 
 
+def _dumps_json(data, **kwargs):
+    # OrderedDict.__dict__ is always '{}', to persist the data, convert to dict first.
+    input_dict = dict(data) if hasattr(data, '__dict__') else data
+    return json.dumps(input_dict, sort_keys=True, cls=ComplexEncoder, **kwargs)
+
+
+def _stream_json_array(items):
+    """ Writes the same text as format_json does for a list, one item at a time. If retrieving
+    the items fails, the array written so far is closed before the error is raised. """
+    separator = '[\n'
+    try:
+        for item in items:
+            text = _dumps_json(item, indent=2, separators=(',', ': '))
+            yield separator + '\n'.join('  ' + line for line in text.split('\n'))
+            separator = ',\n'
+    except Exception:  # pylint: disable=broad-except
+        exc_info = sys.exc_info()
+        if separator != '[\n':
+            yield '\n]\n'
+        six.reraise(*exc_info)
+    yield '[]\n' if separator == '[\n' else '\n]\n'
+
+
 def format_json(obj):
     result = obj.result
-    # OrderedDict.__dict__ is always '{}', to persist the data, convert to dict first.
-    input_dict = dict(result) if hasattr(result, '__dict__') else result
-    return json.dumps(input_dict, indent=2, sort_keys=True, cls=ComplexEncoder,
-                      separators=(',', ': ')) + '\n'
+    if isinstance(result, types.GeneratorType):
+        return _stream_json_array(result)
+    return _dumps_json(result, indent=2, separators=(',', ': ')) + '\n'
+
+
+def format_jsonl(obj):
+    """ Newline-delimited JSON: one line per item of a list result. """
+    result = obj.result
+    items = result if isinstance(result, (list, types.GeneratorType)) else [result]
+    return (_dumps_json(item, separators=(',', ':')) + '\n' for item in items)
 
 
 def format_json_color(obj):
@@ -61,7 +101,9 @@ def format_text(obj):
         return ''
 
 
-def format_table(obj):
+def stream_table(obj):
+    """ Returns the table as chunks of lines. The column widths are known before the first line
+    is produced, so the whole result has to be read first. """
     result = obj.result
     try:
         if obj.table_transformer and not obj.is_query_active:
@@ -69,7 +111,7 @@ def format_table(obj):
         result_list = result if isinstance(result, list) else [result]
         should_sort_keys = not obj.is_query_active and not obj.table_transformer
         to = TableOutput(should_sort_keys)
-        return to.dump(result_list)
+        return to.stream(result_list)
     except:
         logger.debug(traceback.format_exc())
         raise CLIError("Table output unavailable. "
@@ -77,18 +119,29 @@ def format_table(obj):
                        "Use --debug for more info.")
 
 
-def format_tsv(obj):
+def format_table(obj):
+    return ''.join(stream_table(obj))
+
+
+def stream_tsv(obj):
+    """ Returns the rows as chunks of lines. Streamed results are written an item at a time. """
     result = obj.result
-    result_list = result if isinstance(result, list) else [result]
-    return TsvOutput.dump(result_list)
+    if isinstance(result, types.GeneratorType):
+        return TsvOutput().stream(result, chunk_rows=1)
+    return TsvOutput().stream(result if isinstance(result, list) else [result])
+
+
+def format_tsv(obj):
+    return ''.join(stream_tsv(obj))
 
 
 class CommandResultItem(object):  # pylint: disable=too-few-public-methods
 
-    def __init__(self, result, table_transformer=None, is_query_active=False):
+    def __init__(self, result, table_transformer=None, is_query_active=False, exit_code=0):
         self.result = result
         self.table_transformer = table_transformer
         self.is_query_active = is_query_active
+        self.exit_code = exit_code
 
 
 class OutputProducer(object):  # pylint: disable=too-few-public-methods
@@ -96,9 +149,10 @@ class OutputProducer(object):  # pylint: disable=too-few-public-methods
     format_dict = {
         'json': format_json,
         'jsonc': format_json_color,
-        'table': format_table,
+        'jsonl': format_jsonl,
+        'table': stream_table,
         'text': format_text,
-        'tsv': format_tsv,
+        'tsv': stream_tsv,
     }
 
     def __init__(self, formatter, file=sys.stdout):  # pylint: disable=redefined-builtin
@@ -109,28 +163,123 @@ class OutputProducer(object):  # pylint: disable=too-few-public-methods
         if platform.system() == 'Windows':
             self.file = colorama.AnsiToWin32(self.file).stream
         output = self.formatter(obj)
+        if isinstance(output, string_types):
+            self._write(output)
+            return
+        # Streamed output is written as it is produced
+        for chunk in output:
+            if not self._write(chunk):
+                break
+            self.file.flush()
+
+    def _write(self, output):
+        """ Returns False if the reader went away. """
         try:
             print(output, file=self.file, end='')
         except IOError as ex:
             if ex.errno == errno.EPIPE:
-                pass
+                return False
             else:
                 raise
         except UnicodeEncodeError:
             print(output.encode('ascii', 'ignore').decode('utf-8', 'ignore'),
                   file=self.file, end='')
+        return True
 
     @staticmethod
     def get_formatter(format_type):
         return OutputProducer.format_dict.get(format_type)
 
 
+def _text_width(text):
+    """ The width tabulate gives `text`. """
+    wcwidth = getattr(tabulate_module, 'wcwidth', None)
+    if wcwidth is None or not getattr(tabulate_module, 'WIDE_CHARS_MODE', False) or \
+            _PRINTABLE_ASCII.match(text):
+        return len(text)
+    return wcwidth.wcswidth(text)
+
+
+def _is_text(value):
+    """ Whether tabulate formats `value` as text, which makes its whole column a text column. """
+    if value is None or isinstance(value, (bool, float) + six.integer_types):
+        return False
+    if hasattr(value, 'isoformat'):
+        return True
+    if isinstance(value, six.binary_type) or \
+            (isinstance(value, string_types) and value in ('True', 'False')):
+        return False
+    try:
+        float(value)
+        return False
+    except (TypeError, ValueError):
+        return True
+
+
+def _tabulate_column(header, values):
+    """ Lays out a column that is not plain text (numbers, booleans) with tabulate. Columns are
+    laid out independently, so a table of one column gives the header and cells of the column in
+    the whole table. """
+    lines = tabulate([[value] for value in values], headers=[header],
+                     tablefmt='simple').split('\n')
+    width = len(lines[1])
+    cells = [line + ' ' * (width - _text_width(line)) for line in [lines[0]] + lines[2:]]
+    return cells[0], width, cells[1:]
+
+
+def _format_table_columns(headers, columns):
+    """ Lays out the columns the way tabulate's "simple" format does and returns the header cells,
+    the column widths and the padded columns. Text columns, the common case, are formatted
+    without checking the type of every cell. Returns None if a cell has ANSI escape codes or
+    several lines. """
+    header_cells = []
+    widths = []
+    for index, (header, values) in enumerate(zip(headers, columns)):
+        header = text_type(header)
+        if '\x1b' in header or '\n' in header:
+            return None
+        min_width = _text_width(header) + _MIN_PADDING
+        if any(_is_text(value) for value in values):
+            cells = ['' if value is None else '{0}'.format(value).strip() for value in values]
+            joined = ''.join(cells)
+            if '\x1b' in joined or '\n' in joined:
+                return None
+            cell_widths = [len(cell) for cell in cells] if _PRINTABLE_ASCII.match(joined) else \
+                [_text_width(cell) for cell in cells]
+            column_width = max(max(cell_widths), min_width)
+            cells = [cell + ' ' * (column_width - width) for cell, width in zip(cells, cell_widths)]
+            header_cell = header + ' ' * (column_width - _text_width(header))
+        else:
+            if any(isinstance(value, string_types) and ('\x1b' in value or '\n' in value)
+                   for value in values):
+                return None
+            header_cell, column_width, cells = _tabulate_column(header, values)
+        columns[index] = cells
+        header_cells.append(header_cell)
+        widths.append(column_width)
+    return header_cells, widths, columns
+
+
+def _join_lines(header_cells, widths, columns):
+    yield '  '.join(header_cells).rstrip() + '\n' + \
+        '  '.join(['-' * width for width in widths]).rstrip() + '\n'
+    lines = []
+    for row in zip(*columns):
+        lines.append('  '.join(row).rstrip())
+        if len(lines) >= _CHUNK_ROWS:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
 class TableOutput(object):  # pylint: disable=too-few-public-methods
 
     SKIP_KEYS = ['id', 'type', 'etag']
 
     def __init__(self, should_sort_keys=False):
         self.should_sort_keys = should_sort_keys
+        self._column_names = {}
 
     @staticmethod
     def _capitalize_first_char(x):
@@ -143,8 +292,12 @@ class TableOutput(object):  # pylint: disable=too-few-public-methods
             for k in keys:
                 if k in TableOutput.SKIP_KEYS:
                     continue
-                if item[k] and not isinstance(item[k], (list, dict, set)):
-                    new_entry[TableOutput._capitalize_first_char(k)] = item[k]
+                value = item[k]
+                if value and not isinstance(value, (list, dict, set)):
+                    name = self._column_names.get(k)
+                    if name is None:
+                        name = self._column_names[k] = TableOutput._capitalize_first_char(k)
+                    new_entry[name] = value
         except AttributeError:
             # handles odd cases where a string/bool/etc. is returned
             if isinstance(item, list):
@@ -163,12 +316,38 @@ class TableOutput(object):  # pylint: disable=too-few-public-methods
         else:
             return self._auto_table_item(result)
 
+    def _columns(self, data):
+        """ Returns the headers and the column values of the rows in the order tabulate uses. """
+        headers = []
+        columns = {}
+        for count, item in enumerate(data):
+            for key, value in self._auto_table_item(item).items():
+                column = columns.get(key)
+                if column is None:
+                    headers.append(key)
+                    column = columns[key] = [None] * count
+                column.extend([None] * (count - len(column)))
+                column.append(value)
+        count = len(data)
+        for column in columns.values():
+            column.extend([None] * (count - len(column)))
+        return headers, [columns.pop(h) for h in headers]
+
+    def stream(self, data):
+        if not data:
+            return iter(['\n'])
+        headers, columns = self._columns(data)
+        table = _format_table_columns(headers, columns) if headers else None
+        if table is None:
+            # Not a plain table: let tabulate work out the layout
+            table_str = tabulate(self._auto_table(data), headers="keys", tablefmt="simple")
+            if table_str == '\n':
+                raise ValueError('Unable to extract fields for table.')
+            return iter([table_str + '\n'])
+        return _join_lines(*table)
+
     def dump(self, data):
-        table_data = self._auto_table(data)
-        table_str = tabulate(table_data, headers="keys", tablefmt="simple") if table_data else ''
-        if table_str == '\n':
-            raise ValueError('Unable to extract fields for table.')
-        return table_str + '\n'
+        return ''.join(self.stream(data))
 
 
 class TextOutput(object):
@@ -202,54 +381,56 @@ class TextOutput(object):
 
 class TsvOutput(object):  # pylint: disable=too-few-public-methods
 
+    def __init__(self):
+        # The column order of the last dictionary, reused while the keys stay the same
+        self._keys = None
+        self._key_set = None
+
     @staticmethod
-    def _dump_obj(data, stream):
+    def _dump_obj(data):
         if isinstance(data, list):
-            stream.write(str(len(data)))
+            return str(len(data))
         elif isinstance(data, dict):
             # We need to print something to avoid mismatching
             # number of columns if the value is None for some instances
             # and a dictionary value in other...
-            stream.write('')
-        else:
-            to_write = data if isinstance(data, string_types) else str(data)
-            stream.write(to_write)
-
-    @staticmethod
-    def _dump_row(data, stream):
-        separator = ''
-        if isinstance(data, dict) or isinstance(data, list):
+            return ''
+        return data if isinstance(data, string_types) else str(data)
+
+    def _sorted_values(self, data):
+        keys = six.viewkeys(data)
+        if keys != self._key_set:
+            self._keys = sorted(data)
+            self._key_set = set(self._keys)
+        return [data[key] for key in self._keys]
+
+    def _dump_row(self, data):
+        if isinstance(data, (dict, list)):
             if isinstance(data, OrderedDict):
                 values = data.values()
             elif isinstance(data, dict):
-                values = [value for _, value in sorted(data.items())]
+                values = self._sorted_values(data)
             else:
                 values = data
 
             # Iterate through the items either sorted by key value (if dict) or in the order
             # they were added (in the cases of an ordered dict) in order to make the output
             # stable
-            for value in values:
-                stream.write(separator)
-                TsvOutput._dump_obj(value, stream)
-                separator = '\t'
-        elif isinstance(data, list):
-            for value in data:
-                stream.write(separator)
-                TsvOutput._dump_obj(value, stream)
-                separator = '\t'
+            return '\t'.join([TsvOutput._dump_obj(value) for value in values]) + '\n'
         elif isinstance(data, bool):
-            TsvOutput._dump_obj(str(data).lower(), stream)
-        else:
-            TsvOutput._dump_obj(data, stream)
-        stream.write('\n')
+            return TsvOutput._dump_obj(str(data).lower()) + '\n'
+        return TsvOutput._dump_obj(data) + '\n'
 
-    @staticmethod
-    def dump(data):
-        io = StringIO()
+    def stream(self, data, chunk_rows=_CHUNK_ROWS):
+        lines = []
         for item in data:
-            TsvOutput._dump_row(item, io)
+            lines.append(self._dump_row(item))
+            if len(lines) >= chunk_rows:
+                yield ''.join(lines)
+                lines = []
+        if lines:
+            yield ''.join(lines)
 
-        result = io.getvalue()
-        io.close()
-        return result
+    @staticmethod
+    def dump(data):
+        return ''.join(TsvOutput().stream(data))
@@ -9,12 +9,13 @@ import collections
 import errno
 import json
 import os.path
+import threading
 from copy import deepcopy
 from enum import Enum
 
 import azure.cli.core.azlogging as azlogging
 from azure.cli.core._environment import get_config_dir
-from azure.cli.core._session import ACCOUNT
+from azure.cli.core._session import ACCOUNT, file_lock, get_file_stamp, write_file_atomic
 from azure.cli.core.util import CLIError, get_file_json
 from azure.cli.core.cloud import get_active_cloud, set_cloud_subscription, init_known_clouds
 
@@ -55,6 +56,22 @@ TOKEN_FIELDS_EXCLUDED_FROM_PERSISTENCE = ['familyName',
 _CLIENT_ID = '04b07795-8ddb-461a-bbee-02f9e1bf7b46'
 _COMMON_TENANT = 'common'
 
+# Tokens that expire within this many seconds are refreshed in the background by processes that
+# run many commands, see refresh_tokens_ahead_of_expiry. ADAL refreshes them itself, while the
+# command waits, in the last 5 minutes.
+_TOKEN_REFRESH_AHEAD = 10 * 60
+# At exit, a refresh that is not done by then is dropped
+_TOKEN_REFRESH_TIMEOUT = 1
+_refresh_ahead = False
+
+
+def refresh_tokens_ahead_of_expiry():
+    """ Makes this process refresh tokens that expire soon in the background. Only for processes
+    that run many commands, like batch-run and interactive mode: a single command would rather
+    exit than wait for the refresh. """
+    global _refresh_ahead  # pylint: disable=global-statement
+    _refresh_ahead = True
+
 
 def _authentication_context_factory(authority, cache):
     import adal
@@ -80,6 +97,21 @@ def _load_tokens_from_file(file_path):
     return all_entries
 
 
+def _get_token_file_stamp(file_path):
+    try:
+        return get_file_stamp(os.stat(file_path))
+    except OSError:
+        return None
+
+
+def _save_tokens_to_file(file_path, merge):
+    """ Replaces the token file with `merge(entries in the file)` while holding its lock. Returns
+    the stamp of the new file. """
+    with file_lock(file_path + '.lock'):
+        entries = merge(_load_tokens_from_file(file_path))
+        return write_file_atomic(file_path, json.dumps(entries).encode('utf-8'))
+
+
 def _delete_file(file_path):
     try:
         os.remove(file_path)
@@ -474,6 +506,115 @@ class SubscriptionFinder(object):
         return all_subscriptions
 
 
+def _get_token_key(entry):
+    return tuple((entry.get(field) or '').lower()
+                 for field in ('_authority', 'resource', '_clientId', _TOKEN_ENTRY_USER_ID))
+
+
+class TokenStore(object):
+    '''The AAD tokens of the token file, in place of adal.TokenCache. Entries are kept by
+    authority, resource, client and user and indexed by user and client for ADAL's lookups.
+    The entries added or removed since the file was read are tracked, so they can be applied to
+    the file as it is when it is saved.'''
+
+    def __init__(self, entries=None):
+        self._lock = threading.RLock()
+        self._entries = collections.OrderedDict()
+        self._index = {}
+        self._changes = collections.OrderedDict()
+        self.has_state_changed = False
+        self._set_entries(entries or [])
+
+    def _set_entries(self, entries):
+        self._entries.clear()
+        self._index.clear()
+        for entry in entries:
+            self._put(_get_token_key(entry), entry)
+
+    def _put(self, key, entry):
+        self._entries[key] = entry
+        self._index.setdefault((key[3], key[2]), collections.OrderedDict())[key] = entry
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            bucket = self._index[(key[3], key[2])]
+            del bucket[key]
+            if not bucket:
+                del self._index[(key[3], key[2])]
+
+    def find(self, query):
+        is_mrrt = query.get('isMRRT')
+        user_id = query.get(_TOKEN_ENTRY_USER_ID)
+        client_id = query.get('_clientId')
+        with self._lock:
+            if user_id is not None and client_id is not None:
+                candidates = self._index.get((user_id.lower(), client_id.lower()), {}).values()
+            else:
+                candidates = [e for k, e in self._entries.items()
+                              if (user_id is None or user_id.lower() == k[3]) and
+                              (client_id is None or client_id.lower() == k[2])]
+            return [e for e in candidates if is_mrrt is None or is_mrrt == e.get('isMRRT')]
+
+    def add(self, entries):
+        with self._lock:
+            for entry in entries:
+                key = _get_token_key(entry)
+                self._put(key, entry)
+                self._changes[key] = entry
+            self.has_state_changed = True
+
+    def remove(self, entries):
+        with self._lock:
+            for entry in entries:
+                key = _get_token_key(entry)
+                self._pop(key)
+                self._changes[key] = None
+            self.has_state_changed = True
+
+    def replace(self, old_entry, new_entry):
+        with self._lock:
+            if self._entries.get(_get_token_key(old_entry)) is not old_entry:
+                # Replaced in the meantime
+                return False
+            self.remove([old_entry])
+            self.add([new_entry])
+            return True
+
+    def read_items(self):
+        with self._lock:
+            return list(self._entries.items())
+
+    def serialize(self):
+        with self._lock:
+            return json.dumps(list(self._entries.values()))
+
+    def deserialize(self, state):
+        with self._lock:
+            self._set_entries(json.loads(state) if state else [])
+
+    def apply_changes(self, entries):
+        '''Returns `entries` (e.g. the tokens in the file) with the changes of this store.'''
+        with self._lock:
+            merged = collections.OrderedDict((_get_token_key(e), e) for e in entries)
+            for key, entry in self._changes.items():
+                if entry is None:
+                    merged.pop(key, None)
+                else:
+                    merged[key] = entry
+            return list(merged.values())
+
+    def update(self, entries):
+        '''Replaces the entries with `entries` (e.g. the tokens in the file) while keeping the
+        changes that have not been saved.'''
+        with self._lock:
+            self._set_entries(self.apply_changes(entries))
+
+    def clear_changes(self):
+        with self._lock:
+            self._changes.clear()
+
+
 class CredsCache(object):
     '''Caches AAD tokena and service principal secrets, and persistence will
     also be handled
@@ -483,10 +624,15 @@ class CredsCache(object):
         # AZURE_ACCESS_TOKEN_FILE is used by Cloud Console and not meant to be user configured
         self._token_file = (os.environ.get('AZURE_ACCESS_TOKEN_FILE', None) or
                             os.path.join(get_config_dir(), 'accessTokens.json'))
+        self._token_file_stamp = None
         self._service_principal_creds = []
+        # service principal creds added (or None when removed) since the file was read
+        self._service_principal_changes = collections.OrderedDict()
         self._auth_ctx_factory = auth_ctx_factory or _AUTH_CTX_FACTORY
+        self._auth_contexts = {}
         self._adal_token_cache_attr = None
         self._should_flush_to_disk = False
+        self._refresh_threads = {}
         self._async_persist = async_persist
         if async_persist:
             import atexit
@@ -499,31 +645,113 @@ class CredsCache(object):
         self.adal_token_cache.has_state_changed = False
 
     def flush_to_disk(self):
+        for thread in list(self._refresh_threads.values()):
+            thread.join(_TOKEN_REFRESH_TIMEOUT)
         if self._should_flush_to_disk:
-            with os.fdopen(os.open(self._token_file, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600),
-                           'w+') as cred_file:
-                items = self.adal_token_cache.read_items()
-                all_creds = [entry for _, entry in items]
-
-                # trim away useless fields (needed for cred sharing with xplat)
-                for i in all_creds:
-                    for key in TOKEN_FIELDS_EXCLUDED_FROM_PERSISTENCE:
-                        i.pop(key, None)
-
-                all_creds.extend(self._service_principal_creds)
-                cred_file.write(json.dumps(all_creds))
+            self._should_flush_to_disk = False
+            self._token_file_stamp = _save_tokens_to_file(self._token_file, self._merge_changes)
+
+    def _merge_changes(self, all_entries):
+        """ Applies the changes of this process to the entries in the token file, so the tokens
+        other processes saved meanwhile are kept. """
+        token_cache = self.adal_token_cache
+        tokens = [x for x in all_entries if not x.get(_SERVICE_PRINCIPAL_ID)]
+        sp_creds = [x for x in all_entries if x.get(_SERVICE_PRINCIPAL_ID)]
+        token_cache.update(tokens)
+        token_cache.clear_changes()
+        self._service_principal_creds = self._apply_service_principal_changes(sp_creds)
+        self._service_principal_changes.clear()
+
+        # trim away useless fields (needed for cred sharing with xplat)
+        all_creds = []
+        for _, entry in token_cache.read_items():
+            entry = dict(entry)
+            for key in TOKEN_FIELDS_EXCLUDED_FROM_PERSISTENCE:
+                entry.pop(key, None)
+            all_creds.append(entry)
+        return all_creds + self._service_principal_creds
+
+    def _apply_service_principal_changes(self, sp_creds):
+        merged = collections.OrderedDict(
+            ((x[_SERVICE_PRINCIPAL_ID], x.get(_SERVICE_PRINCIPAL_TENANT)), x) for x in sp_creds)
+        for key, entry in self._service_principal_changes.items():
+            merged.pop(key, None)
+            if entry is not None:
+                merged[key] = entry
+        return list(merged.values())
+
+    def _reload_if_changed(self):
+        """ Picks up the tokens other processes saved since the token file was read. """
+        stamp = _get_token_file_stamp(self._token_file)
+        if stamp == self._token_file_stamp:
+            return
+        all_entries = _load_tokens_from_file(self._token_file)
+        self._token_file_stamp = stamp
+        self.adal_token_cache.update([x for x in all_entries if not x.get(_SERVICE_PRINCIPAL_ID)])
+        self._service_principal_creds = self._apply_service_principal_changes(
+            [x for x in all_entries if x.get(_SERVICE_PRINCIPAL_ID)])
+
+    def _get_auth_context(self, authority):
+        # contexts are kept so the authority is validated once per process
+        context = self._auth_contexts.get(authority)
+        if context is None:
+            context = self._auth_ctx_factory(authority, cache=self.adal_token_cache)
+            self._auth_contexts[authority] = context
+        return context
 
     def retrieve_token_for_user(self, username, tenant, resource):
         authority = get_authority_url(tenant)
-        context = self._auth_ctx_factory(authority, cache=self.adal_token_cache)
+        self.load_adal_token_cache()
+        self._reload_if_changed()
+        context = self._get_auth_context(authority)
         token_entry = context.acquire_token(resource, username, _CLIENT_ID)
         if not token_entry:
             raise CLIError("Could not retrieve token from local cache, please run 'az login'.")
 
         if self.adal_token_cache.has_state_changed:
             self.persist_cached_creds()
+        if self._async_persist and _refresh_ahead:
+            self._refresh_ahead_of_expiry(authority, username, resource)
         return (token_entry[_TOKEN_ENTRY_TOKEN_TYPE], token_entry[_ACCESS_TOKEN])
 
+    def _refresh_ahead_of_expiry(self, authority, username, resource):
+        """ Starts refreshing a token that expires soon, so the next command does not wait for
+        ADAL to refresh it. """
+        import datetime
+        import dateutil.parser
+        import dateutil.tz
+
+        key = _get_token_key({'_authority': authority, 'resource': resource,
+                              '_clientId': _CLIENT_ID, _TOKEN_ENTRY_USER_ID: username})
+        entry = dict(self.adal_token_cache.read_items()).get(key)
+        if not entry or not entry.get('refreshToken') or key in self._refresh_threads:
+            return
+        try:
+            expires_on = dateutil.parser.parse(entry['expiresOn'])
+        except (KeyError, TypeError, ValueError):
+            return
+        now = datetime.datetime.now(expires_on.tzinfo and dateutil.tz.tzlocal())
+        if (expires_on - now).total_seconds() > _TOKEN_REFRESH_AHEAD:
+            return
+        thread = threading.Thread(target=self._refresh_token, args=(entry,))
+        thread.daemon = True
+        self._refresh_threads[key] = thread
+        thread.start()
+
+    def _refresh_token(self, entry):
+        try:
+            # without a cache, so ADAL does not change the entries while commands use them
+            context = self._auth_ctx_factory(entry['_authority'], cache=None)
+            new_token = context.acquire_token_with_refresh_token(entry['refreshToken'],
+                                                                 _CLIENT_ID, entry['resource'])
+        except Exception as ex:  # pylint: disable=broad-except
+            logger.debug("Failed to refresh the token for '%s': %s", entry['resource'], ex)
+            return
+        refreshed = dict(entry)
+        refreshed.update(new_token)
+        if self.adal_token_cache.replace(entry, refreshed):
+            self._should_flush_to_disk = True
+
     def retrieve_token_for_service_principal(self, sp_id, resource):
         self.load_adal_token_cache()
         matched = [x for x in self._service_principal_creds if sp_id == x[_SERVICE_PRINCIPAL_ID]]
@@ -551,11 +779,11 @@ class CredsCache(object):
 
     def load_adal_token_cache(self):
         if self._adal_token_cache_attr is None:
-            import adal
+            self._token_file_stamp = _get_token_file_stamp(self._token_file)
             all_entries = _load_tokens_from_file(self._token_file)
             self._load_service_principal_creds(all_entries)
             real_token = [x for x in all_entries if x not in self._service_principal_creds]
-            self._adal_token_cache_attr = adal.TokenCache(json.dumps(real_token))
+            self._adal_token_cache_attr = TokenStore(real_token)
         return self._adal_token_cache_attr
 
     def save_service_principal_cred(self, sp_entry):
@@ -566,16 +794,18 @@ class CredsCache(object):
         state_changed = False
         if matched:
             # pylint: disable=line-too-long
-            if (sp_entry.get(_ACCESS_TOKEN, None) != getattr(matched[0], _ACCESS_TOKEN, None) or
-                    sp_entry.get(_SERVICE_PRINCIPAL_CERT_FILE, None) != getattr(matched[0], _SERVICE_PRINCIPAL_CERT_FILE, None)):
+            if (sp_entry.get(_ACCESS_TOKEN, None) != matched[0].get(_ACCESS_TOKEN, None) or
+                    sp_entry.get(_SERVICE_PRINCIPAL_CERT_FILE, None) != matched[0].get(_SERVICE_PRINCIPAL_CERT_FILE, None)):
                 self._service_principal_creds.remove(matched[0])
-                self._service_principal_creds.append(matched[0])
+                self._service_principal_creds.append(sp_entry)
                 state_changed = True
         else:
             self._service_principal_creds.append(sp_entry)
             state_changed = True
 
         if state_changed:
+            key = (sp_entry[_SERVICE_PRINCIPAL_ID], sp_entry[_SERVICE_PRINCIPAL_TENANT])
+            self._service_principal_changes[key] = sp_entry
             self.persist_cached_creds()
 
     def _load_service_principal_creds(self, creds):
@@ -599,6 +829,9 @@ class CredsCache(object):
             state_changed = True
             self._service_principal_creds = [x for x in self._service_principal_creds
                                              if x not in matched]
+            for x in matched:
+                key = (x[_SERVICE_PRINCIPAL_ID], x.get(_SERVICE_PRINCIPAL_TENANT))
+                self._service_principal_changes[key] = None
 
         if state_changed:
             self.persist_cached_creds()
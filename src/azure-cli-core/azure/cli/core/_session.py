@@ -3,57 +3,207 @@
 # Licensed under the MIT License. See License.txt in the project root for license information.
 # --------------------------------------------------------------------------------------------
 
+import copy
 import json
 import os
+import tempfile
+import threading
 import time
+from contextlib import contextmanager
 try:
     import collections.abc as collections
 except ImportError:
     import collections
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt  # pylint: disable=import-error
 
 from codecs import open as codecs_open
 
 
+def get_file_stamp(stat_result):
+    # Files are replaced rather than rewritten, so a new inode also means new content
+    return stat_result.st_mtime, stat_result.st_size, stat_result.st_ino
+
+
+def replace_file(source, destination):
+    if hasattr(os, 'replace'):
+        os.replace(source, destination)  # pylint: disable=no-member
+    else:
+        if os.name == 'nt' and os.path.exists(destination):
+            os.remove(destination)
+        os.rename(source, destination)
+
+
+@contextmanager
+def file_lock(path):
+    """ Advisory lock shared by every process that writes the file. """
+    with open(path, 'a') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except (OSError, IOError):
+                    # LK_LOCK gives up after 10 seconds
+                    pass
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def write_file_atomic(path, content):
+    """ Replaces the file with `content` (bytes) so readers see either the old or the new file.
+    The file keeps its permissions. A new file is only accessible by the user. Returns the stamp
+    of the new file. """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                     prefix=os.path.basename(path) + '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+            f.flush()
+            stamp = get_file_stamp(os.fstat(f.fileno()))
+        try:
+            os.chmod(temp_path, os.stat(path).st_mode & 0o777)
+        except OSError:
+            pass
+        replace_file(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return stamp
+
+
 class Session(collections.MutableMapping):
     '''A simple dict-like class that is backed by a JSON file.
 
     All direct modifications will save the file. Indirect modifications should
-    be followed by a call to `save_with_retry` or `save`.
+    be followed by a call to `save_with_retry` or `save`. Use `batch` to save
+    several modifications at once.
+
+    The file is replaced atomically and writers take an advisory lock on
+    `<filename>.lock`, so concurrent processes never see a partly written file.
     '''
 
     def __init__(self, encoding=None):
         self.filename = None
         self.data = {}
         self._encoding = encoding if encoding else 'utf-8-sig'
+        self._stamp = None
+        self._lock = threading.RLock()
+        self._lock_depth = 0
+        self._batch_depth = 0
 
     def load(self, filename, max_age=0):
+        if filename != self.filename:
+            self._stamp = None
         self.filename = filename
-        self.data = {}
         try:
             if max_age > 0:
                 st = os.stat(self.filename)
                 if st.st_mtime + max_age < time.clock():
+                    self.data = {}
                     self.save()
-            with codecs_open(self.filename, 'r', encoding=self._encoding) as f:
-                self.data = json.load(f)
+            self._read()
         except (OSError, IOError):
+            self.data = {}
             self.save()
 
-    def save(self):
-        if self.filename:
-            with codecs_open(self.filename, 'w', encoding=self._encoding) as f:
-                json.dump(self.data, f)
+    def _read(self):
+        """ Reads the file unless it is unchanged since it was last read or written. """
+        with codecs_open(self.filename, 'r', encoding=self._encoding) as f:
+            stamp = get_file_stamp(os.fstat(f.fileno()))
+            if stamp != self._stamp:
+                self.data = json.load(f)
+                self._stamp = stamp
 
-    def save_with_retry(self, retries=5):
+    def reload(self):
+        """ Picks up changes made by other processes. Waits for a batch of another thread. """
+        if self.filename:
+            with self._lock:
+                try:
+                    self._read()
+                except (OSError, IOError):
+                    pass
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            if self._lock_depth:
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+            with file_lock(self.filename + '.lock'):
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+
+    @contextmanager
+    def batch(self):
+        '''Holds the file lock and saves the file once, when the outermost batch ends
+        without an error. Changes made by other processes are read first. An error discards
+        the changes of the outermost batch.'''
+        if not self.filename:
+            yield self
+            return
+        with self._locked():
+            snapshot = None
+            if not self._batch_depth:
+                self.reload()
+                snapshot = copy.deepcopy(self.data)
+            self._batch_depth += 1
+            try:
+                yield self
+            except BaseException:
+                if snapshot is not None:
+                    self.data = snapshot
+                raise
+            finally:
+                self._batch_depth -= 1
+            if not self._batch_depth:
+                self._write_with_retry()
+
+    def _write(self):
+        self._stamp = write_file_atomic(self.filename,
+                                        json.dumps(self.data).encode(self._encoding))
+
+    def _write_with_retry(self, retries=5):
         for _ in range(retries - 1):
             try:
-                self.save()
+                self._write()
                 break
             except OSError:
                 time.sleep(0.1)
         else:
-            self.save()
+            self._write()
+
+    def save(self):
+        # A batch saves the file when it ends
+        if self.filename and not self._batch_depth:
+            with self._locked():
+                self._write()
+
+    def save_with_retry(self, retries=5):
+        if self.filename and not self._batch_depth:
+            with self._locked():
+                self._write_with_retry(retries)
 
     def get(self, key, default=None):
         return self.data.get(key, default)
@@ -62,12 +212,12 @@ class Session(collections.MutableMapping):
         return self.data.setdefault(key, {})
 
     def __setitem__(self, key, value):
-        self.data[key] = value
-        self.save_with_retry()
+        with self.batch():
+            self.data[key] = value
 
     def __delitem__(self, key):
-        del self.data[key]
-        self.save_with_retry()
+        with self.batch():
+            del self.data[key]
 
     def __iter__(self):
         return iter(self.data)
@@ -84,3 +234,15 @@ CONFIG = Session()
 
 # SESSION provides read-write session variables
 SESSION = Session()
+
+# INDEX maps top-level command names to the command modules that register them
+INDEX = Session()
+
+# TELEMETRY caches the telemetry properties that stay the same from one command to the next
+TELEMETRY = Session()
+
+# PROVIDERS caches the API versions of resource providers' resource types per subscription
+PROVIDERS = Session()
+
+# COMPLETIONS caches the values of completers that list resources
+COMPLETIONS = Session()
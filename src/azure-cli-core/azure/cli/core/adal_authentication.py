@@ -3,6 +3,8 @@
 # Licensed under the MIT License. See License.txt in the project root for license information.
 # --------------------------------------------------------------------------------------------
 
+import threading
+
 import requests
 import adal
 
@@ -11,13 +13,53 @@ from msrest.authentication import Authentication
 from azure.cli.core.util import CLIError
 
 
+# Large enough for the connections of commands run with --max-parallel
+_POOL_MAXSIZE = 32
+_adapters = {}
+_adapters_lock = threading.Lock()
+
+
+class _SharedHTTPAdapter(requests.adapters.HTTPAdapter):
+    """ An adapter whose connection pool outlives the sessions it is mounted on. """
+
+    def close(self):
+        pass
+
+
+def _get_shared_adapter(max_retries):
+    # The SDK creates a session for every request. Mounting the same adapter on all of them
+    # keeps connections alive between requests instead of opening a new TLS connection for
+    # each one. Adapters are shared between equivalent retry policies.
+    key = (type(max_retries), tuple(sorted((k, repr(v)) for k, v in vars(max_retries).items())))
+    with _adapters_lock:
+        adapter = _adapters.get(key)
+        if adapter is None:
+            adapter = _SharedHTTPAdapter(pool_maxsize=_POOL_MAXSIZE, max_retries=max_retries)
+            _adapters[key] = adapter
+        return adapter
+
+
+class _PooledSession(requests.Session):
+    """ Session that sends requests through the process-wide connection pools. """
+
+    def mount(self, prefix, adapter):
+        if type(adapter) is requests.adapters.HTTPAdapter:  # pylint: disable=unidiomatic-typecheck
+            adapter = _get_shared_adapter(adapter.max_retries)
+        super(_PooledSession, self).mount(prefix, adapter)
+
+    def close(self):
+        for adapter in self.adapters.values():
+            if not isinstance(adapter, _SharedHTTPAdapter):
+                adapter.close()
+
+
 class AdalAuthentication(Authentication):  # pylint: disable=too-few-public-methods
 
     def __init__(self, token_retriever):
         self._token_retriever = token_retriever
 
     def signed_session(self):
-        session = super(AdalAuthentication, self).signed_session()
+        session = _PooledSession()
 
         try:
             scheme, token = self._token_retriever()
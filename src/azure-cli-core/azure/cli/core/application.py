@@ -6,6 +6,7 @@
 from collections import defaultdict
 import sys
 import os
+import types
 import uuid
 import argparse
 from azure.cli.core.parser import AzCliCommandParser, enable_autocomplete
@@ -16,11 +17,14 @@ import azure.cli.core.azlogging as azlogging
 from azure.cli.core.util import todict, truncate_text, CLIError, read_file_content
 from azure.cli.core._config import az_config
 
+import azure.cli.core.profiler as profiler
 import azure.cli.core.telemetry as telemetry
 
 logger = azlogging.get_az_logger(__name__)
 
 ARGCOMPLETE_ENV_NAME = '_ARGCOMPLETE'
+# Output formats that can be written while the result is still being retrieved
+STREAMING_OUTPUT_FORMATS = ('json', 'jsonl', 'tsv')
 
 
 class Configuration(object):  # pylint: disable=too-few-public-methods
@@ -30,6 +34,7 @@ class Configuration(object):  # pylint: disable=too-few-public-methods
 
     def __init__(self):
         self.output_format = None
+        self.max_parallel = 1
 
     def get_command_table(self, argv=None):  # pylint: disable=no-self-use
         import azure.cli.core.commands as commands
@@ -105,13 +110,17 @@ class Application(object):
 
     def __init__(self, configuration=None):
         self._event_handlers = defaultdict(lambda: [])
+        self._result_transforms = []
         self.session = {
             'headers': {
                 'x-ms-client-request-id': str(uuid.uuid1())
             },
             'command': 'unknown',
             'completer_active': ARGCOMPLETE_ENV_NAME in os.environ,
-            'query_active': False
+            'query_active': False,
+            'stream_result': False,
+            # The management credentials of the command, by requested subscription
+            'mgmt_credentials': {}
         }
 
         # Register presence of and handlers for global parameters
@@ -121,24 +130,50 @@ class Application(object):
         # Let other extensions make their presence known
         azure.cli.core.extensions.register_extensions(self)
 
+        self.global_parser = None
+        self.parser = None
+        self._create_parsers()
+        self.configuration = configuration
+
+    def _create_parsers(self):
+        # The defaults of the global arguments come from the configuration
         self.global_parser = AzCliCommandParser(prog='az', add_help=False)
         global_group = self.global_parser.add_argument_group('global', 'Global Arguments')
         self.raise_event(self.GLOBAL_PARSER_CREATED, global_group=global_group)
-
-        self.parser = AzCliCommandParser(prog='az', parents=[self.global_parser])
-        self.configuration = configuration
+        self.parser = AzCliCommandParser(prog='az', parents=[self.global_parser], lazy=True)
 
     def initialize(self, configuration):
         self.configuration = configuration
 
-    def execute(self, unexpanded_argv):  # pylint: disable=too-many-statements
+    def reset(self):
+        '''Discard the state of the last command executed so that another command
+        can be executed by the same process. The global arguments get the defaults of the
+        current configuration.
+        '''
+        self.session.update({
+            'headers': {
+                'x-ms-client-request-id': str(uuid.uuid1())
+            },
+            'command': 'unknown',
+            'query_active': False,
+            'stream_result': False,
+            'mgmt_credentials': {}
+        })
+        self._create_parsers()
+
+    def execute(self, unexpanded_argv, stream_output=False):  # pylint: disable=too-many-statements
+        '''Execute a command. With `stream_output`, the result of a command that returns a
+        paged list may be a generator that retrieves and converts items while it is iterated.
+        '''
         argv = Application._expand_file_prefixed_files(unexpanded_argv)
-        command_table = self.configuration.get_command_table(argv)
-        self.raise_event(self.COMMAND_TABLE_LOADED, command_table=command_table)
-        self.parser.load_command_table(command_table)
-        self.raise_event(self.COMMAND_PARSER_LOADED, parser=self.parser)
+        with profiler.phase('command_table'):
+            command_table = self.configuration.get_command_table(argv)
+            self.raise_event(self.COMMAND_TABLE_LOADED, command_table=command_table)
+            self.parser.load_command_table(command_table)
+            self.raise_event(self.COMMAND_PARSER_LOADED, parser=self.parser)
 
         if len(argv) == 0:
+            self.parser.load_pending_commands()
             enable_autocomplete(self.parser)
             az_subparser = self.parser.subparsers[tuple()]
             _help.show_welcome(az_subparser)
@@ -165,22 +200,27 @@ class Application(object):
         command = ' '.join(nouns)
 
         if argv[-1] in ('--help', '-h') or command in command_table:
-            self.configuration.load_params(command)
-            self.raise_event(self.COMMAND_TABLE_PARAMS_LOADED, command_table=command_table)
-            self.parser.load_command_table(command_table)
+            with profiler.phase('params'):
+                self.configuration.load_params(command)
+                self.raise_event(self.COMMAND_TABLE_PARAMS_LOADED, command_table=command_table)
+                self.parser.load_command_table(command_table)
 
         if self.session['completer_active']:
             enable_autocomplete(self.parser)
 
         self.raise_event(self.COMMAND_PARSER_PARSING, argv=argv)
-        args = self.parser.parse_args(argv)
+        with profiler.phase('parse'):
+            args = self.parser.parse_args(argv)
 
         self.raise_event(self.COMMAND_PARSER_PARSED, command=args.command, args=args)
-        results = []
+        iterated_args = sorted(key for key, value in vars(args).items()
+                               if isinstance(value, IterateValue))
+        invocations = []
         for expanded_arg in _explode_list_args(args):
             self.session['command'] = expanded_arg.command
             try:
-                _validate_arguments(expanded_arg)
+                with profiler.phase('validators'):
+                    _validate_arguments(expanded_arg)
             except CLIError:
                 raise
             except:  # pylint: disable=bare-except
@@ -200,27 +240,88 @@ class Application(object):
             telemetry.set_command_details(expanded_arg.command,
                                           self.configuration.output_format,
                                           [p for p in unexpanded_argv if p.startswith('-')])
-
-            result = expanded_arg.func(params)
-            result = todict(result)
-            results.append(result)
-
-        if len(results) == 1:
+            invocations.append((expanded_arg, params))
+
+        self.session['invocation_count'] = len(invocations)
+        # Streaming is only possible when the whole result does not have to be seen at once
+        self.session['stream_result'] = stream_output and len(invocations) == 1 and \
+            self.configuration.output_format in STREAMING_OUTPUT_FORMATS and \
+            not self.session['query_active']
+
+        exit_code = 0
+        with profiler.phase('handler'):
+            if len(invocations) == 1:
+                expanded_arg, params = invocations[0]
+                result = expanded_arg.func(params)
+                if not isinstance(result, types.GeneratorType):
+                    results = [self.todict(result)]
+                elif self.session['stream_result']:
+                    results = [self._stream_result(result)]
+                else:
+                    results = [self.todict(list(result))]
+            else:
+                # Invocations for the values of --ids (or other IterateValue arguments) are
+                # independent. Run them all and report every failure rather than just the first.
+                results = []
+                max_parallel = self.configuration.max_parallel
+                if _may_prompt(invocations[0][1]):
+                    # Don't put several confirmation prompts on the terminal at once
+                    max_parallel = 1
+                outcomes = _execute_invocations(invocations, max_parallel, self.todict)
+                for (expanded_arg, _), (result, ex) in zip(invocations, outcomes):
+                    if ex is None:
+                        results.append(result)
+                        continue
+                    exit_code = 1
+                    telemetry.set_exception(ex, 'iterated-invocation-failure')
+                    values = ', '.join('{}={}'.format(key, getattr(expanded_arg, key))
+                                       for key in iterated_args)
+                    logger.error('%s: %s', values,
+                                 ex.args[0] if isinstance(ex, CLIError) and ex.args else ex)
+
+        if len(invocations) == 1:
             results = results[0]
 
         event_data = {'result': results}
-        self.raise_event(self.TRANSFORM_RESULT, event_data=event_data)
-        self.raise_event(self.FILTER_RESULT, event_data=event_data)
+        if not isinstance(results, types.GeneratorType):
+            with profiler.phase('transforms'):
+                self.raise_event(self.TRANSFORM_RESULT, event_data=event_data)
+                self.raise_event(self.FILTER_RESULT, event_data=event_data)
 
         return CommandResultItem(event_data['result'],
                                  table_transformer=command_table[args.command].table_transformer,
-                                 is_query_active=self.session['query_active'])
+                                 is_query_active=self.session['query_active'],
+                                 exit_code=exit_code)
+
+    def register_result_transform(self, transform):
+        '''Register a callable that is applied to every object (dictionary) of a command's
+        result while the result is converted, in a single pass over the result.
+
+        param: transform: Function that takes two parameters;
+          key: the key the object is stored under in its parent object, or None
+          obj: `dict` to transform in place
+        '''
+        self._result_transforms.append(transform)
+
+    def _transform_result_object(self, key, obj):
+        for transform in self._result_transforms:
+            transform(key, obj)
+
+    def todict(self, result):
+        '''Convert a command's result to output data, applying the result transforms.'''
+        return todict(result, self._transform_result_object if self._result_transforms else None)
+
+    def _stream_result(self, items):
+        for item in items:
+            event_data = {'result': self.todict(item)}
+            self.raise_event(self.TRANSFORM_RESULT, event_data=event_data)
+            self.raise_event(self.FILTER_RESULT, event_data=event_data)
+            yield event_data['result']
 
     def raise_event(self, name, **kwargs):
         '''Raise the event `name`.
         '''
-        data = truncate_text(str(kwargs), width=500)
-        logger.debug("Application event '%s' with event data %s", name, data)
+        logger.debug("Application event '%s' with event data %s", name, _EventData(kwargs))
         for func in list(self._event_handlers[name]):  # Make copy in case handler modifies the list
             func(**kwargs)
 
@@ -252,7 +353,7 @@ class Application(object):
     def _register_builtin_arguments(**kwargs):
         global_group = kwargs['global_group']
         global_group.add_argument('--output', '-o', dest='_output_format',
-                                  choices=['json', 'tsv', 'table', 'jsonc'],
+                                  choices=['json', 'tsv', 'table', 'jsonc', 'jsonl'],
                                   default=az_config.get('core', 'output', fallback='json'),
                                   help='Output format',
                                   type=str.lower)
@@ -261,6 +362,13 @@ class Application(object):
                                   help='Increase logging verbosity. Use --debug for full debug logs.')  # pylint: disable=line-too-long
         global_group.add_argument('--debug', dest='_log_verbosity_debug', action='store_true',
                                   help='Increase logging verbosity to show all debug logs.')
+        global_group.add_argument('--max-parallel', dest='_max_parallel', metavar='N',
+                                  type=_positive_int,
+                                  default=az_config.getint('core', 'max_parallel', fallback=1),
+                                  help='Maximum number of resources to operate on at the same '
+                                       'time when more than one is given, e.g. with --ids. '
+                                       'Commands that ask for confirmation operate on one at a '
+                                       'time unless --yes is given.')
 
     @staticmethod
     def _maybe_load_file(arg):
@@ -302,6 +410,20 @@ class Application(object):
         args = kwargs['args']
         self.configuration.output_format = args._output_format  # pylint: disable=protected-access
         del args._output_format
+        self.configuration.max_parallel = args._max_parallel  # pylint: disable=protected-access
+        del args._max_parallel
+
+
+class _EventData(object):  # pylint: disable=too-few-public-methods
+    '''Formats event data only when a log handler emits the record. Formatting can be expensive,
+    e.g. the repr of a parser loads the command description, which imports the SDK.
+    '''
+
+    def __init__(self, data):
+        self.data = data
+
+    def __str__(self):
+        return truncate_text(str(self.data), width=500)
 
 
 def _validate_arguments(args, **_):
@@ -336,6 +458,44 @@ def _explode_list_args(args):
             yield new_ns
 
 
+def _may_prompt(params):
+    '''Whether the handler asks for confirmation: it has a --yes argument that is not given
+    and prompts are not disabled in the configuration.
+    '''
+    return 'yes' in params and not params['yes'] and \
+        not az_config.getboolean('core', 'disable_confirm_prompt', fallback=False)
+
+
+def _execute_invocations(invocations, max_parallel, convert):
+    '''Run the handlers of the expanded invocations of a command, at most `max_parallel` at
+    a time. Returns a (result converted with `convert`, exception) pair per invocation, in the
+    order given.
+    '''
+    def _execute(invocation):
+        expanded_arg, params = invocation
+        try:
+            return convert(expanded_arg.func(params)), None
+        except Exception as ex:  # pylint: disable=broad-except
+            logger.debug('Invocation failed', exc_info=True)
+            return None, ex
+
+    if max_parallel <= 1:
+        return [_execute(invocation) for invocation in invocations]
+    from multiprocessing.pool import ThreadPool
+    pool = ThreadPool(min(max_parallel, len(invocations)))
+    try:
+        return pool.map(_execute, invocations)
+    finally:
+        pool.close()
+
+
+def _positive_int(value):
+    result = int(value)
+    if result < 1:
+        raise ValueError('must be at least 1')
+    return result
+
+
 class IterateAction(argparse.Action):  # pylint: disable=too-few-public-methods
     '''Action used to collect argument values in an IterateValue list
     The application will loop through each value in the IterateValue
@@ -356,6 +516,7 @@ class IterateValue(list):
     pass
 
 
-APPLICATION = Application()
+with profiler.phase('application_init'):
+    APPLICATION = Application()
 
 telemetry.set_application(APPLICATION, ARGCOMPLETE_ENV_NAME)
@@ -6,6 +6,7 @@
 from __future__ import print_function
 
 import json
+import os
 import pkgutil
 import re
 import sys
@@ -126,33 +127,48 @@ class CliCommandArgument(object):
 
 class LongRunningOperation(object):  # pylint: disable=too-few-public-methods
 
-    def __init__(self, start_msg='', finish_msg='', poller_done_interval_ms=1000.0):
+    def __init__(self, start_msg='', finish_msg='', poller_done_interval_ms=1000.0,
+                 poller_done_max_interval_ms=5000.0):
         self.start_msg = start_msg
         self.finish_msg = finish_msg
         self.poller_done_interval_ms = poller_done_interval_ms
+        self.poller_done_max_interval_ms = poller_done_max_interval_ms
 
-    def _delay(self):
-        time.sleep(self.poller_done_interval_ms / 1000.0)
+    def _wait(self, poller, correlation):
+        from azure.cli.core.commands.polling import Backoff, get_scheduler
+
+        def _poll():
+            if correlation[0] is None:
+                correlation[0] = _get_correlation_id(poller)
+            return poller.done(), None
+
+        backoff = Backoff(self.poller_done_interval_ms / 1000.0,
+                          max(self.poller_done_interval_ms,
+                              self.poller_done_max_interval_ms) / 1000.0)
+        job = get_scheduler().submit(_poll, backoff)
+        try:
+            # msrestazure pollers signal completion, so it is seen without waiting for a poll
+            poller.add_done_callback(lambda _: job.poll_now())
+        except (AttributeError, ValueError):
+            pass
+        job.wait()
 
     def __call__(self, poller):
         from msrest.exceptions import ClientException
         logger.info("Starting long running operation '%s'", self.start_msg)
-        correlation_message = ''
-        while not poller.done():
-            try:
-                # pylint: disable=protected-access
-                correlation_id = json.loads(
-                    poller._response.__dict__['_content'])['properties']['correlationId']
+        # The correlation ID is parsed from the poller's response until it is found
+        correlation = [None]
 
-                correlation_message = 'Correlation ID: {}'.format(correlation_id)
-            except:  # pylint: disable=bare-except
-                pass
+        def _get_correlation_message():
+            if correlation[0] is None:
+                correlation[0] = _get_correlation_id(poller)
+            return 'Correlation ID: {}'.format(correlation[0]) if correlation[0] else ''
 
-            try:
-                self._delay()
-            except KeyboardInterrupt:
-                logger.error('Long running operation wait cancelled.  %s', correlation_message)
-                raise
+        try:
+            self._wait(poller, correlation)
+        except KeyboardInterrupt:
+            logger.error('Long running operation wait cancelled.  %s', _get_correlation_message())
+            raise
         try:
             result = poller.result()
         except ClientException as client_exception:
@@ -169,7 +185,7 @@ class LongRunningOperation(object):  # pylint: disable=too-few-public-methods
             except:  # pylint: disable=bare-except
                 pass
 
-            cli_error = CLIError('{}  {}'.format(message, correlation_message))
+            cli_error = CLIError('{}  {}'.format(message, _get_correlation_message()))
             # capture response for downstream commands (webapp) to dig out more details
             setattr(cli_error, 'response', getattr(client_exception, 'response', None))
             raise cli_error
@@ -179,6 +195,14 @@ class LongRunningOperation(object):  # pylint: disable=too-few-public-methods
         return result
 
 
+def _get_correlation_id(poller):
+    try:
+        # pylint: disable=protected-access
+        return json.loads(poller._response.__dict__['_content'])['properties']['correlationId']
+    except:  # pylint: disable=bare-except
+        return None
+
+
 # pylint: disable=too-few-public-methods
 class DeploymentOutputLongRunningOperation(LongRunningOperation):
     def __call__(self, result):
@@ -217,7 +241,7 @@ class CliCommand(object):  # pylint:disable=too-many-instance-attributes
 
     def __init__(self, name, handler, description=None, table_transformer=None,
                  arguments_loader=None, description_loader=None,
-                 formatter_class=None, deprecate_info=None):
+                 formatter_class=None, deprecate_info=None, cache_arguments=False):
         self.name = name
         self.handler = handler
         self.help = None
@@ -229,6 +253,9 @@ class CliCommand(object):  # pylint:disable=too-many-instance-attributes
         self.table_transformer = table_transformer
         self.formatter_class = formatter_class
         self.deprecate_info = deprecate_info
+        # Whether the resolved arguments can be persisted and later used in place of calling
+        # arguments_loader. Only safe if loading the arguments has no side effects.
+        self.cache_arguments = cache_arguments
 
     @staticmethod
     def _should_load_description():
@@ -261,10 +288,14 @@ class CliCommand(object):  # pylint:disable=too-many-instance-attributes
                     overrides.settings.get('metavar', None) == 'NAME'):
                 return
             setattr(arg.type, 'configured_default_applied', True)
-            config_value = az_config.get(DEFAULTS_SECTION, def_config, None)
-            if config_value:
-                overrides.settings['default'] = config_value
-                overrides.settings['required'] = False
+
+    def apply_configured_defaults(self):
+        for arg in self.arguments.values():
+            if getattr(arg.type, 'configured_default_applied', False):
+                config_value = az_config.get(DEFAULTS_SECTION, arg.type.default_name_tooling, None)
+                if config_value:
+                    arg.type.settings['default'] = config_value
+                    arg.type.settings['required'] = False
 
     def execute(self, **kwargs):
         return self(**kwargs)
@@ -285,24 +316,110 @@ command_module_map = {}
 
 
 def load_params(command):
+    from azure.cli.core.commands._argument_cache import get_cached_arguments, cache_arguments
     try:
-        command_table[command].load_arguments()
+        cmd = command_table[command]
     except KeyError:
         return
     command_module = command_module_map.get(command, None)
+    if cmd.cache_arguments:
+        cached_arguments = get_cached_arguments(command, command_module)
+        if cached_arguments is not None:
+            logger.debug("Loaded arguments for '%s' from the argument cache.", command)
+            cmd.arguments.update(cached_arguments)
+            cmd.apply_configured_defaults()
+            return
+    cmd.load_arguments()
     if not command_module:
         logger.debug("Unable to load commands for '%s'. No module in command module map found.",
                      command)  # pylint: disable=line-too-long
         return
     module_to_load = command_module[:command_module.rfind('.')]
     import_module(module_to_load).load_params(command)
-    _apply_parameter_info(command, command_table[command])
+    _apply_parameter_overrides(command, cmd)
+    if cmd.cache_arguments:
+        # Cache the arguments before any defaults from the config file are applied
+        cache_arguments(command, command_module, cmd.arguments)
+    cmd.apply_configured_defaults()
+
+
+def get_module_mtime(path):
+    """ Returns the latest modification time of the directory `path` and the files in it. """
+    try:
+        return max([os.path.getmtime(path)] +
+                   [os.path.getmtime(os.path.join(path, f)) for f in os.listdir(path)])
+    except OSError:
+        return None
+
+
+def _get_installed_command_modules():
+    """ Returns an OrderedDict of installed command module name -> modification time of its
+    package directory. Discovering the modules does not import them. """
+    installed_command_modules = OrderedDict()
+    try:
+        mods_ns_pkg = import_module('azure.cli.command_modules')
+        for importer, modname, _ in pkgutil.iter_modules(mods_ns_pkg.__path__):
+            if modname in BLACKLISTED_MODS:
+                continue
+            try:
+                mtime = get_module_mtime(os.path.join(importer.path, modname))
+            except AttributeError:
+                mtime = None
+            installed_command_modules[modname] = mtime
+    except ImportError:
+        pass
+    return installed_command_modules
+
+
+def _get_command_index_stamp(installed_command_modules):
+    from azure.cli.core import __version__ as core_version
+    return {'coreVersion': core_version, 'modules': dict(installed_command_modules)}
+
+
+def _get_modules_from_index(module_name, installed_command_modules):
+    """ Looks up the command modules that register commands under the top-level command
+    `module_name` in the persisted command index. Returns None if the index is missing, stale or
+    has no entry for the command. """
+    from azure.cli.core._session import INDEX
+    if not module_name or \
+            INDEX.get('stamp') != _get_command_index_stamp(installed_command_modules):
+        return None
+    modules = INDEX.get('commandIndex', {}).get(module_name)
+    if not modules or any(mod not in installed_command_modules for mod in modules):
+        return None
+    return modules
+
+
+def _build_command_index():
+    """ Builds a mapping of top-level command -> command modules from the loaded commands. """
+    prefix = 'azure.cli.command_modules.'
+    command_index = defaultdict(list)
+    for name, module_name in command_module_map.items():
+        if not module_name or not module_name.startswith(prefix):
+            continue
+        mod = module_name[len(prefix):].split('.')[0]
+        top_level_command = name.split()[0]
+        if mod not in command_index[top_level_command]:
+            command_index[top_level_command].append(mod)
+    return command_index
+
+
+def _update_command_index(installed_command_modules):
+    from azure.cli.core._session import INDEX
+    INDEX.data['stamp'] = _get_command_index_stamp(installed_command_modules)
+    INDEX.data['commandIndex'] = _build_command_index()
+    try:
+        INDEX.save_with_retry()
+    except (OSError, IOError) as ex:
+        logger.debug("Unable to save the command index: %s", ex)
 
 
 def get_command_table(module_name=None):
     '''Loads command table(s)
     When `module_name` is specified, only commands from that module will be loaded.
-    If the module is not found, all commands are loaded.
+    If the module is not found, the command index is used to find the modules that register
+    commands under that name. If the index cannot answer, all commands are loaded and the
+    index is rebuilt.
     '''
     loaded = False
     if module_name and module_name not in BLACKLISTED_MODS:
@@ -311,21 +428,18 @@ def get_command_table(module_name=None):
             logger.debug("Successfully loaded command table from module '%s'.", module_name)
             loaded = True
         except ImportError:
-            logger.debug("Loading all installed modules as module with name '%s' not found.", module_name)  # pylint: disable=line-too-long
+            logger.debug("Module with name '%s' not found. Checking the command index.", module_name)  # pylint: disable=line-too-long
         except Exception:  # pylint: disable=broad-except
             pass
     if not loaded:
-        installed_command_modules = []
-        try:
-            mods_ns_pkg = import_module('azure.cli.command_modules')
-            installed_command_modules = [modname for _, modname, _ in
-                                         pkgutil.iter_modules(mods_ns_pkg.__path__)
-                                         if modname not in BLACKLISTED_MODS]
-        except ImportError:
-            pass
-        logger.debug('Installed command modules %s', installed_command_modules)
+        installed_command_modules = _get_installed_command_modules()
+        logger.debug('Installed command modules %s', list(installed_command_modules))
+        indexed_modules = _get_modules_from_index(module_name, installed_command_modules)
+        if indexed_modules:
+            logger.debug("Command index maps '%s' to modules %s", module_name, indexed_modules)
+        load_failed = False
         cumulative_elapsed_time = 0
-        for mod in installed_command_modules:
+        for mod in indexed_modules or installed_command_modules:
             try:
                 start_time = timeit.default_timer()
                 import_module('azure.cli.command_modules.' + mod).load_commands()
@@ -339,9 +453,12 @@ def get_command_table(module_name=None):
                 telemetry.set_exception(exception=ex, fault_type='module-load-error-' + mod,
                                         summary='Error loading module: {}'.format(mod))
                 logger.debug(traceback.format_exc())
+                load_failed = True
         logger.debug("Loaded all modules in %.3f seconds. "
                      "(note: there's always an overhead with the first module loaded)",
                      cumulative_elapsed_time)
+        if not indexed_modules and not load_failed:
+            _update_command_index(installed_command_modules)
     _update_command_definitions(command_table)
     ordered_commands = OrderedDict(command_table)
     return ordered_commands
@@ -459,7 +576,14 @@ def create_command(module_name, name, operation,
                     if _is_poller(result):
                         return LongRunningOperation('Starting {}'.format(name))(result)
                     elif _is_paged(result):
-                        return list(result)
+                        # The application writes the items as the pages are retrieved. The
+                        # first page is retrieved here, so its errors are handled like any other.
+                        if APPLICATION.session['stream_result']:
+                            items = iter(result)
+                            return _stream_items(next(items, _NO_ITEM), items)
+                        # Don't retrieve pages that a --query like [:10] would discard
+                        from azure.cli.core.extensions.query import get_query_pushdown
+                        return list(get_query_pushdown().limit_results(result))
                     return result
                 except Exception as ex:  # pylint: disable=broad-except
                     rp = _check_rp_not_registered_err(ex)
@@ -471,22 +595,44 @@ def create_command(module_name, name, operation,
                         return
                     else:
                         reraise(*sys.exc_info())
-        except _load_client_exception_class() as client_exception:
+        except Exception:  # pylint: disable=broad-except
+            _raise_command_error(sys.exc_info())
+
+    def _stream_items(first, items):
+        """ Yields the items of a paged result whose first item (or _NO_ITEM) is retrieved.
+        The errors of later pages are reported like the errors of the first. """
+        if first is _NO_ITEM:
+            return
+        try:
+            yield first
+            for item in items:
+                yield item
+        except Exception as ex:  # pylint: disable=broad-except
+            if exception_handler:
+                exception_handler(ex)
+                return
+            _raise_command_error(sys.exc_info())
+
+    def _raise_command_error(exc_info):
+        """ Reports the error of the command in telemetry and raises it, as a CLIError if it
+        is an Azure service error or a ValueError. """
+        ex = exc_info[1]
+        if isinstance(ex, _load_client_exception_class()):
             fault_type = name.replace(' ', '-') + '-client-error'
-            telemetry.set_exception(client_exception, fault_type=fault_type,
+            telemetry.set_exception(ex, fault_type=fault_type,
                                     summary='Unexpected client exception during command creation')
-            raise client_exception
-        except _load_azure_exception_class() as azure_exception:
+        elif isinstance(ex, _load_azure_exception_class()):
             fault_type = name.replace(' ', '-') + '-service-error'
-            telemetry.set_exception(azure_exception, fault_type=fault_type,
+            telemetry.set_exception(ex, fault_type=fault_type,
                                     summary='Unexpected azure exception during command creation')
-            message = re.search(r"([A-Za-z\t .])+", str(azure_exception))
-            raise CLIError('\n{}'.format(message.group(0) if message else str(azure_exception)))
-        except ValueError as value_error:
+            message = re.search(r"([A-Za-z\t .])+", str(ex))
+            raise CLIError('\n{}'.format(message.group(0) if message else str(ex)))
+        elif isinstance(ex, ValueError):
             fault_type = name.replace(' ', '-') + '-value-error'
-            telemetry.set_exception(value_error, fault_type=fault_type,
+            telemetry.set_exception(ex, fault_type=fault_type,
                                     summary='Unexpected value exception during command creation')
-            raise CLIError(value_error)
+            raise CLIError(ex)
+        reraise(*exc_info)
 
     command_module_map[name] = module_name
     name = ' '.join(name.split())
@@ -499,7 +645,8 @@ def create_command(module_name, name, operation,
 
     cmd = CliCommand(name, _execute_command, table_transformer=table_transformer,
                      arguments_loader=arguments_loader, description_loader=description_loader,
-                     formatter_class=formatter_class, deprecate_info=deprecate_info)
+                     formatter_class=formatter_class, deprecate_info=deprecate_info,
+                     cache_arguments=True)
     if confirmation:
         cmd.add_argument(CONFIRM_PARAM_NAME, '--yes', '-y',
                          action='store_true',
@@ -507,6 +654,10 @@ def create_command(module_name, name, operation,
     return cmd
 
 
+# The first item of an empty paged result
+_NO_ITEM = object()
+
+
 def _user_confirmed(confirmation, command_args):
     if callable(confirmation):
         return confirmation(command_args)
@@ -577,6 +728,11 @@ _cli_extra_argument_registry = defaultdict(lambda: {})
 
 
 def _apply_parameter_info(command_name, command):
+    _apply_parameter_overrides(command_name, command)
+    command.apply_configured_defaults()
+
+
+def _apply_parameter_overrides(command_name, command):
     for argument_name in command.arguments:
         overrides = _get_cli_argument(command_name, argument_name)
         command.update_argument(argument_name, overrides)
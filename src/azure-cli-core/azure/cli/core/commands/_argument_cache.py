@@ -0,0 +1,264 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+""" Persists the resolved arguments of commands so that the parser for a command can be built
+without importing the SDK (or the command module's _params) on subsequent runs.
+
+Settings are stored as JSON. Functions and classes are stored as 'module#qualname' import
+paths and `functools.partial` objects as their function plus arguments. Validators, completers
+and types are only imported when they are first called. Commands with settings that cannot be
+stored this way (closures, lambdas, ...) are not cached.
+
+The arguments are built from the models and operations of the SDKs a command module depends on,
+so the cache of a command module also records the metadata directories of these distributions,
+whose names include their versions. Upgrading an SDK replaces its metadata directory.
+"""
+
+import json
+import os
+from functools import partial
+from importlib import import_module
+
+import six
+
+import azure.cli.core.azlogging as azlogging
+
+logger = azlogging.get_az_logger(__name__)
+
+CACHE_DIR_NAME = 'commandArguments'
+COMMAND_MODULE_PREFIX = 'azure.cli.command_modules.'
+
+_REFERENCE = '__reference__'
+_PARTIAL = '__partial__'
+_OBJECT = '__object__'
+_LIST = '__list__'
+
+# Settings that are resolved on first call rather than when the arguments are loaded
+_LAZY_SETTINGS = ('validator', 'completer', 'type')
+_TOOLING_ATTRIBUTES = ('required_tooling', 'default_name_tooling', 'configured_default_applied')
+
+_loaded_caches = {}
+
+
+class NotCacheableError(Exception):
+    pass
+
+
+class _LazyReference(object):  # pylint: disable=too-few-public-methods
+    """ Callable that imports the object at `path` the first time it is called. """
+
+    def __init__(self, path):
+        self.path = path
+        self.__name__ = path.split('#')[-1].split('.')[-1]
+        self._target = None
+
+    def __call__(self, *args, **kwargs):
+        if self._target is None:
+            self._target = resolve_reference(self.path)
+        return self._target(*args, **kwargs)
+
+
+def resolve_reference(path):
+    module_name, attr_path = path.split('#')
+    obj = import_module(module_name)
+    for part in attr_path.split('.'):
+        obj = getattr(obj, part)
+    return obj
+
+
+def get_reference(obj):
+    module_name = getattr(obj, '__module__', None) or \
+        getattr(getattr(obj, '__objclass__', None), '__module__', None)
+    attr_path = getattr(obj, '__qualname__', None) or getattr(obj, '__name__', None)
+    if module_name and attr_path and '<' not in attr_path:
+        path = '{}#{}'.format(module_name, attr_path)
+        try:
+            if resolve_reference(path) is obj:
+                return path
+        except (ImportError, AttributeError):
+            pass
+    raise NotCacheableError('{!r} cannot be imported by name'.format(obj))
+
+
+def _encode(value):  # pylint: disable=too-many-return-statements
+    if value is None or isinstance(value, six.string_types + six.integer_types + (float,)):
+        return value
+    elif isinstance(value, partial):
+        return {_PARTIAL: get_reference(value.func),
+                'args': [_encode(x) for x in value.args],
+                'keywords': {k: _encode(v) for k, v in (value.keywords or {}).items()}}
+    elif isinstance(value, (list, tuple)):
+        items = [_encode(x) for x in value]
+        if type(value) in (list, tuple):  # pylint: disable=unidiomatic-typecheck
+            return items
+        return {_LIST: get_reference(type(value)), 'items': items}
+    elif isinstance(value, dict):
+        raise NotCacheableError('dictionary values are not cached')
+    elif callable(value) and hasattr(value, '__name__'):
+        return {_REFERENCE: get_reference(value)}
+    elif hasattr(value, '__dict__'):
+        from enum import Enum
+        if isinstance(value, Enum):
+            raise NotCacheableError('enum values are not cached')
+        return {_OBJECT: get_reference(type(value)),
+                'state': {k: _encode(v) for k, v in vars(value).items()}}
+    raise NotCacheableError('{!r} cannot be cached'.format(value))
+
+
+def _decode(value, lazy=False):
+    if isinstance(value, list):
+        return [_decode(x) for x in value]
+    elif not isinstance(value, dict):
+        return value
+    elif _REFERENCE in value:
+        return _LazyReference(value[_REFERENCE]) if lazy else resolve_reference(value[_REFERENCE])
+    elif _PARTIAL in value:
+        func = _LazyReference(value[_PARTIAL]) if lazy else resolve_reference(value[_PARTIAL])
+        return partial(func, *_decode(value['args']),
+                       **{k: _decode(v) for k, v in value['keywords'].items()})
+    elif _LIST in value:
+        return resolve_reference(value[_LIST])(_decode(value['items']))
+    elif _OBJECT in value:
+        cls = resolve_reference(value[_OBJECT])
+        obj = cls.__new__(cls)
+        obj.__dict__.update({k: _decode(v) for k, v in value['state'].items()})
+        return obj
+    raise ValueError('Unknown cache entry {}'.format(value))
+
+
+def serialize_arguments(arguments):
+    """ Converts a dict of argument name -> CliCommandArgument into JSON serializable data.
+    Raises NotCacheableError if any of the settings cannot be persisted. """
+    result = {}
+    for name, arg in arguments.items():
+        result[name] = {
+            'settings': {key: _encode(value) for key, value in arg.type.settings.items()},
+            'tooling': {attr: getattr(arg.type, attr) for attr in _TOOLING_ATTRIBUTES
+                        if hasattr(arg.type, attr)}
+        }
+    return result
+
+
+def deserialize_arguments(data):
+    from azure.cli.core.commands import CliCommandArgument
+    arguments = {}
+    for name, entry in data.items():
+        settings = {key: _decode(value, lazy=key in _LAZY_SETTINGS)
+                    for key, value in entry['settings'].items()}
+        arg = CliCommandArgument(**settings)
+        for attr, value in entry['tooling'].items():
+            setattr(arg.type, attr, value)
+        arguments[name] = arg
+    return arguments
+
+
+def get_command_module_name(command_module):
+    """ 'azure.cli.command_modules.vm.commands' -> 'vm'. None for commands that do not come from
+    an installed command module. """
+    if not command_module or not command_module.startswith(COMMAND_MODULE_PREFIX):
+        return None
+    return command_module[len(COMMAND_MODULE_PREFIX):].split('.')[0]
+
+
+def _get_stamp(mod):
+    from azure.cli.core import __version__ as core_version
+    from azure.cli.core._profile import CLOUD
+    from azure.cli.core.commands import get_module_mtime
+    package = import_module(COMMAND_MODULE_PREFIX + mod)
+    return {'coreVersion': core_version,
+            'profile': CLOUD.profile,
+            'moduleMtime': get_module_mtime(os.path.dirname(package.__file__))}
+
+
+def _get_dependencies(mod):
+    """ Maps the metadata directories of the installed distributions the command module requires
+    to their modification times. None if they cannot be found. """
+    import pkg_resources
+    try:
+        dist = pkg_resources.get_distribution('azure-cli-{}'.format(mod))
+        dependencies = [pkg_resources.get_distribution(req) for req in dist.requires()]
+        return {d.egg_info: os.path.getmtime(d.egg_info) for d in dependencies}
+    except (pkg_resources.ResolutionError, AttributeError, TypeError, OSError) as ex:
+        logger.debug("Unable to find the dependencies of command module '%s': %s", mod, ex)
+        return None
+
+
+def _dependencies_unchanged(dependencies):
+    try:
+        return all(os.path.getmtime(path) == mtime for path, mtime in dependencies.items())
+    except OSError:
+        return False
+
+
+def _get_cache_path(mod):
+    from azure.cli.core._environment import get_config_dir
+    return os.path.join(get_config_dir(), CACHE_DIR_NAME, '{}.json'.format(mod))
+
+
+def _load_cache(mod):
+    """ Returns the commands cached for the command module `mod`, discarding stale entries. """
+    if mod in _loaded_caches:
+        return _loaded_caches[mod]
+    stamp = _get_stamp(mod)
+    commands = {}
+    dependencies = None
+    try:
+        with open(_get_cache_path(mod), 'r') as f:
+            cache = json.load(f)
+        if cache.get('stamp') == stamp and cache.get('dependencies') is not None and \
+                _dependencies_unchanged(cache['dependencies']):
+            commands = cache['commands']
+            dependencies = cache['dependencies']
+    except (OSError, IOError, ValueError, KeyError, AttributeError):
+        pass
+    _loaded_caches[mod] = {'stamp': stamp, 'dependencies': dependencies, 'commands': commands}
+    return _loaded_caches[mod]
+
+
+def get_cached_arguments(command_name, command_module):
+    """ Returns the cached arguments for the command or None if there is no valid entry. """
+    mod = get_command_module_name(command_module)
+    if not mod:
+        return None
+    data = _load_cache(mod)['commands'].get(command_name)
+    if data is None:
+        return None
+    try:
+        return deserialize_arguments(data)
+    except Exception as ex:  # pylint: disable=broad-except
+        logger.debug("Ignoring cached arguments for '%s': %s", command_name, ex)
+        return None
+
+
+def cache_arguments(command_name, command_module, arguments):
+    mod = get_command_module_name(command_module)
+    if not mod:
+        return
+    try:
+        data = serialize_arguments(arguments)
+    except NotCacheableError as ex:
+        logger.debug("Arguments of '%s' are not cached: %s", command_name, ex)
+        return
+    cache = _load_cache(mod)
+    if cache['dependencies'] is None:
+        cache['dependencies'] = _get_dependencies(mod)
+        if cache['dependencies'] is None:
+            return
+    cache['commands'][command_name] = data
+    path = _get_cache_path(mod)
+    temp_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(temp_path, 'w') as f:
+            json.dump(cache, f)
+        try:
+            os.rename(temp_path, path)
+        except OSError:
+            # Windows does not allow renaming over an existing file
+            os.remove(path)
+            os.rename(temp_path, path)
+    except (OSError, IOError) as ex:
+        logger.debug("Unable to save the argument cache for '%s': %s", mod, ex)
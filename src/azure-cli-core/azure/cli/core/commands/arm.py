@@ -410,7 +410,7 @@ def cli_generic_wait_command(module_name, name, getter_op, factory=None, excepti
 
     def handler(args):
         from msrest.exceptions import ClientException
-        import time
+        from azure.cli.core.commands.polling import Backoff, get_retry_after, wait_until
         try:
             client = factory() if factory else None
         except TypeError:
@@ -433,41 +433,46 @@ def cli_generic_wait_command(module_name, name, getter_op, factory=None, excepti
             raise CLIError(
                 "incorrect usage: --created | --updated | --deleted | --exists | --custom JMESPATH")  # pylint: disable=line-too-long
 
-        for _ in range(0, timeout, interval):
+        def poll():
+            """ Returns whether the condition is met and the Retry-After of a throttled GET. """
             try:
                 instance = getter(client, **getterargs) if client else getter(**getterargs)
                 if wait_for_exists:
-                    return
+                    return True, None
                 provisioning_state = get_provisioning_state(instance)
                 # until we have any needs to wait for 'Failed', let us bail out on this
                 if provisioning_state == 'Failed':
                     raise CLIError('The operation failed')
                 if wait_for_created or wait_for_updated:
                     if provisioning_state == 'Succeeded':
-                        return
+                        return True, None
                 if custom_condition and bool(verify_property(instance, custom_condition)):
-                    return
+                    return True, None
             except ClientException as ex:
-                if getattr(ex, 'status_code', None) == 404:
+                status_code = getattr(ex, 'status_code', None)
+                if status_code == 404:
                     if wait_for_deleted:
-                        return
+                        return True, None
                     if not any([wait_for_created, wait_for_exists, custom_condition]):
                         _handle_exception(ex)
+                elif status_code == 429:
+                    return False, get_retry_after(getattr(ex, 'response', None))
                 else:
                     _handle_exception(ex)
             except Exception as ex:  # pylint: disable=broad-except
                 _handle_exception(ex)
+            return False, None
 
-            time.sleep(interval)
-
-        return CLIError('Wait operation timed-out after {} seconds'.format(timeout))
+        if not wait_until(poll, Backoff(maximum=interval), timeout):
+            raise CLIError('Wait operation timed-out after {} seconds'.format(timeout))
 
     cmd = CliCommand(name, handler, arguments_loader=arguments_loader)
     group_name = 'Wait Condition'
     cmd.add_argument('timeout', '--timeout', default=3600, arg_group=group_name, type=int,
                      help='maximum wait in seconds')
     cmd.add_argument('interval', '--interval', default=30, arg_group=group_name, type=int,
-                     help='polling interval in seconds')
+                     help='maximum polling interval in seconds. Polls start sooner and back '
+                          'off, or follow the Retry-After of throttled requests')
     cmd.add_argument('deleted', '--deleted', action='store_true', arg_group=group_name,
                      help='wait till deleted')
     cmd.add_argument('created', '--created', action='store_true', arg_group=group_name,
@@ -4,6 +4,7 @@
 # --------------------------------------------------------------------------------------------
 
 import os
+import threading
 from azure.cli.core import __version__ as core_version
 from azure.cli.core._profile import Profile, CLOUD
 import azure.cli.core._debug as _debug
@@ -18,6 +19,11 @@ logger = azlogging.get_az_logger(__name__)
 UA_AGENT = "AZURECLI/{}".format(core_version)
 ENV_ADDITIONAL_USER_AGENT = 'AZURE_HTTP_USER_AGENT'
 
+# Management clients are reused for the lifetime of the process, e.g. by every `--ids`
+# invocation or every command of `az batch-run`.
+_client_cache = {}
+_client_cache_lock = threading.Lock()
+
 
 def get_mgmt_service_client(client_or_resource_type, subscription_id=None, api_version=None,
                             **kwargs):
@@ -38,7 +44,9 @@ def get_subscription_service_client(client_type):
 
 
 def configure_common_settings(client):
+    from azure.cli.core.commands.polling import use_adaptive_operation_polling
     client = _debug.change_ssl_cert_verification(client)
+    use_adaptive_operation_polling()
 
     client.config.add_user_agent(UA_AGENT)
     try:
@@ -46,6 +54,10 @@ def configure_common_settings(client):
     except KeyError:
         pass
 
+    _configure_session_headers(client)
+
+
+def _configure_session_headers(client):
     for header, value in APPLICATION.session['headers'].items():
         # We are working with the autorest team to expose the add_header
         # functionality of the generated client to avoid having to access
@@ -62,8 +74,20 @@ def configure_common_settings(client):
 def _get_mgmt_service_client(client_type, subscription_bound=True, subscription_id=None,
                              api_version=None, base_url_bound=True, **kwargs):
     logger.debug('Getting management service client client_type=%s', client_type.__name__)
-    profile = Profile()
-    cred, subscription_id, _ = profile.get_login_credentials(subscription_id=subscription_id)
+    cred, subscription_id, user = _get_login_credentials(subscription_id)
+    try:
+        cache_key = (client_type, subscription_bound, subscription_id, user, api_version,
+                     base_url_bound, CLOUD.name, frozenset(kwargs.items()))
+        hash(cache_key)
+    except TypeError:
+        cache_key = None
+    with _client_cache_lock:
+        client = _client_cache.get(cache_key) if cache_key else None
+    if client:
+        # The cached client may have been created for an earlier command
+        _configure_session_headers(client)
+        return (client, subscription_id)
+
     client_kwargs = {}
     if base_url_bound:
         client_kwargs = {'base_url': CLOUD.endpoints.resource_manager}
@@ -79,9 +103,36 @@ def _get_mgmt_service_client(client_type, subscription_bound=True, subscription_
 
     configure_common_settings(client)
 
+    if cache_key:
+        with _client_cache_lock:
+            _client_cache[cache_key] = client
     return (client, subscription_id)
 
 
+def _get_login_credentials(subscription_id=None):
+    """ Returns the credentials, subscription ID and user for the requested subscription. They
+    are looked up once per command, see Application.reset. """
+    credentials_key = (subscription_id, CLOUD.name)
+    credentials = APPLICATION.session['mgmt_credentials']
+    with _client_cache_lock:
+        resolved = credentials.get(credentials_key)
+    if resolved is None:
+        profile = Profile()
+        cred, resolved_subscription_id, _ = profile.get_login_credentials(
+            subscription_id=subscription_id)
+        user = profile.get_subscription(resolved_subscription_id)['user']['name']
+        resolved = (cred, resolved_subscription_id, user)
+        with _client_cache_lock:
+            credentials[credentials_key] = resolved
+    return resolved
+
+
+def clear_client_cache():
+    with _client_cache_lock:
+        _client_cache.clear()
+        APPLICATION.session['mgmt_credentials'].clear()
+
+
 def get_data_service_client(service_type, account_name, account_key, connection_string=None,
                             sas_token=None, endpoint_suffix=None):
     logger.debug('Getting data service client service_type=%s', service_type.__name__)
@@ -0,0 +1,175 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+""" Caches the values of completers that list resources (resource groups, locations, ...) so
+TAB completion and the interactive shell do not wait for the service on every request.
+
+Values are kept in the configuration directory per cloud, subscription, completer and the
+arguments the values depend on. For `core.completion_cache_ttl` seconds they are returned as
+they are. After that, and for up to a day, they are still returned while they are refreshed in
+the background: on a thread in long running processes like the interactive shell, or by a
+separate process when argcomplete is about to end the current one.
+
+    python -m azure.cli.core.commands.completion_cache KEY COMPLETER ARGS CONTEXT
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from functools import wraps
+
+import six
+
+import azure.cli.core.azlogging as azlogging
+from azure.cli.core.commands._argument_cache import get_reference, resolve_reference
+
+logger = azlogging.get_az_logger(__name__)
+
+COMPLETION_CACHE_FILE_NAME = 'completions.json'
+DEFAULT_COMPLETION_CACHE_TTL = 120
+# Values older than this are not returned but retrieved again
+MAX_STALE_AGE = 24 * 60 * 60
+# A refresh that did not finish in this time is started again
+_REFRESH_TIMEOUT = 60
+
+_completions = None
+
+
+def _get_ttl():
+    from azure.cli.core._config import az_config
+    return az_config.getint('core', 'completion_cache_ttl',
+                            fallback=DEFAULT_COMPLETION_CACHE_TTL)
+
+
+def _get_completions():
+    global _completions  # pylint: disable=global-statement
+    if _completions is None:
+        from azure.cli.core._environment import get_config_dir
+        from azure.cli.core._session import COMPLETIONS
+        try:
+            COMPLETIONS.load(os.path.join(get_config_dir(), COMPLETION_CACHE_FILE_NAME))
+        except ValueError:
+            # Written by another command at the same time
+            COMPLETIONS.data = {}
+        _completions = COMPLETIONS
+    return _completions
+
+
+def _get_key(reference, args, context):
+    from azure.cli.core._profile import Profile
+    from azure.cli.core.cloud import get_active_cloud_name
+    subscription_id = Profile().get_subscription_id()
+    return json.dumps([get_active_cloud_name(), subscription_id, reference, args, context])
+
+
+def _store(key, values):
+    completions = _get_completions()
+    now = time.time()
+    with completions.batch():
+        for old_key in [k for k, v in completions.data.items()
+                        if v['time'] + MAX_STALE_AGE < now]:
+            del completions.data[old_key]
+        completions.data[key] = {'time': now, 'values': values}
+
+
+def _claim_refresh(key):
+    """ Returns whether this process should refresh the values, i.e. no other process or thread
+    is refreshing them. """
+    completions = _get_completions()
+    now = time.time()
+    with completions.batch():
+        entry = completions.data.get(key)
+        if entry is None or entry.get('refreshStarted', 0) + _REFRESH_TIMEOUT > now:
+            return False
+        entry['refreshStarted'] = now
+    return True
+
+
+def _refresh_on_thread(key, func, args, kwargs):
+    def _refresh():
+        try:
+            _store(key, list(func(*args, **kwargs)))
+        except Exception as ex:  # pylint: disable=broad-except
+            logger.debug('Failed to refresh completions: %s', ex)
+
+    thread = threading.Thread(target=_refresh)
+    thread.daemon = True
+    thread.start()
+
+
+def _refresh_in_process(key, reference, args, context):
+    import subprocess
+    with open(os.devnull, 'w') as devnull:
+        # argcomplete's output must not stay open in the refreshing process
+        subprocess.Popen([sys.executable, '-m', __name__, key, reference, json.dumps(args),
+                          json.dumps(context)],
+                         stdin=devnull, stdout=devnull, stderr=devnull,
+                         close_fds=os.name != 'nt')
+
+
+def cached_completer(context=()):
+    """ Caches the values of a completer. `context` names the parsed arguments the values depend
+    on, e.g. 'resource_group_name'. Positional arguments (e.g. those of a partial) are part of the
+    key and must be strings or None. The prefix is not: completers return all values. """
+    def _decorator(func):
+        @wraps(func)
+        def _wrapper(*args, **kwargs):
+            ttl = _get_ttl()
+            if ttl <= 0 or not all(a is None or isinstance(a, six.string_types) for a in args):
+                return func(*args, **kwargs)
+            parsed_args = kwargs.get('parsed_args')
+            context_values = {name: getattr(parsed_args, name, None) for name in context}
+            reference = get_reference(_wrapper)
+            try:
+                key = _get_key(reference, list(args), context_values)
+            except Exception:  # pylint: disable=broad-except
+                # e.g. not logged in
+                return func(*args, **kwargs)
+
+            completions = _get_completions()
+            completions.reload()
+            entry = completions.get(key)
+            age = time.time() - entry['time'] if entry else None
+            if age is not None and age <= ttl:
+                return entry['values']
+            if age is not None and age <= MAX_STALE_AGE:
+                from azure.cli.core.application import APPLICATION
+                if _claim_refresh(key):
+                    if APPLICATION.session['completer_active']:
+                        _refresh_in_process(key, reference, list(args), context_values)
+                    else:
+                        _refresh_on_thread(key, func, args, kwargs)
+                return entry['values']
+
+            values = list(func(*args, **kwargs))
+            _store(key, values)
+            return values
+
+        _wrapper.uncached = func
+        return _wrapper
+    return _decorator
+
+
+def refresh(key, reference, args, context):
+    """ Retrieves and stores the values of a cached completer. """
+    import argparse
+    completer = resolve_reference(reference)
+    values = completer.uncached(*args, prefix='', action=None,
+                                parsed_args=argparse.Namespace(**context))
+    _store(key, list(values))
+
+
+def _main(argv):
+    from azure.cli.core._environment import get_config_dir
+    from azure.cli.core._session import ACCOUNT
+    key, reference, args, context = argv
+    ACCOUNT.load(os.path.join(get_config_dir(), 'azureProfile.json'))
+    refresh(key, reference, json.loads(args), json.loads(context))
+
+
+if __name__ == '__main__':
+    _main(sys.argv[1:])
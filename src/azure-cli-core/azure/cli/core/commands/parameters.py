@@ -6,9 +6,11 @@
 # pylint: disable=line-too-long
 import argparse
 import platform
+from functools import partial
 
 from azure.cli.core.commands import \
     (CliArgumentType, register_cli_argument)
+from azure.cli.core.commands.completion_cache import cached_completer
 from azure.cli.core.commands.validators import validate_tag, validate_tags
 from azure.cli.core.util import CLIError
 from azure.cli.core.commands.validators import generate_deployment_name
@@ -25,6 +27,7 @@ def get_subscription_locations():
     return list(subscription_client.subscriptions.list_locations(subscription_id))
 
 
+@cached_completer()
 def get_location_completion_list(prefix, **kwargs):  # pylint: disable=unused-argument
     result = get_subscription_locations()
     return [l.name for l in result]
@@ -57,6 +60,7 @@ def get_resource_groups():
     return list(rcf.resource_groups.list())
 
 
+@cached_completer()
 def get_resource_group_completion_list(prefix, **kwargs):  # pylint: disable=unused-argument
     result = get_resource_groups()
     return [l.name for l in result]
@@ -76,20 +80,27 @@ def get_resources_in_subscription(resource_type=None):
     return list(rcf.resources.list(filter=filter_str))
 
 
+@cached_completer(context=('resource_group_name',))
+def _resource_name_completer(resource_type, prefix, action, parsed_args, **kwargs):  # pylint: disable=unused-argument
+    if getattr(parsed_args, 'resource_group_name', None):
+        rg = parsed_args.resource_group_name
+        return [r.name for r in get_resources_in_resource_group(rg, resource_type=resource_type)]
+    else:
+        return [r.name for r in get_resources_in_subscription(resource_type=resource_type)]
+
+
 def get_resource_name_completion_list(resource_type=None):
-    def completer(prefix, action, parsed_args, **kwargs):  # pylint: disable=unused-argument
-        if getattr(parsed_args, 'resource_group_name', None):
-            rg = parsed_args.resource_group_name
-            return [r.name for r in get_resources_in_resource_group(rg, resource_type=resource_type)]
-        else:
-            return [r.name for r in get_resources_in_subscription(resource_type=resource_type)]
-    return completer
+    # A partial of a module level function (rather than a closure) can be persisted in the
+    # command argument cache.
+    return partial(_resource_name_completer, resource_type)
+
+
+def _generic_completer(generic_list, prefix, action, parsed_args, **kwargs):  # pylint: disable=unused-argument
+    return generic_list
 
 
 def get_generic_completion_list(generic_list):
-    def completer(prefix, action, parsed_args, **kwargs):  # pylint: disable=unused-argument
-        return generic_list
-    return completer
+    return partial(_generic_completer, generic_list)
 
 
 class CaseInsensitiveList(list):  # pylint: disable=too-few-public-methods
@@ -113,15 +124,17 @@ def enum_choice_list(data):
     except AttributeError:
         choices = data
 
-    def _type(value):
-        return next((x for x in choices if x.lower() == value.lower()), value) if value else value
     params = {
         'choices': CaseInsensitiveList(choices),
-        'type': _type
+        'type': partial(_case_insensitive_choice, choices)
     }
     return params
 
 
+def _case_insensitive_choice(choices, value):
+    return next((x for x in choices if x.lower() == value.lower()), value) if value else value
+
+
 def enum_default(resource_type, enum_name, enum_val_name):
     mod = get_sdk(resource_type, enum_name, mod='models')
     try:
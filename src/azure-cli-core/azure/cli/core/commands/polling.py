@@ -0,0 +1,251 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+""" Polling of long running operations and `wait` commands.
+
+One scheduler thread keeps the timing of the polls of all operations a process waits for (e.g.
+every `--ids` invocation or every command of `az batch-run`) and hands the due polls to a few
+worker threads, so a slow GET doesn't hold back the other operations. The delay between two polls of an operation
+honors the Retry-After header of the last response and otherwise grows exponentially, with
+jitter, up to a cap.
+"""
+
+import heapq
+import itertools
+import random
+import sys
+import threading
+import time
+from email.utils import mktime_tz, parsedate_tz
+
+import six
+
+import azure.cli.core.azlogging as azlogging
+
+logger = azlogging.get_az_logger(__name__)
+
+DEFAULT_INITIAL_DELAY = 1.0
+DEFAULT_MAX_DELAY = 30.0
+
+# Waiting threads wake up this often, so they can be interrupted and time out
+_WAIT_SLICE = 0.5
+
+# The most polls that run at the same time
+MAX_POLL_WORKERS = 4
+
+
+def get_retry_after(response):
+    """ Returns the seconds a response's Retry-After header asks to wait, or None. """
+    headers = getattr(response, 'headers', None)
+    value = headers.get('retry-after') if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return None
+    return max(mktime_tz(parsed) - time.time(), 0.0)
+
+
+class Backoff(object):  # pylint: disable=too-few-public-methods
+    """ The delays between the polls of one operation. Without a Retry-After, a delay is a
+    random time between half and all of initial * factor ** attempt, at most `maximum`. """
+
+    def __init__(self, initial=DEFAULT_INITIAL_DELAY, maximum=DEFAULT_MAX_DELAY, factor=2.0):
+        self.initial = min(initial, maximum)
+        self.maximum = maximum
+        self.factor = factor
+        self.attempt = 0
+
+    def next_delay(self, retry_after=None):
+        if retry_after is not None:
+            return retry_after
+        ceiling = min(self.maximum, self.initial * self.factor ** self.attempt)
+        self.attempt += 1
+        return random.uniform(ceiling / 2.0, ceiling)
+
+
+class PollJob(object):
+    """ An operation waited for on the scheduler. `poll` returns whether the operation is done
+    and the Retry-After of its last response (or None). A job polls on one thread at a time. """
+
+    def __init__(self, scheduler, poll, backoff):
+        self._scheduler = scheduler
+        self._poll = poll
+        self._backoff = backoff
+        self._done = threading.Event()
+        self._exc_info = None
+        self._lock = threading.Lock()
+        self._running = False
+        self._poll_again = False
+        self.cancelled = False
+        self.due = None
+
+    def run(self):
+        with self._lock:
+            if self.cancelled or self._running:
+                return
+            self._running = True
+            self._poll_again = False
+        try:
+            done, retry_after = self._poll()
+        except Exception:  # pylint: disable=broad-except
+            self._exc_info = sys.exc_info()
+            done = True
+        with self._lock:
+            self._running = False
+            poll_again = self._poll_again
+        if done:
+            self._done.set()
+        else:
+            self._scheduler.schedule(self, 0 if poll_again else self._backoff.next_delay(retry_after))
+
+    def poll_now(self):
+        """ Polls without waiting for the delay, e.g. when the operation signals completion. """
+        if self.cancelled or self._done.is_set():
+            return
+        with self._lock:
+            if self._running:
+                # polls again as soon as the running poll returns
+                self._poll_again = True
+                return
+        self._scheduler.schedule(self, 0)
+
+    def cancel(self):
+        self.cancelled = True
+
+    def wait(self, timeout=None):
+        """ Returns whether the operation is done, or False if it was not within `timeout`
+        seconds. Raises the error of the poll that failed. """
+        deadline = time.time() + timeout if timeout is not None else None
+        try:
+            while not self._done.wait(_WAIT_SLICE):
+                if deadline is not None and time.time() >= deadline:
+                    self.cancel()
+                    return False
+        except BaseException:
+            self.cancel()
+            raise
+        if self._exc_info:
+            six.reraise(*self._exc_info)
+        return True
+
+
+class PollScheduler(object):
+    """ Times the polls of many operations on one daemon thread and runs each, when its delay is
+    over, on one of at most `max_workers` daemon threads. """
+
+    def __init__(self, max_workers=MAX_POLL_WORKERS):
+        self._queue = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._max_workers = max_workers
+        self._ready = six.moves.queue.Queue()
+        self._workers = 0
+        self._idle_workers = 0
+
+    def submit(self, poll, backoff=None, delay=0):
+        """ Starts polling and returns the PollJob to wait for. """
+        job = PollJob(self, poll, backoff or Backoff())
+        self.schedule(job, delay)
+        return job
+
+    def schedule(self, job, delay):
+        with self._condition:
+            job.due = time.time() + delay
+            heapq.heappush(self._queue, (job.due, next(self._counter), job))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='az-poll-scheduler')
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify()
+
+    def _next_job(self):
+        with self._condition:
+            while True:
+                if not self._queue:
+                    self._condition.wait()
+                    continue
+                due, _, job = self._queue[0]
+                if job.due != due or job.cancelled:
+                    # rescheduled or abandoned in the meantime
+                    heapq.heappop(self._queue)
+                    continue
+                delay = due - time.time()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                heapq.heappop(self._queue)
+                return job
+
+    def _run(self):
+        while True:
+            job = self._next_job()
+            with self._condition:
+                start_worker = self._idle_workers <= 0 and self._workers < self._max_workers
+                if start_worker:
+                    self._workers += 1
+                else:
+                    self._idle_workers -= 1
+            self._ready.put(job)
+            if start_worker:
+                worker = threading.Thread(target=self._work, name='az-poll-worker')
+                worker.daemon = True
+                worker.start()
+
+    def _work(self):
+        while True:
+            job = self._ready.get()
+            try:
+                job.run()
+            except Exception as ex:  # pylint: disable=broad-except
+                logger.debug('Polling failed: %s', ex)
+            with self._condition:
+                self._idle_workers += 1
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    global _scheduler  # pylint: disable=global-statement
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = PollScheduler()
+        return _scheduler
+
+
+def wait_until(poll, backoff=None, timeout=None):
+    """ Calls `poll` on the scheduler's workers until it returns a done operation. Returns False if
+    the operation is not done within `timeout` seconds. """
+    return get_scheduler().submit(poll, backoff).wait(timeout)
+
+
+def _delay_operation_poller(poller):
+    """ Replaces AzureOperationPoller._delay, which waits a fixed interval (the client's
+    long_running_operation_timeout) between polls unless there is a Retry-After. """
+    response = getattr(poller, '_response', None)
+    if response is None:
+        return
+    backoff = poller.__dict__.get('_az_backoff')
+    if backoff is None:
+        backoff = Backoff(maximum=getattr(poller, '_timeout', DEFAULT_MAX_DELAY))
+        poller.__dict__['_az_backoff'] = backoff
+    time.sleep(backoff.next_delay(get_retry_after(response)))
+
+
+def use_adaptive_operation_polling():
+    """ Makes msrestazure's operation pollers back off between polls. """
+    from msrestazure.azure_operation import AzureOperationPoller
+
+    delay = AzureOperationPoller.__dict__.get('_delay')
+    # Leave a replacement alone, e.g. the one tests use to skip the delays
+    if getattr(delay, '__module__', None) == 'msrestazure.azure_operation':
+        AzureOperationPoller._delay = _delay_operation_poller  # pylint: disable=protected-access
@@ -0,0 +1,99 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+""" Caches the API versions of resource providers' resource types, so commands that choose an
+API version for a generic resource (e.g. `az resource show --ids ...`) do not get the resource
+provider for every resource.
+
+The cache is kept in the configuration directory, per cloud and subscription, and shared by all
+`az` processes. A provider's entry expires after `core.provider_cache_ttl` seconds (0 turns the
+cache off) and is dropped when the service rejects an API version taken from it.
+"""
+
+import os
+import time
+
+import six
+
+import azure.cli.core.azlogging as azlogging
+
+logger = azlogging.get_az_logger(__name__)
+
+PROVIDER_CACHE_FILE_NAME = 'resourceProviders.json'
+DEFAULT_PROVIDER_CACHE_TTL = 24 * 60 * 60
+
+# Error codes of requests with an API version that the resource type does not (or no longer)
+# support
+API_VERSION_ERROR_CODES = ('InvalidApiVersionParameter', 'NoRegisteredProviderFound',
+                           'InvalidResourceType')
+
+_providers = None
+
+
+def _get_ttl():
+    from azure.cli.core._config import az_config
+    return az_config.getint('core', 'provider_cache_ttl', fallback=DEFAULT_PROVIDER_CACHE_TTL)
+
+
+def _get_providers():
+    global _providers  # pylint: disable=global-statement
+    if _providers is None:
+        from azure.cli.core._environment import get_config_dir
+        from azure.cli.core._session import PROVIDERS
+        try:
+            PROVIDERS.load(os.path.join(get_config_dir(), PROVIDER_CACHE_FILE_NAME))
+        except ValueError:
+            # Written by another command at the same time
+            PROVIDERS.data = {}
+        _providers = PROVIDERS
+    return _providers
+
+
+def _get_subscription_key(client):
+    subscription_id = getattr(getattr(client, 'config', None), 'subscription_id', None)
+    if not isinstance(subscription_id, six.string_types):
+        return None
+    from azure.cli.core.cloud import get_active_cloud_name
+    return '{}/{}'.format(get_active_cloud_name(), subscription_id.lower())
+
+
+def _get_resource_types(provider):
+    return {t.resource_type.lower(): list(t.api_versions or []) for t in provider.resource_types}
+
+
+def get_api_versions(client, namespace, resource_type):
+    """ Returns the API versions of a resource type, as ordered by its provider, or None if the
+    provider has no such type. `client` is a resource management client. """
+    ttl = _get_ttl()
+    subscription_key = _get_subscription_key(client) if ttl > 0 else None
+    if subscription_key is None:
+        return _get_resource_types(client.providers.get(namespace)).get(resource_type.lower())
+
+    providers = _get_providers()
+    providers.reload()
+    entry = providers.get(subscription_key, {}).get(namespace.lower())
+    if entry is None or entry['time'] + ttl < time.time():
+        logger.debug("Getting the API versions of resource provider '%s'", namespace)
+        entry = {'time': time.time(),
+                 'resourceTypes': _get_resource_types(client.providers.get(namespace))}
+        with providers.batch():
+            providers.data.setdefault(subscription_key, {})[namespace.lower()] = entry
+    return entry['resourceTypes'].get(resource_type.lower())
+
+
+def is_api_version_error(ex):
+    """ Returns whether an error (e.g. a CloudError) was caused by an unsupported API version. """
+    error = getattr(ex, 'error', None)
+    return getattr(error, 'error', None) in API_VERSION_ERROR_CODES
+
+
+def invalidate_api_versions(client, namespace):
+    """ Drops the cached API versions of a resource provider. """
+    subscription_key = _get_subscription_key(client)
+    if subscription_key is None:
+        return
+    providers = _get_providers()
+    with providers.batch():
+        providers.data.get(subscription_key, {}).pop(namespace.lower(), None)
@@ -4,6 +4,13 @@
 # --------------------------------------------------------------------------------------------
 
 import collections
+import itertools
+
+from six import string_types
+
+import azure.cli.core.azlogging as azlogging
+
+logger = azlogging.get_az_logger(__name__)
 
 
 def jmespath_type(raw_query):
@@ -20,6 +27,151 @@ def jmespath_type(raw_query):
         raise ValueError
 
 
+class QueryPushdown(object):
+    '''The parts of a --query that the service or the paging of the result can answer.
+    The query itself is still applied to the result, so a command can use any of them.
+
+    filter: OData filter (`and` of the pushed down predicates) or None
+    select: list of the OData fields the query uses or None if it uses whole items
+    limit: number of items at the start of the result the query looks at, or None
+    '''
+
+    def __init__(self, filters=None, select=None, limit=None):
+        self.filter = ' and '.join(filters) if filters else None
+        self.select = select
+        self.limit = limit
+
+    def limit_results(self, results):
+        '''Stop iterating a (paged) result after the items the query looks at.'''
+        return itertools.islice(results, self.limit) if self.limit is not None else results
+
+    def __repr__(self):
+        return 'QueryPushdown(filter={!r}, select={!r}, limit={!r})'.format(
+            self.filter, self.select, self.limit)
+
+
+def _field_path(node):
+    # 'a' or 'a.b.c' for field references, None for anything else
+    if node['type'] == 'field':
+        return node['value']
+    if node['type'] == 'subexpression':
+        parts = [_field_path(child) for child in node['children']]
+        if all(parts):
+            return '.'.join(parts)
+    return None
+
+
+def _item_fields(node):
+    '''The top-level fields of an item the expression uses, or None if it uses the whole
+    item (or something this planner does not understand).'''
+    node_type = node['type']
+    if node_type == 'literal':
+        return set()
+    if node_type == 'field':
+        return {node['value']}
+    if node_type == 'subexpression':
+        return _item_fields(node['children'][0])
+    if node_type in ('comparator', 'and_expression', 'or_expression', 'not_expression',
+                     'function_expression', 'multi_select_dict', 'multi_select_list',
+                     'key_val_pair'):
+        fields = set()
+        for child in node['children']:
+            child_fields = _item_fields(child)
+            if child_fields is None:
+                return None
+            fields |= child_fields
+        return fields
+    return None
+
+
+def _predicates(condition):
+    # The `field == 'string'` conjuncts of a filter condition
+    if condition['type'] == 'and_expression':
+        return _predicates(condition['children'][0]) + _predicates(condition['children'][1])
+    if condition['type'] == 'comparator' and condition['value'] == 'eq':
+        left, right = condition['children']
+        if left['type'] == 'literal':
+            left, right = right, left
+        path = _field_path(left)
+        if path and right['type'] == 'literal' and isinstance(right['value'], string_types):
+            return [(path, right['value'])]
+    return []
+
+
+def _limit(node):
+    # `[n]`, `[:n]` or `[m:n]` applied to the whole list
+    if node['type'] == 'projection':
+        node = node['children'][0]
+    if node['type'] != 'index_expression' or node['children'][0]['type'] != 'identity':
+        return None
+    index = node['children'][1]
+    if index['type'] == 'index' and index['value'] >= 0:
+        return index['value'] + 1
+    if index['type'] == 'slice':
+        start, stop, step = index['children']
+        if (start is None or start >= 0) and stop is not None and stop >= 0 and \
+                (step is None or step > 0):
+            return stop
+    return None
+
+
+def _projects_items(node):
+    # `[?...].x`, `[].x` or `[:n].x`: the query uses nothing but the right side of the
+    # projection (and the filter condition) of each item
+    left = node['children'][0] if node['type'] in ('projection', 'filter_projection') else None
+    if node['type'] == 'filter_projection':
+        return left['type'] == 'identity'
+    if node['type'] == 'projection':
+        if left['type'] == 'flatten':
+            return left['children'][0]['type'] == 'identity'
+        return _limit(node) is not None
+    return False
+
+
+def plan_query(parsed, filter_fields=None, select_fields=None):
+    '''Plan the pushdown of a parsed JMESPath query on a list result.
+
+    :param dict parsed: The AST of the query (the `parsed` attribute of a compiled query).
+    :param dict filter_fields: JMESPath field paths ('location', 'status.value') that the
+        service can filter on for equality, mapped to the OData field to filter.
+    :param dict select_fields: Top-level fields the service can select, mapped to the OData
+        field to select.
+    :rtype: QueryPushdown
+    '''
+    left = parsed['children'][0] if parsed['type'] == 'pipe' else parsed
+    limit = _limit(left)
+
+    filters = []
+    if left['type'] == 'filter_projection' and left['children'][0]['type'] == 'identity':
+        for path, value in _predicates(left['children'][2]):
+            if filter_fields and path in filter_fields:
+                filters.append("{} eq '{}'".format(filter_fields[path], value.replace("'", "''")))
+
+    select = None
+    if select_fields and _projects_items(parsed):
+        fields = _item_fields(parsed['children'][1])
+        if fields is not None and parsed['type'] == 'filter_projection':
+            condition_fields = _item_fields(parsed['children'][2])
+            fields = fields | condition_fields if condition_fields is not None else None
+        if fields and all(f in select_fields for f in fields):
+            select = sorted(select_fields[f] for f in fields)
+
+    return QueryPushdown(filters, select, limit)
+
+
+def get_query_pushdown(filter_fields=None, select_fields=None):
+    '''Plan the pushdown of the --query of the command being executed. For use by command
+    handlers whose result is the list the query is applied to.'''
+    from azure.cli.core.application import APPLICATION
+    query_expression = APPLICATION.session.get('query_expression')
+    # With several invocations (--ids) the query applies to the list of their results
+    if not query_expression or APPLICATION.session.get('invocation_count', 1) != 1:
+        return QueryPushdown()
+    pushdown = plan_query(query_expression.parsed, filter_fields, select_fields)
+    logger.debug('Query pushdown: %s', pushdown)
+    return pushdown
+
+
 def _register_global_parameter(global_group):
     # Argparse uses __name__ of the function used for 'type' when generating error message.
     # We set __name__ for our function here.
@@ -36,14 +188,19 @@ def register(application):
         args = kwargs['args']
         query_expression = args._jmespath_query  # pylint: disable=protected-access
         del args._jmespath_query
+        # Kept in the session rather than in a one-off handler so that a command that fails
+        # before its result is filtered does not leave its query behind for the next command
+        application.session['query_expression'] = query_expression
         if query_expression:
-            def filter_output(**kwargs):
-                from jmespath import search, Options
-                kwargs['event_data']['result'] = query_expression.search(
-                    kwargs['event_data']['result'], Options(collections.OrderedDict))
-                application.remove(application.FILTER_RESULT, filter_output)
-            application.register(application.FILTER_RESULT, filter_output)
             application.session['query_active'] = True
 
+    def filter_output(**kwargs):
+        query_expression = application.session.pop('query_expression', None)
+        if query_expression:
+            from jmespath import Options
+            kwargs['event_data']['result'] = query_expression.search(
+                kwargs['event_data']['result'], Options(collections.OrderedDict))
+
     application.register(application.GLOBAL_PARSER_CREATED, _register_global_parameter)
     application.register(application.COMMAND_PARSER_PARSED, handle_query_parameter)
+    application.register(application.FILTER_RESULT, filter_output)
@@ -3,19 +3,22 @@
 # Licensed under the MIT License. See License.txt in the project root for license information.
 # --------------------------------------------------------------------------------------------
 
-import re
+from six import string_types
 
 from azure.cli.core.util import b64_to_hex
 
 
 def register(application):
-    application.register(application.TRANSFORM_RESULT, _resource_group_transform)
-    application.register(application.TRANSFORM_RESULT, _x509_from_base64_to_hex_transform)
+    # Applied to each object of the result while it is converted, see Application.execute
+    application.register_result_transform(_resource_group_object_transform)
+    application.register_result_transform(_x509_from_base64_to_hex_object_transform)
 
 
 def _parse_id(strid):
+    if not isinstance(strid, string_types):
+        raise TypeError('expected a string, got {}'.format(type(strid).__name__))
     parsed = {}
-    parts = re.split('/', strid)
+    parts = strid.split('/')
     if parts[3] != 'resourceGroups':
         raise KeyError()
 
@@ -24,40 +27,21 @@ def _parse_id(strid):
     return parsed
 
 
-def _add_resource_group(obj):
-    if isinstance(obj, list):
-        for array_item in obj:
-            _add_resource_group(array_item)
-    elif isinstance(obj, dict):
-        try:
-            if 'resourceGroup' not in obj:
-                if obj['id']:
-                    obj['resourceGroup'] = _parse_id(obj['id'])['resource-group']
-        except (KeyError, IndexError, TypeError):
-            pass
-        for item_key in obj:
-            if item_key != 'sourceVault':
-                _add_resource_group(obj[item_key])
-
-
-def _add_x509_hex(obj):
-    if isinstance(obj, list):
-        for array_item in obj:
-            _add_x509_hex(array_item)
-    elif isinstance(obj, dict):
-        try:
-            if 'x509ThumbprintHex' not in obj:
-                if obj['x509Thumbprint']:
-                    obj['x509ThumbprintHex'] = b64_to_hex(obj['x509Thumbprint'])
-        except (KeyError, IndexError, TypeError):
-            pass
-        for item_key in obj:
-            _add_x509_hex(obj[item_key])
-
-
-def _resource_group_transform(**kwargs):
-    _add_resource_group(kwargs['event_data']['result'])
-
-
-def _x509_from_base64_to_hex_transform(**kwargs):
-    _add_x509_hex(kwargs['event_data']['result'])
+def _resource_group_object_transform(key, obj):
+    # Objects stored under 'sourceVault' refer to a key vault rather than to a resource of the
+    # result.
+    if key == 'sourceVault' or 'resourceGroup' in obj:
+        return
+    try:
+        if obj['id']:
+            obj['resourceGroup'] = _parse_id(obj['id'])['resource-group']
+    except (KeyError, IndexError, TypeError):
+        pass
+
+
+def _x509_from_base64_to_hex_object_transform(_, obj):
+    try:
+        if 'x509ThumbprintHex' not in obj and obj['x509Thumbprint']:
+            obj['x509ThumbprintHex'] = b64_to_hex(obj['x509Thumbprint'])
+    except (KeyError, IndexError, TypeError):
+        pass
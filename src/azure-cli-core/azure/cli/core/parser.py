@@ -4,6 +4,7 @@
 # --------------------------------------------------------------------------------------------
 
 import sys
+from collections import OrderedDict
 
 import argparse
 import argcomplete
@@ -54,6 +55,9 @@ class AzCliCommandParser(argparse.ArgumentParser):
         # or description for a command. We better stash it away before handing it off for
         # "normal" argparse handling...
         self._description = kwargs.pop('description', None)
+        # In lazy mode the parsers of loaded commands are only built when they are needed
+        self.lazy = kwargs.pop('lazy', False)
+        self._pending_commands = OrderedDict()
         super(AzCliCommandParser, self).__init__(**kwargs)
 
     def load_command_table(self, command_table):
@@ -67,54 +71,93 @@ class AzCliCommandParser(argparse.ArgumentParser):
             self.subparsers = {(): sp}
 
         for command_name, metadata in command_table.items():
-            subparser = self._get_subparser(command_name.split())
-            command_verb = command_name.split()[-1]
-            # To work around http://bugs.python.org/issue9253, we artificially add any new
-            # parsers we add to the "choices" section of the subparser.
-            subparser.choices[command_verb] = command_verb
-
-            # inject command_module designer's help formatter -- default is HelpFormatter
-            fc = metadata.formatter_class or argparse.HelpFormatter
-
-            command_parser = subparser.add_parser(command_verb,
-                                                  description=metadata.description,
-                                                  parents=self.parents,
-                                                  conflict_handler='error',
-                                                  help_file=metadata.help,
-                                                  formatter_class=fc)
-
-            argument_validators = []
-            argument_groups = {}
-            for arg in metadata.arguments.values():
-                if arg.validator:
-                    argument_validators.append(arg.validator)
-                if arg.arg_group:
-                    try:
-                        group = argument_groups[arg.arg_group]
-                    except KeyError:
-                        # group not found so create
-                        group_name = '{} Arguments'.format(arg.arg_group)
-                        group = command_parser.add_argument_group(arg.arg_group, group_name)
-                        argument_groups[arg.arg_group] = group
-                    param = group.add_argument(
+            if self.lazy:
+                self._pending_commands[command_name] = metadata
+            else:
+                self._add_command_parser(command_name, metadata)
+
+    def load_pending_commands(self, args=None):
+        """In lazy mode, build the parsers needed to parse `args`: the parser of the command
+        they name or, if they name a group, the parsers of all commands below it (for help,
+        completion and error messages). Builds all pending parsers if `args` is None.
+        """
+        if not self._pending_commands:
+            return
+
+        names = list(self._pending_commands)
+        if args is not None:
+            path = []
+            for arg in args:
+                if not arg or arg.startswith('-'):
+                    break
+                path.append(arg.lower())
+            command_words = dict((name, name.split()) for name in names)
+            depth = 0
+            while depth < len(path) and \
+                    any(words[:depth + 1] == path[:depth + 1] for words in command_words.values()):
+                depth += 1
+            prefix = ' '.join(path[:depth])
+            if prefix in command_words:
+                names = [prefix]
+            else:
+                names = [name for name in names if command_words[name][:depth] == path[:depth]]
+
+        for command_name in names:
+            self._add_command_parser(command_name, self._pending_commands.pop(command_name))
+
+    def parse_known_args(self, args=None, namespace=None):
+        self.load_pending_commands(sys.argv[1:] if args is None else args)
+        return super(AzCliCommandParser, self).parse_known_args(args, namespace)
+
+    def _add_command_parser(self, command_name, metadata):
+        subparser = self._get_subparser(command_name.split())
+        command_verb = command_name.split()[-1]
+        # To work around http://bugs.python.org/issue9253, we artificially add any new
+        # parsers we add to the "choices" section of the subparser.
+        subparser.choices[command_verb] = command_verb
+
+        # inject command_module designer's help formatter -- default is HelpFormatter
+        fc = metadata.formatter_class or argparse.HelpFormatter
+
+        command_parser = subparser.add_parser(command_verb,
+                                              description=metadata.description,
+                                              parents=self.parents,
+                                              conflict_handler='error',
+                                              help_file=metadata.help,
+                                              formatter_class=fc)
+
+        argument_validators = []
+        argument_groups = {}
+        for arg in metadata.arguments.values():
+            if arg.validator:
+                argument_validators.append(arg.validator)
+            if arg.arg_group:
+                try:
+                    group = argument_groups[arg.arg_group]
+                except KeyError:
+                    # group not found so create
+                    group_name = '{} Arguments'.format(arg.arg_group)
+                    group = command_parser.add_argument_group(arg.arg_group, group_name)
+                    argument_groups[arg.arg_group] = group
+                param = group.add_argument(
+                    *arg.options_list, **arg.options)
+            else:
+                try:
+                    param = command_parser.add_argument(
                         *arg.options_list, **arg.options)
-                else:
-                    try:
-                        param = command_parser.add_argument(
-                            *arg.options_list, **arg.options)
-                    except argparse.ArgumentError:
-                        dest = arg.options['dest']
-                        if dest in ['no_wait', 'raw']:
-                            pass
-                        else:
-                            raise
-                param.completer = arg.completer
-
-            command_parser.set_defaults(
-                func=metadata,
-                command=command_name,
-                _validators=argument_validators,
-                _parser=command_parser)
+                except argparse.ArgumentError:
+                    dest = arg.options['dest']
+                    if dest in ['no_wait', 'raw']:
+                        pass
+                    else:
+                        raise
+            param.completer = arg.completer
+
+        command_parser.set_defaults(
+            func=metadata,
+            command=command_name,
+            _validators=argument_validators,
+            _parser=command_parser)
 
     def _get_subparser(self, path):
         """For each part of the path, walk down the tree of
@@ -0,0 +1,187 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+""" Startup profiler. Enabled with `--profile-startup` or the AZURE_CLI_PROFILE_STARTUP
+environment variable (set to 1 or to the path of the report). Records the wall time of each
+phase of a run and the cost of every module imported, and writes them as a JSON report that
+can be diffed between releases.
+
+This module is imported before anything else when profiling so only use the standard library.
+"""
+
+from __future__ import print_function
+
+import importlib
+import json
+import os
+import platform
+import sys
+import timeit
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import builtins
+except ImportError:
+    import __builtin__ as builtins  # pylint: disable=import-error
+
+PROFILE_ARG = '--profile-startup'
+PROFILE_ENV_VAR = 'AZURE_CLI_PROFILE_STARTUP'
+REPORT_FILE_NAME = 'startupProfile.json'
+
+_profile = None
+
+
+class _ImportTimer(object):
+    """ Times every import that loads new modules. 'self' time excludes nested imports. """
+
+    def __init__(self):
+        self.modules = OrderedDict()
+        self._children = []
+        self._original_import = None
+        self._original_import_module = None
+
+    def install(self):
+        self._original_import = builtins.__import__
+        self._original_import_module = importlib.import_module
+        builtins.__import__ = self._import
+        importlib.import_module = self._import_module
+
+    def uninstall(self):
+        if self._original_import:
+            builtins.__import__ = self._original_import
+            importlib.import_module = self._original_import_module
+            self._original_import = None
+
+    def _timed(self, name, func, *args, **kwargs):
+        before = len(sys.modules)
+        self._children.append(0.0)
+        start = timeit.default_timer()
+        try:
+            return func(name, *args, **kwargs)
+        finally:
+            elapsed = timeit.default_timer() - start
+            children = self._children.pop()
+            if self._children:
+                self._children[-1] += elapsed
+            if len(sys.modules) > before:
+                entry = self.modules.setdefault(name, [0.0, 0.0])
+                entry[0] += elapsed
+                entry[1] += elapsed - children
+
+    def _import(self, name, *args, **kwargs):
+        return self._timed(name, self._original_import, *args, **kwargs)
+
+    def _import_module(self, name, *args, **kwargs):
+        return self._timed(name, self._original_import_module, *args, **kwargs)
+
+
+class StartupProfile(object):
+
+    def __init__(self, report_path=None, command=None):
+        self.report_path = report_path
+        self.command = command
+        self.start_time = timeit.default_timer()
+        self.phases = OrderedDict()
+        self.import_timer = _ImportTimer()
+
+    def add_phase(self, name, elapsed):
+        entry = self.phases.setdefault(name, [0.0, 0])
+        entry[0] += elapsed
+        entry[1] += 1
+
+    def get_report(self):
+        from azure.cli.core import __version__ as core_version
+        imports = sorted(self.import_timer.modules.items(), key=lambda x: (-x[1][1], x[0]))
+        return OrderedDict([
+            ('coreVersion', core_version),
+            ('python', platform.python_version()),
+            ('platform', platform.platform()),
+            ('command', self.command),
+            ('totalSeconds', round(timeit.default_timer() - self.start_time, 6)),
+            ('phases', [OrderedDict([('name', name),
+                                     ('seconds', round(seconds, 6)),
+                                     ('count', count)])
+                        for name, (seconds, count) in self.phases.items()]),
+            ('imports', [OrderedDict([('module', name),
+                                      ('inclusiveSeconds', round(inclusive, 6)),
+                                      ('selfSeconds', round(own, 6))])
+                         for name, (inclusive, own) in imports])
+        ])
+
+
+def _get_command(argv):
+    nouns = []
+    for arg in argv:
+        if arg.startswith('-'):
+            break
+        nouns.append(arg.lower())
+    return ' '.join(nouns)
+
+
+def enable(report_path=None, command=None):
+    global _profile  # pylint: disable=global-statement
+    if _profile is None:
+        _profile = StartupProfile(report_path, command)
+        _profile.import_timer.install()
+    return _profile
+
+
+def disable():
+    global _profile  # pylint: disable=global-statement
+    if _profile is not None:
+        _profile.import_timer.uninstall()
+        _profile = None
+
+
+def is_enabled():
+    return _profile is not None
+
+
+def enable_from_args(argv):
+    """ Enables profiling if requested by `argv` or the environment. The profiling argument is
+    removed from `argv` (a list of arguments without the program name). """
+    requested = PROFILE_ARG in argv
+    while PROFILE_ARG in argv:
+        argv.remove(PROFILE_ARG)
+    env_value = os.environ.get(PROFILE_ENV_VAR, '')
+    if env_value.lower() in ('', '0', 'no', 'false', 'off'):
+        env_value = ''
+    if requested or env_value:
+        report_path = env_value if env_value.lower() not in ('1', 'yes', 'true', 'on') else None
+        enable(report_path, _get_command(argv))
+    return is_enabled()
+
+
+@contextmanager
+def phase(name):
+    """ Records the wall time of the block as phase `name`. A no-op unless profiling. """
+    if _profile is None:
+        yield
+        return
+    start = timeit.default_timer()
+    try:
+        yield
+    finally:
+        if _profile is not None:
+            _profile.add_phase(name, timeit.default_timer() - start)
+
+
+def write_report():
+    """ Writes the report of the current run, if profiling, and stops profiling. """
+    profile = _profile
+    if profile is None:
+        return None
+    disable()
+    report_path = profile.report_path
+    if not report_path:
+        from azure.cli.core._environment import get_config_dir
+        report_path = os.path.join(get_config_dir(), REPORT_FILE_NAME)
+    report = profile.get_report()
+    with open(os.path.expanduser(report_path), 'w') as f:
+        json.dump(report, f, indent=2)
+        f.write('\n')
+    print('Startup profile written to {}'.format(report_path), file=sys.stderr)
+    return report
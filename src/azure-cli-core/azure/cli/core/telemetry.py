@@ -15,11 +15,15 @@ import uuid
 from functools import wraps
 
 import azure.cli.core.decorators as decorators
+import azure.cli.core.profiler as profiler
 import azure.cli.core.telemetry_upload as telemetry_core
 
 PRODUCT_NAME = 'azurecli'
 TELEMETRY_VERSION = '0.0.1.4'
 AZURE_CLI_PREFIX = 'Context.Default.AzureCLI.'
+PROPERTY_CACHE_FILE_NAME = 'telemetryProperties.json'
+
+_property_cache = None
 
 decorators.is_diagnostics_mode = telemetry_core.in_diagnostic_mode
 
@@ -105,11 +109,14 @@ class TelemetrySession(object):  # pylint: disable=too-many-instance-attributes
             'Context.Default.VS.Core.ExeName': PRODUCT_NAME,
             'Context.Default.VS.Core.ExeVersion': '{}@{}'.format(
                 self.product_version, self.module_version),
-            'Context.Default.VS.Core.MacAddressHash': _get_hash_mac_address(),
-            'Context.Default.VS.Core.Machine.Id': _get_hash_machine_id(),
+            'Context.Default.VS.Core.MacAddressHash': _get_cached_property(
+                'MacAddressHash', _get_hash_mac_address),
+            'Context.Default.VS.Core.Machine.Id': _get_cached_property(
+                'MachineId', _get_hash_machine_id),
             'Context.Default.VS.Core.OS.Type': platform.system().lower(),  # eg. darwin, windows
             'Context.Default.VS.Core.OS.Version': platform.version().lower(),  # eg. 10.0.14942
-            'Context.Default.VS.Core.User.Id': _get_installation_id(),
+            'Context.Default.VS.Core.User.Id': _get_cached_property(
+                'InstallationId', _get_installation_id),
             'Context.Default.VS.Core.User.IsMicrosoftInternal': 'False',
             'Context.Default.VS.Core.User.IsOptedIn': 'True',
             'Context.Default.VS.Core.TelemetryApi.ProductVersion': '{}@{}'.format(
@@ -137,7 +144,9 @@ class TelemetrySession(object):  # pylint: disable=too-many-instance-attributes
                                    lambda: self.application.session['headers'][
                                        'x-ms-client-request-id'])
         self.set_custom_properties(result, 'CoreVersion', _get_core_version)
-        self.set_custom_properties(result, 'InstallationId', _get_installation_id)
+        self.set_custom_properties(result, 'InstallationId',
+                                   lambda: _get_cached_property('InstallationId',
+                                                                _get_installation_id))
         self.set_custom_properties(result, 'ShellType', _get_shell_type)
         self.set_custom_properties(result, 'UserAzureId', _get_user_azure_id)
         self.set_custom_properties(result, 'UserAzureSubscriptionId', _get_azure_subscription_id)
@@ -184,7 +193,11 @@ class TelemetrySession(object):  # pylint: disable=too-many-instance-attributes
     @classmethod
     @decorators.suppress_all_exceptions(raise_in_diagnostics=True)
     def set_custom_properties(cls, prop, name, value):
-        actual_value = value() if hasattr(value, '__call__') else value
+        if hasattr(value, '__call__'):
+            with profiler.phase('telemetry.' + name):
+                actual_value = value()
+        else:
+            actual_value = value
         if actual_value:
             prop[AZURE_CLI_PREFIX + name] = actual_value
 
@@ -205,9 +218,15 @@ def conclude():
     _session.end_time = datetime.datetime.now()
 
     payload = _session.generate_payload()
-    if payload:
-        import subprocess
-        subprocess.Popen([sys.executable, os.path.realpath(telemetry_core.__file__), payload])
+    if not payload:
+        return
+    if _get_azure_cli_config().getboolean('core', 'telemetry_spool', fallback=False):
+        spool_dir = _get_spool_dir()
+        if telemetry_core.spool(payload, spool_dir) and \
+                telemetry_core.acquire_flush_lock(spool_dir):
+            _start_uploader([telemetry_core.FLUSH_ARGUMENT, spool_dir])
+    else:
+        _start_uploader([payload])
 
 
 @decorators.suppress_all_exceptions(raise_in_diagnostics=True)
@@ -271,6 +290,54 @@ def _get_azure_cli_config():
 
 # internal utility functions
 
+@decorators.suppress_all_exceptions(fallback_return=None)
+def _get_property_cache():
+    """ The properties that only change with the installation. They are kept in the
+    configuration directory and discarded when the CLI or Python is upgraded. """
+    global _property_cache  # pylint: disable=global-statement
+    if _property_cache is None:
+        from azure.cli.core._environment import get_config_dir
+        from azure.cli.core._session import TELEMETRY
+        _property_cache = TELEMETRY
+        try:
+            TELEMETRY.load(os.path.join(get_config_dir(), PROPERTY_CACHE_FILE_NAME))
+        except ValueError:
+            # Written by another command at the same time
+            TELEMETRY.data = {}
+        stamp = [TELEMETRY_VERSION, _get_core_version(), platform.python_version()]
+        if TELEMETRY.get('stamp') != stamp:
+            TELEMETRY.data = {'stamp': stamp, 'properties': {}}
+    return _property_cache
+
+
+def _get_cached_property(name, provider):
+    cache = _get_property_cache()
+    properties = cache.get('properties') if cache else None
+    value = properties.get(name) if properties is not None else None
+    if value is None:
+        with profiler.phase('telemetry.' + name):
+            value = provider()
+        if value and properties is not None:
+            properties[name] = value
+            _save_property_cache(cache)
+    return value
+
+
+@decorators.suppress_all_exceptions(fallback_return=None)
+def _save_property_cache(cache):
+    cache.save_with_retry()
+
+
+def _start_uploader(args):
+    import subprocess
+    subprocess.Popen([sys.executable, os.path.realpath(telemetry_core.__file__)] + args)
+
+
+def _get_spool_dir():
+    from azure.cli.core._environment import get_config_dir
+    return os.path.join(get_config_dir(), 'telemetry')
+
+
 @decorators.suppress_all_exceptions(fallback_return=None)
 def _get_core_version():
     from azure.cli.core import __version__ as core_version
@@ -306,7 +373,7 @@ def _get_hash_mac_address():
 @decorators.suppress_all_exceptions(fallback_return='')
 def _get_hash_machine_id():
     # Definition: Take first 128bit of the SHA256 hashed MAC address and convert them into a GUID
-    return str(uuid.UUID(_get_hash_mac_address()[0:32]))
+    return str(uuid.UUID(_get_cached_property('MacAddressHash', _get_hash_mac_address)[0:32]))
 
 
 @decorators.suppress_all_exceptions(fallback_return='')
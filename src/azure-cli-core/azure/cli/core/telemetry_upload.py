@@ -3,15 +3,32 @@
 # Licensed under the MIT License. See License.txt in the project root for license information.
 # --------------------------------------------------------------------------------------------
 
+import glob
 import os
 import sys
 import json
+import time
 import six
 import azure.cli.core.decorators as decorators
 
 DIAGNOSTICS_TELEMETRY_ENV_NAME = 'AZURE_CLI_DIAGNOSTICS_TELEMETRY'
+# Sends the telemetry to another collector, e.g. a local stub in tests
+TELEMETRY_ENDPOINT_ENV_NAME = 'AZURE_CLI_TELEMETRY_ENDPOINT'
 INSTRUMENTATION_KEY = 'c4395b75-49cc-422c-bc95-c7d51aef5d46'
 
+SPOOL_FILE_NAME = 'spool.jsonl'
+FLUSH_LOCK_FILE_NAME = 'flush.lock'
+FLUSH_ARGUMENT = '--flush-spool'
+# The spool is flushed once it reaches this size or its oldest payload this age (in seconds)
+SPOOL_FLUSH_SIZE = 256 * 1024
+SPOOL_FLUSH_AGE = 15 * 60
+# Payloads are dropped while the spool is this large, e.g. when uploads keep failing
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+# A flusher that holds the lock this long (in seconds) is assumed to have died
+FLUSH_LOCK_TIMEOUT = 10 * 60
+# Time (in seconds) given to commands that opened the spool before the flusher took it over
+_SPOOL_WRITE_GRACE = 1
+
 
 def in_diagnostic_mode():
     """
@@ -21,23 +38,65 @@ def in_diagnostic_mode():
     return bool(os.environ.get(DIAGNOSTICS_TELEMETRY_ENV_NAME, False))
 
 
+def _get_spool_sender(endpoint):
+    from applicationinsights.channel import SynchronousSender
+
+    class _SpoolSender(SynchronousSender):
+        """ Raises when the events are not accepted. The synchronous sender puts them back on the
+        queue instead, which the queue then sends again until they are accepted. """
+
+        def send(self, data_to_send):
+            from six.moves.urllib.request import Request, urlopen
+            from six.moves.urllib.error import HTTPError
+
+            body = json.dumps([envelope.write() for envelope in data_to_send])
+            request = Request(self.service_endpoint_uri, bytearray(body, 'utf-8'),
+                              {'Accept': 'application/json',
+                               'Content-Type': 'application/json; charset=utf-8'})
+            try:
+                urlopen(request, timeout=self.send_timeout).close()
+            except HTTPError as ex:
+                # The service rejects malformed events, which are not sent again
+                if ex.code != 400:
+                    raise
+
+    return _SpoolSender(endpoint)
+
+
+def _get_telemetry_client(raise_on_failure=False):
+    from applicationinsights import TelemetryClient
+
+    endpoint = os.environ.get(TELEMETRY_ENDPOINT_ENV_NAME)
+    if not endpoint and not raise_on_failure:
+        return TelemetryClient(INSTRUMENTATION_KEY)
+    from applicationinsights.channel import TelemetryChannel, SynchronousQueue, SynchronousSender
+    sender = _get_spool_sender(endpoint) if raise_on_failure else SynchronousSender(endpoint)
+    channel = TelemetryChannel(queue=SynchronousQueue(sender))
+    return TelemetryClient(INSTRUMENTATION_KEY, channel)
+
+
 @decorators.suppress_all_exceptions(raise_in_diagnostics=True)
 def upload(data_to_save):
-    from applicationinsights import TelemetryClient
+    """ Uploads the events of a payload, given as a JSON string or as a list. """
+    _upload(data_to_save)
+
+
+def _upload(data_to_save, raise_on_failure=False):
     from applicationinsights.exceptions import enable
 
-    client = TelemetryClient(INSTRUMENTATION_KEY)
+    client = _get_telemetry_client(raise_on_failure)
     enable(INSTRUMENTATION_KEY)
 
     if in_diagnostic_mode():
         sys.stdout.write('Telemetry upload begins\n')
 
-    try:
-        data_to_save = json.loads(data_to_save.replace("'", '"'))
-    except Exception as err:  # pylint: disable=broad-except
-        if in_diagnostic_mode():
-            sys.stdout.write('{}/n'.format(str(err)))
-            sys.stdout.write('Raw [{}]/n'.format(data_to_save))
+    if isinstance(data_to_save, six.string_types):
+        try:
+            data_to_save = json.loads(data_to_save.replace("'", '"'))
+        except Exception as err:  # pylint: disable=broad-except
+            if in_diagnostic_mode():
+                sys.stdout.write('{}/n'.format(str(err)))
+                sys.stdout.write('Raw [{}]/n'.format(data_to_save))
 
     for record in data_to_save:
         name = record['name']
@@ -62,8 +121,125 @@ def upload(data_to_save):
         sys.stdout.write('\nTelemetry upload completes\n')
 
 
+def _get_spool_start_time(spool_path):
+    """ The time the oldest payload in the spool was added. """
+    try:
+        with open(spool_path, 'rb') as spool_file:
+            return json.loads(spool_file.readline().decode('utf-8'))['time']
+    except (ValueError, KeyError, TypeError):
+        # Flush a spool that cannot be read
+        return 0
+
+
+def spool(data_to_save, spool_dir):
+    """ Appends a payload to the spool in `spool_dir`. Returns whether the spool should be
+    flushed. """
+    spool_path = os.path.join(spool_dir, SPOOL_FILE_NAME)
+    try:
+        size = os.path.getsize(spool_path)
+    except OSError:
+        size = 0
+        if not os.path.isdir(spool_dir):
+            os.makedirs(spool_dir)
+    if size >= SPOOL_MAX_SIZE:
+        return True
+
+    line = '{{"time": {}, "events": {}}}\n'.format(int(time.time()), data_to_save)
+    # Appends of one line with a single write do not interleave with other commands
+    fd = os.open(spool_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+    try:
+        os.write(fd, line.encode('utf-8'))
+    finally:
+        os.close(fd)
+    return size + len(line) >= SPOOL_FLUSH_SIZE or \
+        time.time() - _get_spool_start_time(spool_path) >= SPOOL_FLUSH_AGE
+
+
+def acquire_flush_lock(spool_dir):
+    """ Returns True if the caller is now the only flusher of the spool. """
+    from azure.cli.core._session import file_lock
+    lock_path = os.path.join(spool_dir, FLUSH_LOCK_FILE_NAME)
+    # Only one process at a time decides that the lock is stale and takes it over
+    with file_lock(lock_path + '.takeover'):
+        try:
+            if time.time() - os.path.getmtime(lock_path) >= FLUSH_LOCK_TIMEOUT:
+                os.remove(lock_path)
+        except OSError:
+            pass
+        try:
+            os.close(os.open(lock_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600))
+        except OSError:
+            return False
+    return True
+
+
+def release_flush_lock(spool_dir):
+    try:
+        os.remove(os.path.join(spool_dir, FLUSH_LOCK_FILE_NAME))
+    except OSError:
+        pass
+
+
+def _read_events(flushing_paths):
+    events = []
+    for path in flushing_paths:
+        with open(path, 'rb') as spool_file:
+            for line in spool_file:
+                try:
+                    events.extend(json.loads(line.decode('utf-8'))['events'])
+                except (ValueError, KeyError, TypeError):
+                    # A truncated or corrupted payload
+                    continue
+    return events
+
+
+def _drop_oldest(flushing_paths):
+    """ Removes the oldest payloads kept by failed flushes while they exceed SPOOL_MAX_SIZE. """
+    size = sum(os.path.getsize(path) for path in flushing_paths)
+    for path in flushing_paths:
+        if size <= SPOOL_MAX_SIZE:
+            break
+        size -= os.path.getsize(path)
+        os.remove(path)
+
+
+def flush_spool(spool_dir):
+    """ Uploads the payloads in the spool, with the payloads that earlier flushes failed to upload,
+    in one batch. The caller holds the flush lock. When the upload fails, the payloads are kept
+    for the next flush. Returns the number of uploaded events. """
+    flushing_path = os.path.join(spool_dir, 'spool.{:.0f}.{}.flushing'.format(
+        time.time() * 1000, os.getpid()))
+    try:
+        os.rename(os.path.join(spool_dir, SPOOL_FILE_NAME), flushing_path)
+        time.sleep(_SPOOL_WRITE_GRACE)
+    except OSError:
+        pass
+
+    # The names start with the time of the flush, so the oldest payloads come first
+    flushing_paths = sorted(glob.glob(os.path.join(spool_dir, 'spool.*.flushing')))
+    events = _read_events(flushing_paths)
+    if events:
+        try:
+            _upload(events, raise_on_failure=True)
+        except Exception:  # pylint: disable=broad-except
+            _drop_oldest(flushing_paths)
+            if in_diagnostic_mode():
+                raise
+            return 0
+    for path in flushing_paths:
+        os.remove(path)
+    return len(events)
+
+
 if __name__ == '__main__':
     # If user doesn't agree to upload telemetry, this scripts won't be executed. The caller should
     # control.
     decorators.is_diagnostics_mode = in_diagnostic_mode
-    upload(sys.argv[1])
+    if len(sys.argv) == 3 and sys.argv[1] == FLUSH_ARGUMENT:
+        # Started by the command that acquired the flush lock
+        try:
+            flush_spool(sys.argv[2])
+        finally:
+            release_flush_lock(sys.argv[2])
+    else:
+        upload(sys.argv[1])
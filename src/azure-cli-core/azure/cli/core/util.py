@@ -148,12 +148,36 @@ def shell_safe_json_parse(json_or_dict_string):
             raise CLIError('{}: {}'.format(ex.msg, ex.text))
 
 
-def todict(obj):  # pylint: disable=too-many-return-statements
+# Values that todict returns as they are. Checked first since most values are primitives.
+_PRIMITIVE_TYPES = frozenset(list(six.string_types) + list(six.integer_types) +
+                             [six.text_type, bytes, float, bool, type(None)])
+# Model class => {attribute name: output key}. An empty key marks attributes that are skipped.
+_KEY_MAPS = {}
 
-    if isinstance(obj, dict):
-        return {k: todict(v) for (k, v) in obj.items()}
+
+def _get_output_key(attribute):
+    return '' if attribute.startswith('_') else to_camel_case(attribute)
+
+
+def todict(obj, post_processor=None):
+    """ Converts SDK models to dictionaries with camel-cased keys, recursively.
+
+    :param post_processor: Called as `post_processor(key, result)` with every dictionary
+        produced, after its values have been converted. `key` is the key the dictionary is
+        stored under in its parent dictionary, if any. Use it to transform the result in the
+        same pass.
+    """
+    return _todict(obj, post_processor, None)
+
+
+def _todict(obj, post_processor, parent_key):  # pylint: disable=too-many-return-statements
+    obj_type = type(obj)
+    if obj_type in _PRIMITIVE_TYPES:
+        return obj
+    elif isinstance(obj, dict):
+        result = {k: _todict(v, post_processor, k) for (k, v) in obj.items()}
     elif isinstance(obj, list):
-        return [todict(a) for a in obj]
+        return [_todict(a, post_processor, parent_key) for a in obj]
     elif isinstance(obj, Enum):
         return obj.value
     elif isinstance(obj, datetime):
@@ -161,13 +185,23 @@ def todict(obj):  # pylint: disable=too-many-return-statements
     elif isinstance(obj, timedelta):
         return str(obj)
     elif hasattr(obj, '_asdict'):
-        return todict(obj._asdict())
+        return _todict(obj._asdict(), post_processor, parent_key)
     elif hasattr(obj, '__dict__'):
-        return dict([(to_camel_case(k), todict(v))
-                     for k, v in obj.__dict__.items()
-                     if not callable(v) and not k.startswith('_')])
+        key_map = _KEY_MAPS.get(obj_type)
+        if key_map is None:
+            key_map = _KEY_MAPS.setdefault(obj_type, {})
+        result = {}
+        for k, v in obj.__dict__.items():
+            key = key_map.get(k)
+            if key is None:
+                key = key_map[k] = _get_output_key(k)
+            if key and not callable(v):
+                result[key] = _todict(v, post_processor, key)
     else:
         return obj
+    if post_processor:
+        post_processor(parent_key, result)
+    return result
 
 
 KEYS_CAMELCASE_PATTERN = re.compile('(?!^)_([a-zA-Z])')
@@ -5,7 +5,8 @@
 
 import unittest
 from six import StringIO
-from azure.cli.core.extensions.transform import _parse_id, _add_resource_group
+from azure.cli.core.extensions.transform import (_parse_id, _resource_group_object_transform,
+                                                 _x509_from_base64_to_hex_object_transform)
 
 
 class TestResourceGroupTransform(unittest.TestCase):
@@ -53,7 +54,7 @@ class TestResourceGroupTransform(unittest.TestCase):
             'id': TestResourceGroupTransform.CORRECT_ID,
             'name': 'A name'
         }
-        _add_resource_group(instance)
+        _resource_group_object_transform(None, instance)
         self.assertDictEqual(instance, {
             'id': TestResourceGroupTransform.CORRECT_ID,
             'resourceGroup': 'REsourceGROUPname',
@@ -65,7 +66,7 @@ class TestResourceGroupTransform(unittest.TestCase):
             'id': TestResourceGroupTransform.BOGUS_ID,
             'name': 'A name'
         }
-        _add_resource_group(instance)
+        _resource_group_object_transform(None, instance)
         self.assertDictEqual(instance, {
             'id': TestResourceGroupTransform.BOGUS_ID,
             'name': 'A name'
@@ -77,13 +78,40 @@ class TestResourceGroupTransform(unittest.TestCase):
             'resourceGroup': 'SomethingElse',
             'name': 'A name'
         }
-        _add_resource_group(instance)
+        _resource_group_object_transform(None, instance)
         self.assertDictEqual(instance, {
             'id': TestResourceGroupTransform.CORRECT_ID,
             'resourceGroup': 'SomethingElse',
             'name': 'A name'
         })
 
+    def test_dont_add_resourcegroup_to_source_vault(self):
+        instance = {'id': TestResourceGroupTransform.CORRECT_ID}
+        _resource_group_object_transform('sourceVault', instance)
+        self.assertDictEqual(instance, {'id': TestResourceGroupTransform.CORRECT_ID})
+
+    def test_add_x509_thumbprint_hex(self):
+        instance = {'x509Thumbprint': 'AQID'}
+        _x509_from_base64_to_hex_object_transform(None, instance)
+        self.assertDictEqual(instance, {'x509Thumbprint': 'AQID', 'x509ThumbprintHex': '010203'})
+        _x509_from_base64_to_hex_object_transform(None, instance)
+        self.assertEqual(instance['x509ThumbprintHex'], '010203')
+        instance = {'x509Thumbprint': None}
+        _x509_from_base64_to_hex_object_transform(None, instance)
+        self.assertNotIn('x509ThumbprintHex', instance)
+
+    def test_add_resourcegroup_while_converting_result(self):
+        from azure.cli.core.application import Application
+        instance = {
+            'id': TestResourceGroupTransform.CORRECT_ID,
+            'secrets': [{'sourceVault': {'id': TestResourceGroupTransform.CORRECT_ID}}],
+            'nics': [{'id': TestResourceGroupTransform.CORRECT_ID, 'resourceGroup': 'other'}]
+        }
+        result = Application().todict([instance])
+        self.assertEqual(result[0]['resourceGroup'], 'REsourceGROUPname')
+        self.assertNotIn('resourceGroup', result[0]['secrets'][0]['sourceVault'])
+        self.assertEqual(result[0]['nics'][0]['resourceGroup'], 'other')
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -7,6 +7,9 @@ import unittest
 
 import os
 import tempfile
+import threading
+import time
+import types
 
 from six import StringIO
 
@@ -83,6 +86,104 @@ class TestApplication(unittest.TestCase):
         self.assertEqual(hellos[1]['hello'], 'sir')
         self.assertEqual(hellos[1]['something'], 'else')
 
+    def test_list_value_parameter_parallel(self):
+        def handler(args):
+            if args['hello'] == 'fail':
+                raise CLIError('failed')
+            return {'hello': args['hello']}
+
+        command = CliCommand('test command', handler)
+        command.add_argument('hello', '--hello', nargs='+', action=IterateAction)
+        cmd_table = {'test command': command}
+
+        argv = 'az test command --hello a fail b c --max-parallel 3'.split()
+        config = Configuration()
+        config.get_command_table = lambda argv: cmd_table
+        application = Application(config)
+        result = application.execute(argv[1:])
+
+        self.assertEqual(config.max_parallel, 3)
+        self.assertEqual([r['hello'] for r in result.result], ['a', 'b', 'c'])
+        self.assertEqual(result.exit_code, 1)
+
+    def test_list_value_parameter_prompts_one_at_a_time(self):
+        lock = threading.Lock()
+        running = []
+        concurrency = []
+
+        def handler(args):
+            with lock:
+                running.append(args['hello'])
+                concurrency.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.remove(args['hello'])
+            return {'hello': args['hello']}
+
+        command = CliCommand('test command', handler)
+        command.add_argument('hello', '--hello', nargs='+', action=IterateAction)
+        command.add_argument('yes', '--yes', action='store_true')
+        config = Configuration()
+        config.get_command_table = lambda argv: {'test command': command}
+        application = Application(config)
+
+        # without --yes, each invocation may prompt for confirmation
+        result = application.execute('test command --hello a b c d --max-parallel 4'.split())
+        self.assertEqual([r['hello'] for r in result.result], ['a', 'b', 'c', 'd'])
+        self.assertEqual(max(concurrency), 1)
+
+        del concurrency[:]
+        application.reset()
+        application.execute('test command --hello a b c d --max-parallel 4 --yes'.split())
+        self.assertTrue(max(concurrency) > 1)
+
+    def test_stream_result(self):
+        def handler(_):
+            for name in ('vm1', 'vm2'):
+                yield {'id': '/subscriptions/sub/resourceGroups/rg{}/providers/Microsoft.Compute/'
+                             'virtualMachines/{}'.format(name[-1], name)}
+
+        cmd_table = {'test command': CliCommand('test command', handler)}
+        config = Configuration()
+        config.get_command_table = lambda argv: cmd_table
+        application = Application(config)
+
+        result = application.execute('test command'.split(), stream_output=True)
+        self.assertIsInstance(result.result, types.GeneratorType)
+        self.assertEqual([r['resourceGroup'] for r in result.result], ['rg1', 'rg2'])
+
+        # the whole result is needed for a query or a table
+        for args in ('--query [].id', '-o table'):
+            application.reset()
+            result = application.execute('test command {}'.format(args).split(),
+                                         stream_output=True)
+            self.assertIsInstance(result.result, list)
+
+    def test_reset_between_commands(self):
+        def handler(args):
+            if args['fail']:
+                raise CLIError('failed')
+            return {'a': 1, 'b': 2}
+
+        command = CliCommand('test command', handler)
+        command.add_argument('fail', '--fail', action='store_true')
+        cmd_table = {'test command': command}
+
+        config = Configuration()
+        config.get_command_table = lambda argv: cmd_table
+        application = Application(config)
+        result = application.execute('test command --query a'.split())
+        self.assertEqual(result.result, 1)
+
+        # a failed command must not leave its query behind for the next one
+        application.reset()
+        with self.assertRaises(CLIError):
+            application.execute('test command --fail --query b'.split())
+        application.reset()
+        result = application.execute('test command'.split())
+        self.assertEqual(result.result, {'a': 1, 'b': 2})
+        self.assertFalse(result.is_query_active)
+
     def test_case_insensitive_command_path(self):
         import argparse
 
@@ -0,0 +1,122 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+from argcomplete.completers import FilesCompleter
+
+from azure.cli.core._config import AzConfig
+from azure.cli.core.commands import CliCommand, CliCommandArgument
+from azure.cli.core.commands import _argument_cache
+from azure.cli.core.commands._argument_cache import (serialize_arguments, deserialize_arguments,
+                                                     get_command_module_name, NotCacheableError,
+                                                     cache_arguments, get_cached_arguments)
+from azure.cli.core.commands.parameters import (enum_choice_list, file_type,
+                                                get_resource_name_completion_list,
+                                                CaseInsensitiveList)
+from azure.cli.core.commands.validators import validate_tags
+
+
+def _roundtrip(arguments):
+    return deserialize_arguments(json.loads(json.dumps(serialize_arguments(arguments))))
+
+
+class TestArgumentCache(unittest.TestCase):
+
+    def test_argument_cache_roundtrip(self):
+        arguments = {
+            'sku': CliCommandArgument('sku', options_list=('--sku',), help='The SKU.',
+                                      default='Standard', required=False,
+                                      **enum_choice_list(['Standard', 'Premium'])),
+            'path': CliCommandArgument('path', options_list=('--path', '-p'), type=file_type,
+                                       completer=FilesCompleter(), validator=validate_tags),
+            'name': CliCommandArgument('name', options_list=('--name',), id_part='name',
+                                       completer=get_resource_name_completion_list('Foo/bar'))
+        }
+        arguments['sku'].type.required_tooling = True
+
+        result = _roundtrip(arguments)
+
+        sku = result['sku']
+        self.assertEqual(sku.options_list, ['--sku'])
+        self.assertEqual(sku.options['help'], 'The SKU.')
+        self.assertEqual(sku.options['default'], 'Standard')
+        self.assertIsInstance(sku.choices, CaseInsensitiveList)
+        self.assertIn('premium', sku.choices)
+        self.assertEqual(sku.options['type']('premium'), 'Premium')
+        self.assertTrue(sku.type.required_tooling)
+
+        path = result['path']
+        self.assertEqual(path.options['type']('~'), os.path.expanduser('~'))
+        self.assertIsInstance(path.completer, FilesCompleter)
+        self.assertEqual(path.validator.__name__, 'validate_tags')
+        self.assertEqual(result['name'].id_part, 'name')
+        self.assertEqual(result['name'].completer.args, ('Foo/bar',))
+
+    def test_argument_cache_rejects_closures(self):
+        arguments = {'name': CliCommandArgument('name', completer=lambda prefix, **kwargs: [])}
+        with self.assertRaises(NotCacheableError):
+            serialize_arguments(arguments)
+
+    def test_argument_cache_command_module_name(self):
+        self.assertEqual(get_command_module_name('azure.cli.command_modules.vm.commands'), 'vm')
+        self.assertIsNone(get_command_module_name('tests.test_argument_cache'))
+        self.assertIsNone(get_command_module_name(None))
+
+    @mock.patch.dict(os.environ, {AzConfig.env_var_name('defaults', 'group'): 'myRG'})
+    def test_argument_cache_applies_configured_defaults(self):
+        arg = CliCommandArgument('resource_group_name', options_list=('-g',), required=True)
+        arg.type.required_tooling = True
+        arg.type.default_name_tooling = 'group'
+        arg.type.configured_default_applied = True
+        command = CliCommand('test cached', None)
+        command.arguments.update(_roundtrip({'resource_group_name': arg}))
+
+        command.apply_configured_defaults()
+
+        result = command.arguments['resource_group_name']
+        self.assertEqual(result.options['default'], 'myRG')
+        self.assertFalse(result.options['required'])
+
+    def test_argument_cache_is_stale_after_sdk_upgrade(self):
+        config_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, config_dir)
+        sdk_metadata = os.path.join(config_dir, 'azure_mgmt_foo-1.0.0.dist-info')
+        os.mkdir(sdk_metadata)
+        dependencies = mock.MagicMock(return_value={sdk_metadata: os.path.getmtime(sdk_metadata)})
+        for patcher in (mock.patch('azure.cli.core._environment.get_config_dir',
+                                   return_value=config_dir),
+                        mock.patch.object(_argument_cache, '_get_stamp', return_value={}),
+                        mock.patch.object(_argument_cache, '_get_dependencies', dependencies),
+                        mock.patch.dict(_argument_cache._loaded_caches, clear=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        command_module = 'azure.cli.command_modules.foo.commands'
+        cache_arguments('foo show', command_module,
+                        {'name': CliCommandArgument('name', options_list=('--name',))})
+
+        _argument_cache._loaded_caches.clear()
+        self.assertEqual(list(get_cached_arguments('foo show', command_module)), ['name'])
+
+        # the upgrade installs the metadata of the new version
+        os.rmdir(sdk_metadata)
+        _argument_cache._loaded_caches.clear()
+        self.assertIsNone(get_cached_arguments('foo show', command_module))
+
+        # without the dependencies the arguments can't be validated later, so they aren't cached
+        dependencies.return_value = None
+        _argument_cache._loaded_caches.clear()
+        cache_arguments('foo show', command_module,
+                        {'name': CliCommandArgument('name', options_list=('--name',))})
+        self.assertEqual(_argument_cache._loaded_caches['foo']['commands'], {})
+
+
+if __name__ == '__main__':
+    unittest.main()
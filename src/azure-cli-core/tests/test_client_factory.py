@@ -0,0 +1,89 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import unittest
+
+import mock
+
+from azure.cli.core.adal_authentication import AdalAuthentication
+from azure.cli.core.application import APPLICATION
+from azure.cli.core.commands import client_factory
+
+
+class _Client(object):  # pylint: disable=too-few-public-methods
+
+    def __init__(self, credentials, subscription_id, base_url=None, api_version=None):
+        self.credentials = credentials
+        self.subscription_id = subscription_id
+        self.base_url = base_url
+        self.api_version = api_version
+        self.config = mock.MagicMock()
+        self._client = mock.MagicMock()
+
+
+class TestClientFactory(unittest.TestCase):
+
+    def setUp(self):
+        client_factory.clear_client_cache()
+        self.profile = mock.MagicMock()
+        self.profile.get_login_credentials.side_effect = \
+            lambda subscription_id=None: ('cred', subscription_id or 'sub1', 'tenant')
+        self.profile.get_subscription.return_value = {'user': {'name': 'user@example.com'}}
+        patcher = mock.patch('azure.cli.core.commands.client_factory.Profile',
+                             return_value=self.profile)
+        self.profile_class = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(client_factory.clear_client_cache)
+
+    def test_client_cache(self):
+        client = client_factory.get_mgmt_service_client(_Client, api_version='2017-01-01')
+        self.assertIs(client_factory.get_mgmt_service_client(_Client, api_version='2017-01-01'),
+                      client)
+        self.assertIsNot(client_factory.get_mgmt_service_client(_Client,
+                                                                api_version='2016-01-01'),
+                         client)
+        other = client_factory.get_mgmt_service_client(_Client, subscription_id='sub2',
+                                                       api_version='2017-01-01')
+        self.assertIsNot(other, client)
+        self.assertEqual(other.subscription_id, 'sub2')
+
+    def test_credentials_are_looked_up_once_per_command(self):
+        client = client_factory.get_mgmt_service_client(_Client)
+        for _ in range(3):
+            self.assertIs(client_factory.get_mgmt_service_client(_Client), client)
+            client_factory.get_mgmt_service_client(_Client, api_version='2016-01-01')
+        self.assertEqual(self.profile_class.call_count, 1)
+        self.assertEqual(self.profile.get_login_credentials.call_count, 1)
+        client_factory.get_mgmt_service_client(_Client, subscription_id='sub2')
+        self.assertEqual(self.profile.get_login_credentials.call_count, 2)
+
+        # the next command looks up the credentials again, and reuses the client
+        with mock.patch.dict(APPLICATION.session, {'mgmt_credentials': {}}):
+            self.assertIs(client_factory.get_mgmt_service_client(_Client), client)
+        self.assertEqual(self.profile.get_login_credentials.call_count, 3)
+
+    def test_cached_client_gets_current_command_name(self):
+        with mock.patch.dict(APPLICATION.session, {'command': 'vm show'}):
+            client = client_factory.get_mgmt_service_client(_Client)
+        with mock.patch.dict(APPLICATION.session, {'command': 'vm list'}):
+            self.assertIs(client_factory.get_mgmt_service_client(_Client), client)
+        client._client.add_header.assert_called_with('CommandName', 'vm list')
+        self.assertEqual(client.config.add_user_agent.call_count, 1)
+
+    def test_sessions_share_connection_pool(self):
+        auth = AdalAuthentication(lambda: ('Bearer', 'token'))
+        first = auth.signed_session()
+        second = auth.signed_session()
+        self.assertEqual(first.headers['Authorization'], 'Bearer token')
+        self.assertIs(first.get_adapter('https://management.azure.com'),
+                      second.get_adapter('https://management.azure.com'))
+        adapter = first.get_adapter('https://management.azure.com')
+        with mock.patch.object(adapter.poolmanager, 'clear') as clear:
+            first.close()
+            self.assertFalse(clear.called)
+
+
+if __name__ == '__main__':
+    unittest.main()
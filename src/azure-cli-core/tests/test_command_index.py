@@ -0,0 +1,83 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import unittest
+from collections import OrderedDict
+
+import mock
+
+import azure.cli.core.commands as commands
+from azure.cli.core._session import INDEX
+
+
+class TestCommandIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        INDEX.load(os.path.join(self.tempdir, 'commandIndex.json'))
+        self.installed = OrderedDict([('vm', 1.0), ('resource', 2.0)])
+        self.loaded = []
+        commands.command_module_map.clear()
+        commands.command_table.clear()
+
+    def tearDown(self):
+        INDEX.filename = None
+        INDEX.data = {}
+        commands.command_module_map.clear()
+        commands.command_table.clear()
+        shutil.rmtree(self.tempdir)
+
+    def _fake_import(self, name):
+        mod = name.split('.')[-1]
+        if mod not in self.installed:
+            raise ImportError(name)
+
+        def load_commands():
+            self.loaded.append(mod)
+            top_level = {'vm': ['vm', 'vmss'], 'resource': ['group', 'resource']}[mod]
+            for command in top_level:
+                commands.command_module_map[command + ' list'] = \
+                    'azure.cli.command_modules.{}.commands'.format(mod)
+
+        return mock.MagicMock(load_commands=load_commands)
+
+    def _get_command_table(self, module_name):
+        with mock.patch('azure.cli.core.commands._get_installed_command_modules',
+                        return_value=self.installed), \
+                mock.patch('azure.cli.core.commands.import_module', side_effect=self._fake_import):
+            return commands.get_command_table(module_name)
+
+    def test_command_index_built_when_loading_all_modules(self):
+        self._get_command_table('vmss')
+        self.assertEqual(self.loaded, ['vm', 'resource'])
+        self.assertEqual(INDEX['commandIndex'],
+                         {'vm': ['vm'], 'vmss': ['vm'], 'group': ['resource'],
+                          'resource': ['resource']})
+
+    def test_command_index_loads_only_owning_module(self):
+        self._get_command_table(None)
+        self.loaded = []
+        self._get_command_table('group')
+        self.assertEqual(self.loaded, ['resource'])
+
+    def test_command_index_invalidated_by_module_changes(self):
+        self._get_command_table(None)
+        self.loaded = []
+        self.installed['vm'] = 3.0
+        self._get_command_table('vmss')
+        self.assertEqual(self.loaded, ['vm', 'resource'])
+
+    def test_command_index_unknown_command_loads_all_modules(self):
+        self._get_command_table(None)
+        self.loaded = []
+        self._get_command_table('unknown')
+        self.assertEqual(self.loaded, ['vm', 'resource'])
+
+
+if __name__ == '__main__':
+    unittest.main()
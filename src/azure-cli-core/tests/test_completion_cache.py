@@ -0,0 +1,131 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import argparse
+import json
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import mock
+
+from azure.cli.core._session import Session
+from azure.cli.core.commands import completion_cache
+from azure.cli.core.util import CLIError
+
+
+class TestCompletionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.config_dir = tempfile.mkdtemp()
+        self.application = mock.MagicMock(session={'completer_active': False})
+        self.subscription_id = mock.MagicMock(return_value='sub1')
+        completion_cache._completions = None
+        for patcher in (mock.patch('azure.cli.core._environment.get_config_dir',
+                                   return_value=self.config_dir),
+                        mock.patch('azure.cli.core.cloud.get_active_cloud_name',
+                                   return_value='AzureCloud'),
+                        mock.patch('azure.cli.core._profile.Profile.get_subscription_id',
+                                   self.subscription_id),
+                        mock.patch('azure.cli.core.application.APPLICATION', self.application),
+                        mock.patch.object(completion_cache, 'get_reference',
+                                          return_value='module#completer'),
+                        mock.patch.object(completion_cache, '_get_ttl', return_value=60)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.calls = []
+
+    def tearDown(self):
+        completion_cache._completions = None
+        shutil.rmtree(self.config_dir)
+
+    def _completer(self, *args, **kwargs):
+        self.calls.append((args, kwargs))
+        return ['{}{}'.format(args[0] if args else 'value', len(self.calls))]
+
+    def test_values_are_cached_per_context(self):
+        completer = completion_cache.cached_completer(
+            context=('resource_group_name',))(self._completer)
+        rg1 = argparse.Namespace(resource_group_name='rg1')
+        self.assertEqual(completer('vm', prefix='a', parsed_args=rg1), ['vm1'])
+        self.assertEqual(completer('vm', prefix='b', parsed_args=rg1), ['vm1'])
+        self.assertEqual(len(self.calls), 1)
+
+        rg2 = argparse.Namespace(resource_group_name='rg2')
+        self.assertEqual(completer('vm', prefix='', parsed_args=rg2), ['vm2'])
+        self.assertEqual(completer('disk', prefix='', parsed_args=rg1), ['disk3'])
+        self.subscription_id.return_value = 'sub2'
+        self.assertEqual(completer('vm', prefix='', parsed_args=rg1), ['vm4'])
+
+        # other processes use the file
+        completion_cache._completions = None
+        self.subscription_id.return_value = 'sub1'
+        with mock.patch('azure.cli.core._session.COMPLETIONS', Session()):
+            self.assertEqual(completer('vm', prefix='', parsed_args=rg2), ['vm2'])
+        self.assertEqual(len(self.calls), 4)
+
+        with mock.patch.object(completion_cache, '_get_ttl', return_value=0):
+            completer('vm', prefix='', parsed_args=rg1)
+        self.assertEqual(len(self.calls), 5)
+
+    def test_completer_is_called_when_values_cannot_be_cached(self):
+        completer = completion_cache.cached_completer()(self._completer)
+        self.subscription_id.side_effect = CLIError('Please run az login')
+        completer(prefix='')
+        completer(prefix='')
+        self.assertEqual(len(self.calls), 2)
+
+    def test_stale_values_are_refreshed_on_a_thread(self):
+        refreshing = threading.Event()
+
+        def _completer(prefix, **kwargs):  # pylint: disable=unused-argument
+            if self.calls:
+                refreshing.wait(10)
+            return self._completer()
+
+        completer = completion_cache.cached_completer()(_completer)
+        self.assertEqual(completer(prefix=''), ['value1'])
+        with mock.patch('time.time', return_value=time.time() + 3600):
+            self.assertEqual(completer(prefix=''), ['value1'])
+            # a refresh is not started twice
+            self.assertEqual(completer(prefix=''), ['value1'])
+        refreshing.set()
+        for _ in range(100):
+            if completer(prefix='') == ['value2']:
+                break
+            time.sleep(0.05)
+        self.assertEqual(completer(prefix=''), ['value2'])
+        self.assertEqual(len(self.calls), 2)
+
+        with mock.patch('time.time', return_value=time.time() + 10 * 24 * 3600):
+            self.assertEqual(completer(prefix=''), ['value3'])
+
+    def test_stale_values_are_refreshed_by_a_process_when_completing(self):
+        completer = completion_cache.cached_completer(
+            context=('resource_group_name',))(self._completer)
+        parsed_args = argparse.Namespace(resource_group_name='rg1')
+        completer('vm', prefix='', parsed_args=parsed_args)
+        self.application.session['completer_active'] = True
+        with mock.patch('time.time', return_value=time.time() + 3600), \
+                mock.patch('subprocess.Popen') as popen:
+            self.assertEqual(completer('vm', prefix='', parsed_args=parsed_args), ['vm1'])
+        command = popen.call_args[0][0]
+        self.assertEqual(command[2], completion_cache.__name__)
+        self.assertEqual(command[4:], ['module#completer', '["vm"]',
+                                       '{"resource_group_name": "rg1"}'])
+        self.assertEqual(len(self.calls), 1)
+
+        with mock.patch.object(completion_cache, 'resolve_reference',
+                               return_value=completer):
+            completion_cache.refresh(command[3], command[4], json.loads(command[5]),
+                                     json.loads(command[6]))
+        self.assertEqual(completer('vm', prefix='', parsed_args=parsed_args), ['vm2'])
+        self.assertEqual(self.calls[1][1]['parsed_args'].resource_group_name, 'rg1')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,7 +5,7 @@
 
 import unittest
 
-from azure.cli.core.extensions.query import jmespath_type
+from azure.cli.core.extensions.query import jmespath_type, plan_query
 
 
 class TestQuery(unittest.TestCase):
@@ -56,5 +56,47 @@ class TestQuery(unittest.TestCase):
             jmespath_type(query)
 
 
+class TestQueryPushdown(unittest.TestCase):
+
+    FILTER_FIELDS = {'location': 'location', 'status.value': 'status'}
+    SELECT_FIELDS = {'name': 'name', 'location': 'location', 'status': 'status'}
+
+    def _plan(self, query):
+        return plan_query(jmespath_type(query).parsed, self.FILTER_FIELDS, self.SELECT_FIELDS)
+
+    def test_pushdown_filter_and_select(self):
+        plan = self._plan("[?location=='westus' && status.value=='O\\'k' && id=='x'].name")
+        self.assertEqual(plan.filter, "location eq 'westus' and status eq 'O''k'")
+        self.assertIsNone(plan.select)  # the condition uses 'id'
+
+        plan = self._plan("[?'westus'==location].{n: name, s: status.value}")
+        self.assertEqual(plan.filter, "location eq 'westus'")
+        self.assertEqual(plan.select, ['location', 'name', 'status'])
+        self.assertIsNone(plan.limit)
+
+    def test_pushdown_limit(self):
+        self.assertEqual(self._plan('[0:10]').limit, 10)
+        self.assertEqual(self._plan('[:10].name').select, ['name'])
+        self.assertEqual(self._plan('[2]').limit, 3)
+        self.assertEqual(self._plan('[:5] | length(@)').limit, 5)
+        self.assertIsNone(self._plan('[-5:]').limit)
+        self.assertIsNone(self._plan('[::-1]').limit)
+
+    def test_no_pushdown(self):
+        for query in ["[?location=='westus' || name=='x']", "[?contains(name, 'x')]",
+                      "length(@)", "[].tags.env",
+                      "sort_by(@, &name)[0:10]", "[?location==`1`]"]:
+            plan = self._plan(query)
+            self.assertIsNone(plan.filter, query)
+            self.assertIsNone(plan.limit, query)
+        plan = self._plan("[?location=='westus'] | [0]")
+        self.assertEqual(plan.filter, "location eq 'westus'")
+        self.assertIsNone(plan.limit)  # the index applies to the filtered list
+        self.assertIsNone(self._plan('[]').select)
+        results = [1, 2, 3]
+        self.assertIs(self._plan('[]').limit_results(results), results)
+        self.assertEqual(list(self._plan('[:2]').limit_results(iter(results))), [1, 2])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -604,6 +604,7 @@ Global Arguments
             app.register(app.COMMAND_TABLE_PARAMS_LOADED, add_id_parameters)
             app.raise_event(app.COMMAND_TABLE_PARAMS_LOADED, command_table=cmd_tbl)
             app.parser.load_command_table(cmd_tbl)
+            app.parser.load_pending_commands()
             _store_parsers(app.parser, parser_dict)
 
             for name, parser in parser_dict.items():
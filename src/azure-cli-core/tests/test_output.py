@@ -8,9 +8,10 @@ from __future__ import print_function
 import unittest
 from collections import OrderedDict
 from six import StringIO
+from tabulate import tabulate
 
-from azure.cli.core._output import (OutputProducer, format_json, format_table,
-                                    format_tsv, CommandResultItem)
+from azure.cli.core._output import (OutputProducer, format_json, format_jsonl, format_table,
+                                    format_tsv, stream_tsv, CommandResultItem, TableOutput)
 import azure.cli.core.util as util
 
 
@@ -57,6 +58,23 @@ class TestCoreCLIOutput(unittest.TestCase):
 }
 """))
 
+    def test_out_json_streamed(self):
+        items = [{'active': True, 'id': '0b1f6472', 'tags': {'a': 'b'}}, {'id': 'x\ny'}]
+        output_producer = OutputProducer(formatter=format_json, file=self.io)
+        output_producer.out(CommandResultItem(item for item in items))
+        self.assertEqual(self.io.getvalue(), format_json(CommandResultItem(items)))
+
+    def test_out_json_streamed_empty(self):
+        output_producer = OutputProducer(formatter=format_json, file=self.io)
+        output_producer.out(CommandResultItem(item for item in []))
+        self.assertEqual(self.io.getvalue(), format_json(CommandResultItem([])))
+
+    def test_out_jsonl(self):
+        output_producer = OutputProducer(formatter=format_jsonl, file=self.io)
+        output_producer.out(CommandResultItem(item for item in [{'b': 1, 'a': [1, 2]}, 'c']))
+        output_producer.out(CommandResultItem({'d': None}))
+        self.assertEqual(self.io.getvalue(), '{"a":[1,2],"b":1}\n"c"\n{"d":null}\n')
+
     def test_out_json_byte_empty(self):
         output_producer = OutputProducer(formatter=format_json, file=self.io)
         output_producer.out(CommandResultItem({'active': True, 'contents': b''}))
@@ -135,6 +153,23 @@ True      qwerty  0b1f6472  0b1f6472qwerty
 qwerty  0b1f6472qwerty  True      0b1f6472
 """))
 
+    def test_out_table_matches_tabulate(self):
+        obj = [OrderedDict([('name', ' vm1 '), ('count', 3), ('ratio', 1.5), ('state', 'True')]),
+               OrderedDict([('name', 'vm\u6f22'), ('count', '12'), ('ratio', None),
+                            ('extra', 'x')]),
+               OrderedDict([('count', 100), ('ratio', '1e3'), ('state', False)])]
+        expected = tabulate(TableOutput()._auto_table(obj), headers="keys", tablefmt="simple")
+        self.assertEqual(format_table(CommandResultItem(obj, is_query_active=True)),
+                         expected + '\n')
+
+    def test_out_table_multiline_cell_matches_tabulate(self):
+        obj = [OrderedDict([('A', 10), ('B', 1.5), ('C', 'x\ny'), ('D', 1)]),
+               OrderedDict([('A', 2), ('B', 0.25), ('C', 'long text'), ('D', 22)])]
+        expected = tabulate(TableOutput()._auto_table(obj), headers="keys", tablefmt="simple")
+        self.assertEqual(format_table(CommandResultItem(obj, is_query_active=True)),
+                         expected + '\n')
+        self.assertEqual(len(expected.split('\n')), 5)
+
     # TSV output tests
     def test_output_format_dict(self):
         obj = {}
@@ -168,6 +203,16 @@ qwerty  0b1f6472qwerty  True      0b1f6472
         result = format_tsv(CommandResultItem([obj1, obj2]))
         self.assertEqual(result, '1\t2\n3\t4\n')
 
+    def test_output_format_dict_list_changing_keys(self):
+        obj = [{'B': 1, 'A': 2}, {'A': 3, 'B': 4}, {'C': 5, 'A': 6}, True]
+        result = format_tsv(CommandResultItem(obj))
+        self.assertEqual(result, '2\t1\n3\t4\n6\t5\ntrue\n')
+
+    def test_out_tsv_streamed(self):
+        output_producer = OutputProducer(formatter=stream_tsv, file=self.io)
+        output_producer.out(CommandResultItem(item for item in [{'b': 1, 'a': [1, 2]}, 'c']))
+        self.assertEqual(self.io.getvalue(), '2\t1\nc\n')
+
 
 if __name__ == '__main__':
     unittest.main()
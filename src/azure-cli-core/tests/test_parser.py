@@ -105,6 +105,41 @@ class TestParser(unittest.TestCase):
         args = parser.parse_args('test command --opt sNake_CASE'.split())
         self.assertEqual(args.opt, 'snake_case')
 
+    def test_lazy_parser_builds_only_typed_command(self):
+        def test_handler():
+            pass
+
+        cmd_table = {name: CliCommand(name, test_handler) for name in
+                     ('group list', 'group show', 'vm list', 'vm disk list')}
+        parser = AzCliCommandParser(lazy=True)
+        parser.load_command_table(cmd_table)
+
+        args = parser.parse_args('vm list'.split())
+        self.assertIs(args.func, cmd_table['vm list'])
+        self.assertEqual(set(parser.subparsers[('vm',)].choices), {'list'})
+        self.assertNotIn('group', parser.subparsers[()].choices)
+
+        # naming a group builds all commands below it
+        parser.load_pending_commands(['vm'])
+        self.assertEqual(set(parser.subparsers[('vm',)].choices), {'list', 'disk'})
+        self.assertNotIn('group', parser.subparsers[()].choices)
+
+        parser.load_pending_commands()
+        self.assertEqual(set(parser.subparsers[('group',)].choices), {'list', 'show'})
+
+    def test_lazy_parser_uses_latest_command_table(self):
+        def test_handler():
+            pass
+
+        command = CliCommand('test command', test_handler)
+        parser = AzCliCommandParser(lazy=True)
+        parser.load_command_table({'test command': command})
+        command.add_argument('opt', '--opt')
+        parser.load_command_table({'test command': command})
+
+        args = parser.parse_args('test command --opt value'.split())
+        self.assertEqual(args.opt, 'value')
+
 
 class VerifyError(object):  # pylint: disable=too-few-public-methods
 
@@ -0,0 +1,167 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import json
+import threading
+import time
+import unittest
+from email.utils import formatdate
+
+import mock
+
+from azure.cli.core.commands import LongRunningOperation
+from azure.cli.core.commands.polling import (Backoff, PollScheduler, get_retry_after,
+                                             use_adaptive_operation_polling, wait_until)
+from azure.cli.core.util import CLIError
+
+
+class _Response(object):  # pylint: disable=too-few-public-methods
+
+    def __init__(self, headers=None, content=None):
+        self.headers = headers or {}
+        self._content = content
+
+
+class _Poller(object):
+
+    def __init__(self, content=None):
+        self._response = _Response(content=content)
+        self._callbacks = []
+        self._finished = False
+
+    def finish(self):
+        self._finished = True
+        for callback in self._callbacks:
+            callback(None)
+
+    def done(self):
+        return self._finished
+
+    def add_done_callback(self, func):
+        self._callbacks.append(func)
+
+    def result(self):
+        return 'result'
+
+
+class TestPolling(unittest.TestCase):
+
+    def test_backoff(self):
+        backoff = Backoff(initial=1, maximum=5)
+        with mock.patch('random.uniform', side_effect=lambda low, high: high):
+            self.assertEqual([backoff.next_delay() for _ in range(5)], [1, 2, 4, 5, 5])
+            self.assertEqual(backoff.next_delay(retry_after=12), 12)
+        for _ in range(20):
+            self.assertTrue(2.5 <= backoff.next_delay() <= 5)
+
+    def test_get_retry_after(self):
+        self.assertIsNone(get_retry_after(_Response()))
+        self.assertIsNone(get_retry_after(None))
+        self.assertEqual(get_retry_after(_Response({'retry-after': '7'})), 7)
+        self.assertIsNone(get_retry_after(_Response({'retry-after': 'soon'})))
+        later = get_retry_after(_Response({'retry-after': formatdate(time.time() + 60)}))
+        self.assertTrue(55 < later <= 60)
+        self.assertEqual(get_retry_after(_Response({'retry-after': formatdate(0)})), 0)
+
+    def test_scheduler_polls_jobs_on_few_threads(self):
+        scheduler = PollScheduler(max_workers=2)
+        threads = set()
+
+        def _poll_factory(count):
+            calls = []
+
+            def _poll():
+                threads.add(threading.current_thread())
+                calls.append(None)
+                return len(calls) == count, 0
+            return _poll
+
+        jobs = [scheduler.submit(_poll_factory(n), Backoff()) for n in (1, 3, 5, 2, 4)]
+        self.assertTrue(all(job.wait(timeout=10) for job in jobs))
+        self.assertTrue(1 <= len(threads) <= 2)
+
+    def test_slow_poll_does_not_hold_back_other_jobs(self):
+        scheduler = PollScheduler(max_workers=2)
+        release = threading.Event()
+        slow = scheduler.submit(lambda: (release.wait(10), None))
+        fast = scheduler.submit(lambda: (True, None))
+        start = time.time()
+        self.assertTrue(fast.wait(timeout=5))
+        self.assertTrue(time.time() - start < 2)
+        self.assertFalse(slow.wait(timeout=0.1))
+        release.set()
+
+    def test_poll_now_while_polling_polls_once_more(self):
+        scheduler = PollScheduler()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+        active = []
+
+        def _poll():
+            active.append(None)
+            self.assertEqual(len(active), 1)
+            calls.append(None)
+            started.set()
+            release.wait(10)
+            active.pop()
+            return len(calls) == 2, None
+
+        job = scheduler.submit(_poll, Backoff(initial=60, maximum=60))
+        self.assertTrue(started.wait(5))
+        job.poll_now()
+        job.poll_now()
+        release.set()
+        # the second poll follows at once instead of after the 60 second backoff
+        self.assertTrue(job.wait(timeout=5))
+        self.assertEqual(len(calls), 2)
+
+    def test_wait_until_raises_errors_and_times_out(self):
+        def _fail():
+            raise CLIError('The operation failed')
+
+        with self.assertRaises(CLIError):
+            wait_until(_fail)
+
+        polls = []
+        self.assertFalse(wait_until(lambda: polls.append(None) or (False, None),
+                                    Backoff(initial=0.1, maximum=0.1), timeout=0.5))
+        count = len(polls)
+        self.assertTrue(count > 1)
+        time.sleep(0.3)
+        # an abandoned job is not polled again
+        self.assertEqual(len(polls), count)
+
+    def test_long_running_operation_wakes_on_completion(self):
+        content = json.dumps({'properties': {'correlationId': 'abc'}})
+        poller = _Poller(content)
+        threading.Timer(0.2, poller.finish).start()
+        with mock.patch('azure.cli.core.commands._get_correlation_id',
+                        wraps=lambda _: 'abc') as get_correlation_id:
+            start = time.time()
+            operation = LongRunningOperation(poller_done_interval_ms=10000.0)
+            self.assertEqual(operation(poller), 'result')
+            self.assertTrue(time.time() - start < 5)
+            self.assertEqual(get_correlation_id.call_count, 1)
+
+    def test_adaptive_operation_polling_keeps_replacements(self):
+        from msrestazure.azure_operation import AzureOperationPoller
+
+        original = AzureOperationPoller.__dict__['_delay']
+        try:
+            with mock.patch.object(AzureOperationPoller, '_delay', lambda _: None) as delay:
+                use_adaptive_operation_polling()
+                self.assertIs(AzureOperationPoller.__dict__['_delay'], delay)
+            use_adaptive_operation_polling()
+            poller = mock.MagicMock(_timeout=4, _response=_Response({'retry-after': '3'}))
+            with mock.patch('time.sleep') as sleep:
+                AzureOperationPoller.__dict__['_delay'](poller)
+            sleep.assert_called_once_with(3)
+        finally:
+            AzureOperationPoller._delay = original  # pylint: disable=protected-access
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,8 +4,11 @@
 # --------------------------------------------------------------------------------------------
 
 # pylint: disable=protected-access, unsubscriptable-object
+import datetime
 import json
 import os
+import shutil
+import tempfile
 import unittest
 import mock
 
@@ -13,7 +16,7 @@ from adal import AdalError
 from azure.mgmt.resource.subscriptions.models import (SubscriptionState, Subscription,
                                                       SubscriptionPolicies, SpendingLimit)
 from azure.cli.core._profile import (Profile, CredsCache, SubscriptionFinder,
-                                     ServicePrincipalAuth, CLOUD)
+                                     ServicePrincipalAuth, TokenStore, CLOUD)
 from azure.cli.core.util import CLIError
 
 
@@ -608,9 +611,8 @@ class Test_Profile(unittest.TestCase):  # pylint: disable=too-many-public-method
         self.assertEqual(creds_cache._service_principal_creds, [test_sp])
 
     @mock.patch('azure.cli.core._profile._load_tokens_from_file', autospec=True)
-    @mock.patch('os.fdopen', autospec=True)
-    @mock.patch('os.open', autospec=True)
-    def test_credscache_add_new_sp_creds(self, _, mock_open_for_write, mock_read_file):
+    @mock.patch('azure.cli.core._profile._save_tokens_to_file', autospec=True)
+    def test_credscache_add_new_sp_creds(self, mock_save_tokens, mock_read_file):
         test_sp = {
             "servicePrincipalId": "myapp",
             "servicePrincipalTenant": "mytenant",
@@ -621,7 +623,6 @@ class Test_Profile(unittest.TestCase):  # pylint: disable=too-many-public-method
             "servicePrincipalTenant": "mytenant2",
             "accessToken": "Secret2"
         }
-        mock_open_for_write.return_value = FileHandleStub()
         mock_read_file.return_value = [self.token_entry1, test_sp]
         creds_cache = CredsCache(async_persist=False)
 
@@ -632,18 +633,19 @@ class Test_Profile(unittest.TestCase):  # pylint: disable=too-many-public-method
         token_entries = [e for _, e in creds_cache.adal_token_cache.read_items()]  # noqa: F812
         self.assertEqual(token_entries, [self.token_entry1])
         self.assertEqual(creds_cache._service_principal_creds, [test_sp, test_sp2])
-        mock_open_for_write.assert_called_with(mock.ANY, 'w+')
+        mock_save_tokens.assert_called_once_with(mock.ANY, mock.ANY)
+        merge = mock_save_tokens.call_args[0][1]
+        self.assertEqual(merge([self.token_entry1, test_sp]),
+                         [self.token_entry1, test_sp, test_sp2])
 
     @mock.patch('azure.cli.core._profile._load_tokens_from_file', autospec=True)
-    @mock.patch('os.fdopen', autospec=True)
-    @mock.patch('os.open', autospec=True)
-    def test_credscache_add_preexisting_sp_creds(self, _, mock_open_for_write, mock_read_file):
+    @mock.patch('azure.cli.core._profile._save_tokens_to_file', autospec=True)
+    def test_credscache_add_preexisting_sp_creds(self, mock_save_tokens, mock_read_file):
         test_sp = {
             "servicePrincipalId": "myapp",
             "servicePrincipalTenant": "mytenant",
             "accessToken": "Secret"
         }
-        mock_open_for_write.return_value = FileHandleStub()
         mock_read_file.return_value = [test_sp]
         creds_cache = CredsCache(async_persist=False)
 
@@ -654,15 +656,13 @@ class Test_Profile(unittest.TestCase):  # pylint: disable=too-many-public-method
         self.assertEqual(creds_cache._service_principal_creds, [test_sp])
 
     @mock.patch('azure.cli.core._profile._load_tokens_from_file', autospec=True)
-    @mock.patch('os.fdopen', autospec=True)
-    @mock.patch('os.open', autospec=True)
-    def test_credscache_remove_creds(self, _, mock_open_for_write, mock_read_file):
+    @mock.patch('azure.cli.core._profile._save_tokens_to_file', autospec=True)
+    def test_credscache_remove_creds(self, mock_save_tokens, mock_read_file):
         test_sp = {
             "servicePrincipalId": "myapp",
             "servicePrincipalTenant": "mytenant",
             "accessToken": "Secret"
         }
-        mock_open_for_write.return_value = FileHandleStub()
         mock_read_file.return_value = [self.token_entry1, test_sp]
         creds_cache = CredsCache(async_persist=False)
 
@@ -679,14 +679,15 @@ class Test_Profile(unittest.TestCase):  # pylint: disable=too-many-public-method
         # assert #2
         self.assertEqual(creds_cache._service_principal_creds, [])
 
-        mock_open_for_write.assert_called_with(mock.ANY, 'w+')
-        self.assertEqual(mock_open_for_write.call_count, 2)
+        mock_save_tokens.assert_called_with(mock.ANY, mock.ANY)
+        self.assertEqual(mock_save_tokens.call_count, 2)
+        merge = mock_save_tokens.call_args[0][1]
+        self.assertEqual(merge([self.token_entry1, test_sp]), [])
 
     @mock.patch('azure.cli.core._profile._load_tokens_from_file', autospec=True)
-    @mock.patch('os.fdopen', autospec=True)
-    @mock.patch('os.open', autospec=True)
+    @mock.patch('azure.cli.core._profile._save_tokens_to_file', autospec=True)
     @mock.patch('adal.AuthenticationContext', autospec=True)
-    def test_credscache_new_token_added_by_adal(self, mock_adal_auth_context, _, mock_open_for_write, mock_read_file):  # pylint: disable=line-too-long
+    def test_credscache_new_token_added_by_adal(self, mock_adal_auth_context, mock_save_tokens, mock_read_file):  # pylint: disable=line-too-long
         token_entry2 = {
             "accessToken": "new token",
             "tokenType": "Bearer",
@@ -702,7 +703,6 @@ class Test_Profile(unittest.TestCase):  # pylint: disable=too-many-public-method
             return mock_adal_auth_context
 
         mock_adal_auth_context.acquire_token.side_effect = acquire_token_side_effect
-        mock_open_for_write.return_value = FileHandleStub()
         mock_read_file.return_value = [self.token_entry1]
         creds_cache = CredsCache(auth_ctx_factory=get_auth_context, async_persist=False)
 
@@ -716,10 +716,103 @@ class Test_Profile(unittest.TestCase):  # pylint: disable=too-many-public-method
             mock.ANY)
 
         # assert
-        mock_open_for_write.assert_called_with(mock.ANY, 'w+')
+        mock_save_tokens.assert_called_with(mock.ANY, mock.ANY)
         self.assertEqual(token, 'new token')
         self.assertEqual(token_type, token_entry2['tokenType'])
 
+    def test_token_store_find(self):
+        other_client = dict(self.token_entry1, _clientId='other client')
+        other_user = dict(self.token_entry1, userId='bar@bar.com', isMRRT=False)
+        store = TokenStore([self.token_entry1, other_client, other_user])
+
+        self.assertEqual(store.find({'userId': 'FOO@foo.com',
+                                     '_clientId': self.token_entry1['_clientId'].upper()}),
+                         [self.token_entry1])
+        self.assertEqual(store.find({'userId': self.user1}), [self.token_entry1, other_client])
+        self.assertEqual(store.find({'isMRRT': True}), [self.token_entry1, other_client])
+        self.assertFalse(store.has_state_changed)
+
+        store.remove([other_client])
+        self.assertEqual(store.find({'userId': self.user1, '_clientId': 'other client'}), [])
+        self.assertTrue(store.has_state_changed)
+        self.assertEqual(json.loads(store.serialize()), [self.token_entry1, other_user])
+
+    def test_token_store_keeps_changes_on_update(self):
+        token_entry2 = dict(self.token_entry1, resource='https://graph.windows.net/')
+        token_entry3 = dict(self.token_entry1, userId='bar@bar.com')
+        store = TokenStore([self.token_entry1])
+        store.add([token_entry2])
+
+        # another process removed token_entry1 and added token_entry3
+        store.update([token_entry3])
+        self.assertEqual([e for _, e in store.read_items()], [token_entry3, token_entry2])
+        self.assertEqual(store.apply_changes([self.token_entry1]),
+                         [self.token_entry1, token_entry2])
+        store.clear_changes()
+        self.assertEqual(store.apply_changes([]), [])
+
+    def test_credscache_keeps_tokens_saved_by_other_processes(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        token_file = os.path.join(temp_dir, 'accessTokens.json')
+        token_entry2 = dict(self.token_entry1, userId='bar@bar.com')
+        with open(token_file, 'w') as f:
+            json.dump([self.token_entry1], f)
+
+        with mock.patch.dict(os.environ, {'AZURE_ACCESS_TOKEN_FILE': token_file}):
+            creds_cache = CredsCache(async_persist=False)
+            other_creds_cache = CredsCache(async_persist=False)
+        creds_cache.load_adal_token_cache()
+        other_creds_cache.adal_token_cache.add([token_entry2])
+        other_creds_cache.persist_cached_creds()
+
+        creds_cache.remove_cached_creds(self.user1)
+        with open(token_file) as f:
+            self.assertEqual(json.load(f), [token_entry2])
+
+        # the file changed, so it is read again before tokens are looked up
+        other_creds_cache.adal_token_cache.add([self.token_entry1])
+        other_creds_cache.persist_cached_creds()
+        context = mock.MagicMock()
+        context.acquire_token.side_effect = \
+            lambda *_: creds_cache.adal_token_cache.find({'userId': self.user1})[0]
+        creds_cache._auth_ctx_factory = lambda authority, cache: context
+        creds_cache.retrieve_token_for_user(self.user1, self.tenant_id, 'resource')
+        self.assertEqual(len(creds_cache.adal_token_cache.read_items()), 2)
+
+    @mock.patch('azure.cli.core._profile._load_tokens_from_file', autospec=True)
+    @mock.patch('azure.cli.core._profile._save_tokens_to_file', autospec=True)
+    def test_credscache_refreshes_token_ahead_of_expiry(self, mock_save_tokens, mock_read_file):
+        expires_on = datetime.datetime.now() + datetime.timedelta(minutes=8)
+        token_entry = dict(self.token_entry1, resource='resource', refreshToken='refresh token',
+                           _authority='https://login.microsoftonline.com/' + self.tenant_id,
+                           expiresOn=str(expires_on))
+        mock_read_file.return_value = [token_entry]
+        refreshed = {'accessToken': 'new token', 'refreshToken': 'new refresh token',
+                     'expiresOn': str(expires_on + datetime.timedelta(hours=1))}
+        context = mock.MagicMock()
+        context.acquire_token.return_value = token_entry
+        context.acquire_token_with_refresh_token.return_value = refreshed
+        with mock.patch('atexit.register'):
+            creds_cache = CredsCache(auth_ctx_factory=lambda authority, cache: context,
+                                     async_persist=True)
+
+        # a process that runs a single command doesn't refresh ahead of expiry
+        creds_cache.retrieve_token_for_user(self.user1, self.tenant_id, 'resource')
+        creds_cache.flush_to_disk()
+        self.assertFalse(context.acquire_token_with_refresh_token.called)
+
+        with mock.patch('azure.cli.core._profile._refresh_ahead', True):
+            _, token = creds_cache.retrieve_token_for_user(self.user1, self.tenant_id,
+                                                           'resource')
+        self.assertEqual(token, self.raw_token1)
+        creds_cache.flush_to_disk()
+
+        context.acquire_token_with_refresh_token.assert_called_once_with(
+            'refresh token', mock.ANY, 'resource')
+        merge = mock_save_tokens.call_args[0][1]
+        self.assertEqual(merge([token_entry]), [dict(token_entry, **refreshed)])
+
     def test_service_principal_auth_client_secret(self):
         sp_auth = ServicePrincipalAuth('verySecret!')
         result = sp_auth.get_entry_to_persist('sp_id1', 'tenant1')
@@ -743,18 +836,6 @@ class Test_Profile(unittest.TestCase):  # pylint: disable=too-many-public-method
         })
 
 
-class FileHandleStub(object):  # pylint: disable=too-few-public-methods
-
-    def write(self, content):
-        pass
-
-    def __enter__(self):
-        return self
-
-    def __exit__(self, _2, _3, _4):
-        pass
-
-
 class SubscriptionStub(Subscription):  # pylint: disable=too-few-public-methods
 
     def __init__(self, id, display_name, state, tenant_id):  # pylint: disable=redefined-builtin,
@@ -0,0 +1,70 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import mock
+
+import azure.cli.core.profiler as profiler
+
+
+class TestStartupProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        profiler.disable()
+        shutil.rmtree(self.tempdir)
+
+    @mock.patch.dict(os.environ, {profiler.PROFILE_ENV_VAR: ''})
+    def test_profiler_enabled_by_argument(self):
+        args = ['vm', 'list', '--profile-startup', '-g', 'rg']
+        self.assertTrue(profiler.enable_from_args(args))
+        self.assertEqual(args, ['vm', 'list', '-g', 'rg'])
+        self.assertEqual(profiler._profile.command, 'vm list')  # pylint: disable=protected-access
+
+    @mock.patch.dict(os.environ, {profiler.PROFILE_ENV_VAR: ''})
+    def test_profiler_disabled_by_default(self):
+        self.assertFalse(profiler.enable_from_args(['vm', 'list']))
+        with profiler.phase('parse'):
+            pass
+        self.assertIsNone(profiler.write_report())
+
+    def test_profiler_report(self):
+        report_path = os.path.join(self.tempdir, 'report.json')
+        with mock.patch.dict(os.environ, {profiler.PROFILE_ENV_VAR: report_path}):
+            profiler.enable_from_args(['vm', 'list'])
+
+        module_dir = os.path.join(self.tempdir, 'modules')
+        os.makedirs(module_dir)
+        with open(os.path.join(module_dir, 'profiled_module.py'), 'w') as f:
+            f.write('import json\n')
+        sys.path.insert(0, module_dir)
+        try:
+            with profiler.phase('handler'):
+                import profiled_module  # pylint: disable=import-error,unused-variable
+            with profiler.phase('handler'):
+                pass
+        finally:
+            sys.path.remove(module_dir)
+            sys.modules.pop('profiled_module', None)
+
+        report = profiler.write_report()
+        self.assertFalse(profiler.is_enabled())
+        with open(report_path) as f:
+            self.assertEqual(json.load(f), report)
+        self.assertEqual(report['command'], 'vm list')
+        self.assertEqual([(p['name'], p['count']) for p in report['phases']], [('handler', 2)])
+        self.assertEqual([i['module'] for i in report['imports']], ['profiled_module'])
+
+
+if __name__ == '__main__':
+    unittest.main()
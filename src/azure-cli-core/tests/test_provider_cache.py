@@ -0,0 +1,91 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from azure.cli.core._session import Session
+from azure.cli.core.commands import provider_cache
+
+
+def _get_client(subscription_id='00000000-0000-0000-0000-000000000000'):
+    resource_type = mock.MagicMock(resource_type='virtualMachines',
+                                   api_versions=['2017-03-30', '2016-04-30-preview'])
+    client = mock.MagicMock()
+    client.config.subscription_id = subscription_id
+    client.providers.get.return_value = mock.MagicMock(resource_types=[resource_type])
+    return client
+
+
+class TestProviderCache(unittest.TestCase):
+
+    def setUp(self):
+        self.config_dir = tempfile.mkdtemp()
+        provider_cache._providers = None
+        for patcher in (mock.patch('azure.cli.core._environment.get_config_dir',
+                                   return_value=self.config_dir),
+                        mock.patch.object(provider_cache, '_get_ttl', return_value=3600)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        provider_cache._providers = None
+        shutil.rmtree(self.config_dir)
+
+    def test_api_versions_are_cached(self):
+        client = _get_client()
+        for _ in range(3):
+            self.assertEqual(provider_cache.get_api_versions(client, 'Microsoft.Compute',
+                                                             'VirtualMachines'),
+                             ['2017-03-30', '2016-04-30-preview'])
+        self.assertIsNone(provider_cache.get_api_versions(client, 'microsoft.compute', 'disks'))
+        client.providers.get.assert_called_once_with('Microsoft.Compute')
+
+        # other processes use the file
+        provider_cache._providers = None
+        other_client = _get_client()
+        with mock.patch('azure.cli.core._session.PROVIDERS', Session()):
+            provider_cache.get_api_versions(other_client, 'Microsoft.Compute', 'virtualMachines')
+        self.assertFalse(other_client.providers.get.called)
+        with open(os.path.join(self.config_dir, provider_cache.PROVIDER_CACHE_FILE_NAME),
+                  'rb') as f:
+            self.assertEqual(len(json.loads(f.read().decode('utf-8-sig'))), 1)
+
+        # other subscriptions do not
+        other_subscription = _get_client('11111111-1111-1111-1111-111111111111')
+        provider_cache.get_api_versions(other_subscription, 'Microsoft.Compute', 'disks')
+        self.assertTrue(other_subscription.providers.get.called)
+
+    def test_api_versions_expire_and_are_invalidated(self):
+        client = _get_client()
+        provider_cache.get_api_versions(client, 'Microsoft.Compute', 'virtualMachines')
+        provider_cache.invalidate_api_versions(client, 'MICROSOFT.COMPUTE')
+        provider_cache.get_api_versions(client, 'Microsoft.Compute', 'virtualMachines')
+        self.assertEqual(client.providers.get.call_count, 2)
+
+        with mock.patch('time.time', return_value=10 ** 10):
+            provider_cache.get_api_versions(client, 'Microsoft.Compute', 'virtualMachines')
+        self.assertEqual(client.providers.get.call_count, 3)
+
+        with mock.patch.object(provider_cache, '_get_ttl', return_value=0):
+            provider_cache.get_api_versions(client, 'Microsoft.Compute', 'virtualMachines')
+        self.assertEqual(client.providers.get.call_count, 4)
+
+    def test_is_api_version_error(self):
+        error = mock.MagicMock()
+        error.error.error = 'NoRegisteredProviderFound'
+        self.assertTrue(provider_cache.is_api_version_error(error))
+        error.error.error = 'ResourceNotFound'
+        self.assertFalse(provider_cache.is_api_version_error(error))
+        self.assertFalse(provider_cache.is_api_version_error(ValueError()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from azure.cli.core._session import Session
+
+
+def _set_keys(filename, prefix, count):
+    session = Session()
+    session.load(filename)
+    for i in range(count):
+        session['{}{}'.format(prefix, i)] = i
+
+
+class TestSession(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, 'session.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _read_file(self):
+        with open(self.filename, 'rb') as f:
+            return json.loads(f.read().decode('utf-8-sig'))
+
+    def test_batch_saves_once(self):
+        session = Session()
+        session.load(self.filename)
+        with mock.patch.object(session, '_write', wraps=session._write) as write:
+            with session.batch():
+                session['a'] = 1
+                session['b'] = {'c': 2}
+                with session.batch():
+                    del session['a']
+                self.assertEqual(write.call_count, 0)
+            self.assertEqual(write.call_count, 1)
+        self.assertEqual(self._read_file(), {'b': {'c': 2}})
+
+    def test_batch_is_not_saved_on_error(self):
+        session = Session()
+        session.load(self.filename)
+        session['a'] = 1
+        with self.assertRaises(ValueError):
+            with session.batch():
+                session['a'] = 2
+                raise ValueError()
+        self.assertEqual(self._read_file(), {'a': 1})
+        self.assertEqual(session.data, {'a': 1})
+        # a later save doesn't write the changes of the failed batch
+        session['b'] = 3
+        self.assertEqual(self._read_file(), {'a': 1, 'b': 3})
+
+    def test_save_replaces_file(self):
+        session = Session()
+        session.load(self.filename)
+        session['a'] = 1
+        self.assertEqual(sorted(os.listdir(self.tempdir)), ['session.json', 'session.json.lock'])
+        self.assertEqual(self._read_file(), {'a': 1})
+
+    def test_unchanged_file_is_not_parsed_again(self):
+        session = Session()
+        session.load(self.filename)
+        session['a'] = 1
+        with mock.patch('json.load') as load:
+            session.load(self.filename)
+            self.assertFalse(load.called)
+
+        other = Session()
+        other.load(self.filename)
+        other['b'] = 2
+        session.load(self.filename)
+        self.assertEqual(session.data, {'a': 1, 'b': 2})
+
+    def test_changes_of_other_processes_are_kept(self):
+        session = Session()
+        session.load(self.filename)
+        processes = [multiprocessing.Process(target=_set_keys, args=(self.filename, p, 10))
+                     for p in 'abcd']
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        session['e'] = 0
+        self.assertEqual(len(self._read_file()), 41)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import unittest
+
+import mock
+from six import StringIO
+from msrest.paging import Paged
+from msrestazure.azure_exceptions import CloudError
+
+from azure.cli.core.application import APPLICATION
+from azure.cli.core.commands import create_command
+from azure.cli.core._output import CommandResultItem, OutputProducer, format_json
+from azure.cli.core.util import CLIError
+
+
+def _cloud_error(code, message):
+    response = mock.MagicMock()
+    response.status_code = 409
+    response.content = ('{{"error":{{"code":"{}","message":"{}"}}}}'
+                        .format(code, message)).encode()
+    response.reason = 'Conflict'
+    return CloudError(response, error=message)
+
+
+class _Paged(Paged):
+    """ Returns `pages`, raising the ones that are exceptions. """
+
+    def __init__(self, pages):
+        super(_Paged, self).__init__(None, {})
+        self._pages = list(pages)
+
+    def advance_page(self):
+        if not self._pages:
+            raise StopIteration('End of paging')
+        page = self._pages.pop(0)
+        if isinstance(page, Exception):
+            raise page
+        self._current_page_iter_index = 0
+        self.current_page = page
+        return page
+
+
+_results = []
+
+
+def _list_vms():
+    return _results.pop(0)
+
+
+class TestStreamPagedResult(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.dict(APPLICATION.session, {'stream_result': True})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(_results.__delitem__, slice(None))
+
+    def _execute(self, exception_handler=None):
+        command = create_command(None, 'vm list', '{}#_list_vms'.format(__name__), None, None,
+                                 None, exception_handler=exception_handler)
+        return command({})
+
+    def test_stream_result_is_lazy(self):
+        _results.append(_Paged([['vm1', 'vm2'], ['vm3'], ValueError('paging failed')]))
+        items = self._execute()
+        self.assertEqual([next(items) for _ in range(3)], ['vm1', 'vm2', 'vm3'])
+        _results.append(_Paged([]))
+        self.assertEqual(list(self._execute()), [])
+
+    def test_unregistered_rp_is_registered_before_streaming(self):
+        error = _cloud_error('MissingSubscriptionRegistration',
+                             "The subscription is not registered to use namespace "
+                             "'Microsoft.Compute'.")
+        _results.extend([_Paged([error]), _Paged([['vm1'], ['vm2']])])
+        with mock.patch('azure.cli.core.commands._register_rp') as register_rp:
+            items = self._execute()
+            register_rp.assert_called_once_with('Microsoft.Compute')
+        self.assertEqual(list(items), ['vm1', 'vm2'])
+
+    def test_first_page_errors_are_raised_by_the_command(self):
+        _results.append(_Paged([ValueError('bad filter')]))
+        with self.assertRaises(CLIError):
+            self._execute()
+
+    @mock.patch('azure.cli.core.telemetry.set_exception')
+    def test_mid_stream_error_is_reported_and_closes_json(self, set_exception):
+        error = _cloud_error('InternalServerError', 'Try again later.')
+        _results.append(_Paged([['vm1'], error]))
+        output = StringIO()
+        with self.assertRaises(CloudError):
+            OutputProducer(format_json, output).out(CommandResultItem(self._execute()))
+        self.assertEqual(set_exception.call_args[1]['fault_type'], 'vm-list-client-error')
+        self.assertEqual(output.getvalue(), '[\n  "vm1"\n]\n')
+
+        _results.append(_Paged([['vm1'], ValueError('bad page')]))
+        with self.assertRaises(CLIError):
+            list(self._execute())
+        self.assertEqual(set_exception.call_args[1]['fault_type'], 'vm-list-value-error')
+
+    def test_mid_stream_error_goes_to_exception_handler(self):
+        error = _cloud_error('InternalServerError', 'Try again later.')
+        _results.append(_Paged([['vm1'], error]))
+        handler = mock.MagicMock()
+        self.assertEqual(list(self._execute(handler)), ['vm1'])
+        handler.assert_called_once_with(error)
+
+
+if __name__ == '__main__':
+    unittest.main()
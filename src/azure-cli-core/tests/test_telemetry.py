@@ -36,3 +36,17 @@ def test_suppress_all_exceptions():
     yield _impl, Exception, None
     yield _impl, ImportError, 'fallback_for_import_error'
     yield _impl, None, None
+
+
+def test_call_once():
+    from azure.cli.core.decorators import call_once
+    calls = []
+
+    @call_once
+    def _factory():
+        calls.append(1)
+        return 'result'
+
+    assert _factory() == 'result'
+    assert _factory() == 'result'
+    assert len(calls) == 1
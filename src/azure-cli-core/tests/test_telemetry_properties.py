@@ -0,0 +1,65 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+import azure.cli.core.profiler as profiler
+import azure.cli.core.telemetry as telemetry
+
+
+class TestTelemetryProperties(unittest.TestCase):
+
+    def setUp(self):
+        self.config_dir = tempfile.mkdtemp()
+        patcher = mock.patch('azure.cli.core._environment.get_config_dir',
+                             return_value=self.config_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        telemetry._property_cache = None  # pylint: disable=protected-access
+
+    def tearDown(self):
+        telemetry._property_cache = None  # pylint: disable=protected-access
+        profiler.disable()
+        shutil.rmtree(self.config_dir)
+
+    def test_cached_property(self):
+        provider = mock.MagicMock(return_value='hash')
+        get_cached_property = telemetry._get_cached_property  # pylint: disable=protected-access
+        self.assertEqual(get_cached_property('MacAddressHash', provider), 'hash')
+        self.assertEqual(get_cached_property('MacAddressHash', provider), 'hash')
+        self.assertTrue(os.path.isfile(os.path.join(self.config_dir,
+                                                    telemetry.PROPERTY_CACHE_FILE_NAME)))
+
+        # A new process reads the property from the cache
+        telemetry._property_cache = None  # pylint: disable=protected-access
+        self.assertEqual(get_cached_property('MacAddressHash', provider), 'hash')
+        self.assertEqual(provider.call_count, 1)
+
+        # and refreshes it after an upgrade
+        telemetry._property_cache = None  # pylint: disable=protected-access
+        with mock.patch('azure.cli.core.telemetry._get_core_version', return_value='99.0.0'):
+            self.assertEqual(get_cached_property('MacAddressHash', provider), 'hash')
+        self.assertEqual(provider.call_count, 2)
+
+    def test_property_timings(self):
+        profiler.enable()
+        properties = {}
+        telemetry.TelemetrySession.set_custom_properties(properties, 'Locale', lambda: 'en_US')
+        get_cached_property = telemetry._get_cached_property  # pylint: disable=protected-access
+        get_cached_property('MachineId', lambda: 'id')
+        get_cached_property('MachineId', lambda: 'id')
+        self.assertEqual(properties, {telemetry.AZURE_CLI_PREFIX + 'Locale': 'en_US'})
+        phases = profiler._profile.phases  # pylint: disable=protected-access
+        self.assertEqual(phases['telemetry.Locale'][1], 1)
+        self.assertEqual(phases['telemetry.MachineId'][1], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
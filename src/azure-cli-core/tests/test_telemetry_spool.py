@@ -0,0 +1,145 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import mock
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+import azure.cli.core.telemetry_upload as telemetry_upload
+
+
+class _StubCollector(BaseHTTPRequestHandler):
+    batches = []
+    status = 200
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        if _StubCollector.status == 200:
+            _StubCollector.batches.append(json.loads(body.decode('utf-8')))
+        self.send_response(_StubCollector.status)
+        self.end_headers()
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+def _payload(name):
+    return json.dumps([{'name': name, 'properties': {'Reserved.EventId': name, 'Count': 1}}])
+
+
+class TestTelemetrySpool(unittest.TestCase):
+
+    def setUp(self):
+        self.spool_dir = os.path.join(tempfile.mkdtemp(), 'telemetry')
+        _StubCollector.batches = []
+        _StubCollector.status = 200
+        self.server = HTTPServer(('127.0.0.1', 0), _StubCollector)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(os.path.dirname(self.spool_dir))
+
+    def test_spool_requests_flush_by_size(self):
+        with mock.patch.object(telemetry_upload, 'SPOOL_FLUSH_SIZE', 150):
+            self.assertFalse(telemetry_upload.spool(_payload('first'), self.spool_dir))
+            self.assertTrue(telemetry_upload.spool(_payload('second'), self.spool_dir))
+
+    def test_spool_requests_flush_by_age(self):
+        self.assertFalse(telemetry_upload.spool(_payload('first'), self.spool_dir))
+        with mock.patch.object(telemetry_upload, 'SPOOL_FLUSH_AGE', 0):
+            self.assertTrue(telemetry_upload.spool(_payload('second'), self.spool_dir))
+
+    def test_spool_drops_payloads_when_full(self):
+        telemetry_upload.spool(_payload('first'), self.spool_dir)
+        spool_path = os.path.join(self.spool_dir, telemetry_upload.SPOOL_FILE_NAME)
+        size = os.path.getsize(spool_path)
+        with mock.patch.object(telemetry_upload, 'SPOOL_MAX_SIZE', size):
+            self.assertTrue(telemetry_upload.spool(_payload('second'), self.spool_dir))
+        self.assertEqual(os.path.getsize(spool_path), size)
+
+    def test_flush_lock(self):
+        os.makedirs(self.spool_dir)
+        self.assertTrue(telemetry_upload.acquire_flush_lock(self.spool_dir))
+        self.assertFalse(telemetry_upload.acquire_flush_lock(self.spool_dir))
+        with mock.patch.object(telemetry_upload, 'FLUSH_LOCK_TIMEOUT', 0):
+            # The lock of a flusher that died is taken over
+            self.assertTrue(telemetry_upload.acquire_flush_lock(self.spool_dir))
+        telemetry_upload.release_flush_lock(self.spool_dir)
+        self.assertTrue(telemetry_upload.acquire_flush_lock(self.spool_dir))
+
+    def test_stale_flush_lock_is_taken_over_once(self):
+        os.makedirs(self.spool_dir)
+        lock_path = os.path.join(self.spool_dir, telemetry_upload.FLUSH_LOCK_FILE_NAME)
+        open(lock_path, 'w').close()
+        stale = time.time() - 2 * telemetry_upload.FLUSH_LOCK_TIMEOUT
+        os.utime(lock_path, (stale, stale))
+        remove = os.remove
+
+        def _slow_remove(path):
+            # gives the other processes time to find the stale lock too
+            time.sleep(0.05)
+            remove(path)
+
+        results = []
+        with mock.patch('os.remove', _slow_remove):
+            threads = [threading.Thread(
+                target=lambda: results.append(telemetry_upload.acquire_flush_lock(self.spool_dir)))
+                for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(sorted(results), [False] * 4 + [True])
+
+    @mock.patch.object(telemetry_upload, '_SPOOL_WRITE_GRACE', 0)
+    @mock.patch('applicationinsights.exceptions.enable', mock.MagicMock())
+    def test_flush_spool_keeps_payloads_when_upload_fails(self):
+        telemetry_upload.spool(_payload('first'), self.spool_dir)
+        endpoint = 'http://127.0.0.1:{}/v2/track'.format(self.server.server_address[1])
+        with mock.patch.dict(os.environ, {telemetry_upload.TELEMETRY_ENDPOINT_ENV_NAME: endpoint}):
+            _StubCollector.status = 503
+            self.assertEqual(telemetry_upload.flush_spool(self.spool_dir), 0)
+            telemetry_upload.spool(_payload('second'), self.spool_dir)
+            self.assertEqual(telemetry_upload.flush_spool(self.spool_dir), 0)
+            self.assertEqual(len(os.listdir(self.spool_dir)), 2)
+
+            _StubCollector.status = 200
+            self.assertEqual(telemetry_upload.flush_spool(self.spool_dir), 2)
+        self.assertEqual([e['data']['baseData']['name'] for e in _StubCollector.batches[0]],
+                         ['first', 'second'])
+        self.assertEqual(os.listdir(self.spool_dir), [])
+
+    @mock.patch.object(telemetry_upload, '_SPOOL_WRITE_GRACE', 0)
+    @mock.patch('applicationinsights.exceptions.enable', mock.MagicMock())
+    def test_flush_spool_uploads_in_one_batch(self):
+        for name in ('first', 'second', 'third'):
+            telemetry_upload.spool(_payload(name), self.spool_dir)
+        with open(os.path.join(self.spool_dir, telemetry_upload.SPOOL_FILE_NAME), 'a') as f:
+            f.write('{"time": 0, "events": [{"na\n')
+
+        endpoint = 'http://127.0.0.1:{}/v2/track'.format(self.server.server_address[1])
+        with mock.patch.dict(os.environ, {telemetry_upload.TELEMETRY_ENDPOINT_ENV_NAME: endpoint}):
+            self.assertEqual(telemetry_upload.flush_spool(self.spool_dir), 3)
+
+        self.assertEqual(len(_StubCollector.batches), 1)
+        self.assertEqual([e['data']['baseData']['name'] for e in _StubCollector.batches[0]],
+                         ['first', 'second', 'third'])
+        self.assertEqual(os.listdir(self.spool_dir), [])
+        self.assertEqual(telemetry_upload.flush_spool(self.spool_dir), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
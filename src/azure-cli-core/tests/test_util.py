@@ -53,6 +53,23 @@ class TestUtils(unittest.TestCase):
         expected = {'a': {'a': 'x', 'b': 'y'}}
         self.assertEqual(actual, expected)
 
+    def test_application_todict_model(self):
+        class MyModel(object):  # pylint: disable=too-few-public-methods
+            def __init__(self, **kwargs):
+                self.__dict__.update(kwargs)
+
+        the_input = MyModel(resource_group='rg', _private=1, sub_resource=MyModel(some_id='x'),
+                            items=[MyModel(some_id='y')])
+        processed = []
+        actual = todict(the_input, lambda key, obj: processed.append((key, dict(obj))))
+        expected = {'resourceGroup': 'rg', 'subResource': {'someId': 'x'},
+                    'items': [{'someId': 'y'}]}
+        self.assertEqual(actual, expected)
+        # objects are processed after their values, with the key they are stored under
+        self.assertEqual(sorted(processed, key=lambda x: str(x[0])),
+                         [(None, expected), ('items', {'someId': 'y'}),
+                          ('subResource', {'someId': 'x'})])
+
     def test_load_json_from_file(self):
         _, pathname = tempfile.mkstemp()
 
@@ -14,6 +14,7 @@ import shlex
 import tempfile
 import shutil
 import logging
+import mock
 import six
 import vcr
 
@@ -21,7 +22,8 @@ from .patches import (patch_load_cached_subscriptions, patch_main_exception_hand
                       patch_retrieve_token_for_user, patch_long_run_operation_delay,
                       patch_time_sleep_api)
 from .exceptions import CliExecutionError
-from .const import (ENV_LIVE_TEST, ENV_SKIP_ASSERT, ENV_TEST_DIAGNOSE, MOCKED_SUBSCRIPTION_ID)
+from .const import (ENV_LIVE_TEST, ENV_SKIP_ASSERT, ENV_TEST_DIAGNOSE, ENV_PROVIDER_CACHE_TTL,
+                    MOCKED_SUBSCRIPTION_ID)
 from .recording_processors import (SubscriptionRecordingProcessor, OAuthRequestResponsesFilter,
                                    GeneralNameReplacer, LargeRequestBodyProcessor,
                                    LargeResponseBodyProcessor, LargeResponseBodyReplacer,
@@ -154,6 +156,9 @@ class ScenarioTest(IntegrationTestBase):  # pylint: disable=too-many-instance-at
 
         # set up mock patches
         patch_main_exception_handler(self)
+        env_patch = mock.patch.dict(os.environ, {ENV_PROVIDER_CACHE_TTL: '0'})
+        env_patch.start()
+        self.addCleanup(env_patch.stop)
 
         if not self.in_recording:
             patch_time_sleep_api(self)
@@ -12,3 +12,6 @@ ENV_COMMAND_COVERAGE = 'AZURE_CLI_TEST_COMMAND_COVERAGE'
 ENV_LIVE_TEST = 'AZURE_CLI_TEST_RUN_LIVE'
 ENV_SKIP_ASSERT = 'AZURE_CLI_TEST_SKIP_ASSERT'
 ENV_TEST_DIAGNOSE = 'AZURE_CLI_TEST_DIAGNOSE'
+
+# Recordings include the resource provider requests that choose API versions
+ENV_PROVIDER_CACHE_TTL = 'AZURE_CORE_PROVIDER_CACHE_TTL'
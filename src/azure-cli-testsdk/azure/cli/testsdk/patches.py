@@ -53,12 +53,15 @@ def patch_long_run_operation_delay(unit_test):
     def _shortcut_long_run_operation(*args, **kwargs):  # pylint: disable=unused-argument
         return
 
+    def _shortcut_polling_delay(*args, **kwargs):  # pylint: disable=unused-argument
+        return 0
+
     _mock_in_unit_test(unit_test,
                        'msrestazure.azure_operation.AzureOperationPoller._delay',
                        _shortcut_long_run_operation)
     _mock_in_unit_test(unit_test,
-                       'azure.cli.core.commands.LongRunningOperation._delay',
-                       _shortcut_long_run_operation)
+                       'azure.cli.core.commands.polling.Backoff.next_delay',
+                       _shortcut_polling_delay)
 
 
 def patch_time_sleep_api(unit_test):
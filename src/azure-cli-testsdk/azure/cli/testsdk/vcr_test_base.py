@@ -41,6 +41,8 @@ from azure.cli.core.util import CLIError
 
 LIVE_TEST_CONTROL_ENV = 'AZURE_CLI_TEST_RUN_LIVE'
 COMMAND_COVERAGE_CONTROL_ENV = 'AZURE_CLI_TEST_COMMAND_COVERAGE'
+# Recordings include the resource provider requests that choose API versions
+PROVIDER_CACHE_TTL_ENV = 'AZURE_CORE_PROVIDER_CACHE_TTL'
 MOCKED_SUBSCRIPTION_ID = '00000000-0000-0000-0000-000000000000'
 MOCKED_TENANT_ID = '00000000-0000-0000-0000-000000000000'
 MOCKED_STORAGE_ACCOUNT = 'dummystorage'
@@ -117,6 +119,11 @@ def _mock_operation_delay(_):
     return
 
 
+def _mock_polling_delay(*_):
+    # poll again right away
+    return 0
+
+
 # TEST CHECKS
 
 
@@ -380,7 +387,7 @@ class VCRTestBase(unittest.TestCase):  # pylint: disable=too-many-instance-attri
                 _mock_get_mgmt_service_client)  # pylint: disable=line-too-long
     @mock.patch('msrestazure.azure_operation.AzureOperationPoller._delay', _mock_operation_delay)
     @mock.patch('time.sleep', _mock_operation_delay)
-    @mock.patch('azure.cli.core.commands.LongRunningOperation._delay', _mock_operation_delay)
+    @mock.patch('azure.cli.core.commands.polling.Backoff.next_delay', _mock_polling_delay)
     @mock.patch('azure.cli.core.commands.validators.generate_deployment_name',
                 _mock_generate_deployment_name)
     def _execute_playback(self):
@@ -459,6 +466,8 @@ class VCRTestBase(unittest.TestCase):  # pylint: disable=too-many-instance-attri
     def execute(self):
         ''' Method to actually start execution of the test. Must be called from the test_<name>
         method of the test class. '''
+        provider_cache_ttl = self.pop_env(PROVIDER_CACHE_TTL_ENV)
+        self.set_env(PROVIDER_CACHE_TTL_ENV, '0')
         try:
             if self.run_live:
                 print('RUN LIVE: {}'.format(self.test_name))
@@ -473,6 +482,9 @@ class VCRTestBase(unittest.TestCase):  # pylint: disable=too-many-instance-attri
             traceback.print_exc()
             raise ex
         finally:
+            self.pop_env(PROVIDER_CACHE_TTL_ENV)
+            if provider_cache_ttl is not None:
+                self.set_env(PROVIDER_CACHE_TTL_ENV, provider_cache_ttl)
             if not self.success and not self.playback and os.path.isfile(self.cassette_path):
                 print('DISCARDING RECORDING: {}'.format(self.cassette_path))
                 os.remove(self.cassette_path)
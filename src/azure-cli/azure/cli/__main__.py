@@ -6,12 +6,26 @@
 import sys
 import os
 
-import azure.cli.main
-import azure.cli.core.telemetry as telemetry
+import azure.cli.core.profiler as profiler
+
+args = sys.argv[1:]
+
+# Enable profiling before anything else is imported so that all imports are timed
+profiler.enable_from_args(args)
+
+if not profiler.is_enabled():
+    import azure.cli.daemon as daemon  # pylint: disable=wrong-import-position
+    if daemon.is_requested():
+        daemon_exit_code = daemon.run_client(args)
+        if daemon_exit_code is not None:
+            sys.exit(daemon_exit_code)
+
+with profiler.phase('import'):
+    import azure.cli.main  # pylint: disable=wrong-import-position
+    import azure.cli.core.telemetry as telemetry  # pylint: disable=wrong-import-position
 
 try:
     telemetry.start()
-    args = sys.argv[1:]
 
     # Check if we are in argcomplete mode - if so, we
     # need to pick up our args from environment variables
@@ -31,4 +45,6 @@ except KeyboardInterrupt:
     telemetry.set_user_fault('keyboard interrupt')
     sys.exit(1)
 finally:
-    telemetry.conclude()
+    with profiler.phase('telemetry'):
+        telemetry.conclude()
+    profiler.write_report()
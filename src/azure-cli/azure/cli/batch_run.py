@@ -0,0 +1,192 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+""" `az batch-run`: runs many commands in one process.
+
+Each input line is a command, either as shell words (`vm show -g rg -n vm1`, a leading `az`
+is optional), a JSON array of arguments or a JSON object with an 'argv' array. Blank lines
+and lines starting with '#' are skipped. For each command one JSON object is written with
+the line number, the arguments, the exit code, the result and any error messages. Results
+are written in input order.
+
+Commands run one after another by default, sharing the loaded command modules, parsers and
+credentials. With --concurrency N they are spread over N worker processes. Commands start as
+their lines are read, so the input can be a pipe that is still being written.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import logging
+import shlex
+import sys
+import threading
+from collections import OrderedDict
+
+from six import string_types
+
+import azure.cli.core.azlogging as azlogging
+from azure.cli.core.util import CLIError
+
+logger = azlogging.get_az_logger(__name__)
+
+
+class _ErrorCollector(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self, logging.ERROR)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def parse_line(text):
+    """ Returns the arguments of an input line or None for blank lines and comments. """
+    text = text.strip()
+    if not text or text.startswith('#'):
+        return None
+    if text.startswith('['):
+        argv = json.loads(text)
+    elif text.startswith('{'):
+        argv = json.loads(text)['argv']
+    else:
+        argv = shlex.split(text)
+    if not isinstance(argv, list):
+        raise ValueError('expected a list of arguments')
+    argv = [arg if isinstance(arg, string_types) else json.dumps(arg) for arg in argv]
+    if argv and argv[0] == 'az':
+        argv = argv[1:]
+    return argv
+
+
+def execute(argv):
+    """ Executes a command with the application of this process and returns its outcome. """
+    from azure.cli.core.application import APPLICATION
+    from azure.cli.core.util import handle_exception
+
+    errors = _ErrorCollector()
+    az_logger = azlogging.get_az_logger()
+    az_logger.addHandler(errors)
+    result = None
+    try:
+        APPLICATION.reset()
+        cmd_result = APPLICATION.execute(list(argv))
+        result = cmd_result.result if cmd_result else None
+        exit_code = cmd_result.exit_code if cmd_result else 0
+    except SystemExit as ex:
+        exit_code = ex.code if isinstance(ex.code, int) else (0 if ex.code is None else 1)
+    except Exception as ex:  # pylint: disable=broad-except
+        exit_code = handle_exception(ex)
+    finally:
+        az_logger.removeHandler(errors)
+    return {'exitCode': exit_code, 'result': result, 'errors': errors.messages}
+
+
+def _execute_line(line):
+    number, argv, error = line
+    outcome = OrderedDict([('line', number), ('argv', argv)])
+    outcome.update({'exitCode': 2, 'result': None, 'errors': [error]} if error else execute(argv))
+    return outcome
+
+
+def _initialize_worker():
+    from azure.cli.main import initialize
+    from azure.cli.core._profile import refresh_tokens_ahead_of_expiry
+    initialize()
+    refresh_tokens_ahead_of_expiry()
+
+
+def _read_lines(stream):
+    # readline rather than iterating the file, which reads ahead on Python 2
+    for number, text in enumerate(iter(stream.readline, ''), 1):
+        try:
+            argv = parse_line(text)
+        except ValueError as ex:
+            yield number, None, 'Unable to parse line {}: {}'.format(number, ex)
+            continue
+        if argv is not None:
+            yield number, argv, None
+
+
+def _read_ahead(lines, window, stopped):
+    """ Yields the lines, which a daemon thread reads while fewer than the window of lines wait
+    for their outcome. Reading a pipe can block, which must not keep the pool from stopping. """
+    from six.moves.queue import Queue, Empty
+    read = Queue()
+
+    def _read():
+        for line in lines:
+            window.acquire()
+            read.put(line)
+        read.put(None)
+
+    reader = threading.Thread(target=_read)
+    reader.daemon = True
+    reader.start()
+    while not stopped.is_set():
+        try:
+            line = read.get(timeout=0.5)
+        except Empty:
+            continue
+        if line is None:
+            return
+        yield line
+
+
+def _get_parser():
+    parser = argparse.ArgumentParser(prog='az batch-run', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input', '-i', default='-',
+                        help='File with one command per line. Defaults to stdin.')
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='Number of worker processes that run commands.')
+    return parser
+
+
+def run_batch(args, file=sys.stdout):  # pylint: disable=redefined-builtin
+    options = _get_parser().parse_args(args)
+    if options.concurrency < 1:
+        raise CLIError('--concurrency must be at least 1')
+    if options.input == '-':
+        return _run_lines(_read_lines(sys.stdin), options.concurrency, file)
+    with open(options.input) as stream:
+        return _run_lines(_read_lines(stream), options.concurrency, file)
+
+
+def _run_lines(lines, concurrency, file):  # pylint: disable=redefined-builtin
+    from azure.cli.core._output import ComplexEncoder
+
+    pool = None
+    window = threading.Semaphore(2 * concurrency)
+    stopped = threading.Event()
+    if concurrency > 1:
+        import multiprocessing
+        # Importing the profile writes the cloud configuration. Do it once before the workers
+        # are started rather than concurrently in every worker.
+        import azure.cli.core._profile  # pylint: disable=unused-variable
+        pool = multiprocessing.Pool(concurrency, _initialize_worker)
+        outcomes = pool.imap(_execute_line, _read_ahead(lines, window, stopped))
+    else:
+        from azure.cli.core._profile import refresh_tokens_ahead_of_expiry
+        refresh_tokens_ahead_of_expiry()
+        outcomes = (_execute_line(line) for line in lines)
+
+    count = failed = 0
+    try:
+        for outcome in outcomes:
+            window.release()
+            count += 1
+            if outcome['exitCode']:
+                failed += 1
+            file.write(json.dumps(outcome, cls=ComplexEncoder) + '\n')
+            file.flush()
+    finally:
+        if pool:
+            stopped.set()
+            pool.terminate()
+    logger.info('Ran %d commands, %d failed.', count, failed)
+    return 1 if failed else 0
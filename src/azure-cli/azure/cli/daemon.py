@@ -0,0 +1,382 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+""" Long-lived `az` server for scripted workloads.
+
+    python -m azure.cli.daemon start|stop|status|serve
+
+The server imports the CLI and every command module once and then listens on a Unix socket
+in the configuration directory. When AZURE_CLI_DAEMON is set, `az` sends its argv,
+environment and working directory to the server along with its stdin, stdout and stderr
+file descriptors. The server forks a process for each command so commands are isolated from
+each other and can run concurrently, and that process runs the command on the caller's
+terminal. If no server is running `az` runs the command itself.
+
+The server restarts itself when the configuration files or the installed command modules
+change. Requires Python 3 on a platform with Unix sockets.
+"""
+
+from __future__ import print_function
+
+import array
+import json
+import os
+import signal
+import socket
+import sys
+import time
+
+from azure.cli.core._environment import get_config_dir
+
+DAEMON_ENV_VAR = 'AZURE_CLI_DAEMON'
+SOCKET_FILE_NAME = 'daemon.sock'
+# Configuration files that are only read when the CLI is imported
+_WATCHED_CONFIG_FILES = ('config', 'clouds.config')
+_START_TIMEOUT = 120
+# Seconds a client has to send its request before the server moves on to the next one
+_REQUEST_TIMEOUT = 5
+_MODULE_NAME = 'azure.cli.daemon'
+
+
+def is_supported():
+    return hasattr(socket, 'AF_UNIX') and hasattr(socket.socket, 'sendmsg') and \
+        hasattr(os, 'fork')
+
+
+def is_requested():
+    return os.environ.get(DAEMON_ENV_VAR, '').lower() not in ('', '0', 'no', 'false', 'off') \
+        and not os.environ.get('_ARGCOMPLETE')
+
+
+def get_socket_path():
+    return os.path.join(get_config_dir(), SOCKET_FILE_NAME)
+
+
+def _connect(socket_path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except socket.error:
+        sock.close()
+        return None
+    return sock
+
+
+def _send(sock, message, fds=None):
+    data = [json.dumps(message).encode('utf-8') + b'\n']
+    if fds:
+        sock.sendmsg(data, [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array('i', fds))])
+    else:
+        sock.sendall(data[0])
+
+
+def _read_message(reader):
+    """ Returns None if the connection was closed, e.g. by a server that is stopping. """
+    try:
+        line = reader.readline()
+    except socket.error:
+        return None
+    return json.loads(line.decode('utf-8')) if line else None
+
+
+def _control(message, socket_path=None):
+    sock = _connect(socket_path or get_socket_path())
+    if not sock:
+        return None
+    try:
+        _send(sock, message)
+        return _read_message(sock.makefile('rb'))
+    finally:
+        sock.close()
+
+
+def run_client(argv, socket_path=None):
+    """ Runs `argv` on the server. Returns the exit code of the command, or None if no server
+    ran it (in which case the caller should run it in-process). """
+    if not is_supported():
+        return None
+    try:
+        fds = [sys.stdin.fileno(), sys.stdout.fileno(), sys.stderr.fileno()]
+    except (AttributeError, ValueError, IOError):
+        return None
+    sock = _connect(socket_path or get_socket_path())
+    if not sock:
+        return None
+    try:
+        request = {'argv': argv, 'env': dict(os.environ), 'cwd': os.getcwd()}
+        _send(sock, request, fds=fds)
+        reader = sock.makefile('rb')
+        accepted = _read_message(reader)
+        if not accepted:
+            # The server is restarting and did not run the command
+            return None
+        try:
+            result = _read_message(reader)
+        except KeyboardInterrupt:
+            os.kill(accepted['pid'], signal.SIGINT)
+            result = _read_message(reader)
+        if not result:
+            print('The az daemon exited unexpectedly.', file=sys.stderr)
+            return 1
+        return result['exitCode']
+    finally:
+        sock.close()
+
+
+def _recv_request(conn):
+    """ Reads a request and the file descriptors sent with it. The request is None if it is
+    missing or malformed. Raises OSError, e.g. socket.timeout, if the client doesn't send it. """
+    fd_size = array.array('i').itemsize
+    data, ancdata, _, _ = conn.recvmsg(65536, socket.CMSG_LEN(3 * fd_size))
+    fds = array.array('i')
+    for level, kind, cmsg_data in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(cmsg_data[:len(cmsg_data) - (len(cmsg_data) % fd_size)])
+    try:
+        while data and not data.endswith(b'\n'):
+            chunk = conn.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+    except OSError:
+        for fd in fds:
+            os.close(fd)
+        raise
+    try:
+        request = json.loads(data.decode('utf-8')) if data else None
+    except ValueError:
+        request = None
+    return (request if isinstance(request, dict) else None), list(fds)
+
+
+def _get_stamp():
+    """ Changes when the server has to be restarted to pick up changes. """
+    from azure.cli.core.commands import _get_installed_command_modules
+    config_dir = get_config_dir()
+    config_files = {}
+    for name in _WATCHED_CONFIG_FILES:
+        try:
+            config_files[name] = os.path.getmtime(os.path.join(config_dir, name))
+        except OSError:
+            config_files[name] = None
+    return {'config': config_files, 'modules': dict(_get_installed_command_modules())}
+
+
+def _warm_up():
+    """ Imports the CLI, every command module and their parameter definitions. """
+    from importlib import import_module
+    import azure.cli.main  # pylint: disable=redefined-outer-name,unused-variable
+    import azure.cli.core.commands as commands
+    import azure.cli.core._profile  # pylint: disable=unused-variable
+    from azure.cli.core._session import INDEX
+    import azure.cli.core.azlogging as azlogging
+    logger = azlogging.get_az_logger(__name__)
+
+    INDEX.load(os.path.join(get_config_dir(), 'commandIndex.json'))
+    commands.get_command_table()
+    for mod in commands._get_installed_command_modules():  # pylint: disable=protected-access
+        try:
+            import_module('azure.cli.command_modules.' + mod).load_params(None)
+        except Exception as ex:  # pylint: disable=broad-except
+            logger.debug("Unable to load the parameters of module '%s': %s", mod, ex)
+
+
+def _reset_process_state():
+    """ Gives a forked process the state of a new `az` process started with the current
+    environment. """
+    import logging
+    import uuid
+    from azure.cli.core.application import APPLICATION
+    from azure.cli.core._config import az_config, get_config_parser, GLOBAL_CONFIG_PATH
+    import azure.cli.core.telemetry as telemetry
+
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    for logger in (logging.getLogger(), logging.getLogger('az')):
+        del logger.handlers[:]
+    az_config.config_parser = get_config_parser()
+    az_config.config_parser.read(GLOBAL_CONFIG_PATH)
+    # Also gives the global arguments, like --output, the caller's defaults
+    APPLICATION.reset()
+    telemetry._session.correlation_id = str(uuid.uuid4())  # pylint: disable=protected-access
+
+
+def _run_command(argv):
+    """ Runs `argv` the same way `python -m azure.cli` does and returns the exit code. """
+    import azure.cli.main
+    import azure.cli.core.telemetry as telemetry
+    exit_code = 0
+    try:
+        telemetry.start()
+        exit_code = azure.cli.main.main(argv)
+        if exit_code and exit_code != 0:
+            telemetry.set_failure()
+        else:
+            telemetry.set_success()
+    except KeyboardInterrupt:
+        telemetry.set_user_fault('keyboard interrupt')
+        exit_code = 1
+    except SystemExit as ex:
+        exit_code = ex.code if isinstance(ex.code, int) else (0 if ex.code is None else 1)
+    finally:
+        telemetry.conclude()
+    return exit_code or 0
+
+
+def _serve_request(conn, request, fds):
+    """ Runs in the forked process. Never returns. """
+    import atexit
+    exit_code = 1
+    try:
+        os.environ.clear()
+        os.environ.update(request['env'])
+        os.chdir(request['cwd'])
+        for target, fd in enumerate(fds[:3]):
+            os.dup2(fd, target)
+        # The configuration depends on the caller's environment
+        _reset_process_state()
+        _send(conn, {'pid': os.getpid()})
+        exit_code = _run_command(request['argv'])
+        atexit._run_exitfuncs()  # pylint: disable=protected-access
+    except BaseException:  # pylint: disable=broad-except
+        import traceback
+        traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            _send(conn, {'exitCode': exit_code})
+        finally:
+            os._exit(0)  # pylint: disable=protected-access
+
+
+def serve(socket_path=None):
+    """ Runs the server in the foreground until it is stopped. """
+    import azure.cli.core.azlogging as azlogging
+    from azure.cli.core.util import CLIError
+
+    if not is_supported():
+        raise CLIError('The az daemon requires Python 3 on a platform with Unix sockets.')
+    socket_path = socket_path or get_socket_path()
+    if _control({'control': 'status'}, socket_path):
+        raise CLIError('The az daemon is already running on {}'.format(socket_path))
+
+    azlogging.configure_logging([])
+    logger = azlogging.get_az_logger(__name__)
+    start = time.time()
+    _warm_up()
+    stamp = _get_stamp()
+    logger.warning('az daemon warmed up in %.1f seconds.', time.time() - start)
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o177)
+    try:
+        server.bind(socket_path)
+    finally:
+        os.umask(old_umask)
+    server.listen(64)
+    # Forked processes are reaped automatically
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    logger.warning('az daemon listening on %s (pid %s).', socket_path, os.getpid())
+
+    restart = False
+    try:
+        while True:
+            conn, _ = server.accept()
+            fds = []
+            try:
+                # A client that sends nothing must not hold up the others
+                conn.settimeout(_REQUEST_TIMEOUT)
+                request, fds = _recv_request(conn)
+                conn.settimeout(None)
+                if not request:
+                    logger.warning('Ignoring a malformed request.')
+                elif request.get('control') == 'status':
+                    _send(conn, {'pid': os.getpid(), 'socket': socket_path, 'startTime': start})
+                elif request.get('control') == 'stop':
+                    _send(conn, {'pid': os.getpid()})
+                    break
+                elif _get_stamp() != stamp:
+                    logger.warning('Configuration or command modules changed. Restarting.')
+                    restart = True
+                    break
+                else:
+                    sys.stdout.flush()
+                    sys.stderr.flush()
+                    if os.fork() == 0:
+                        server.close()
+                        _serve_request(conn, request, fds)
+            except OSError as ex:
+                logger.warning('Failed to serve a request: %s', ex)
+            finally:
+                for fd in fds:
+                    os.close(fd)
+                conn.close()
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+    if restart:
+        os.execv(sys.executable, [sys.executable, '-m', _MODULE_NAME, 'serve'])
+
+
+def start(socket_path=None):
+    """ Starts the server in the background and waits until it accepts commands. """
+    import subprocess
+    from azure.cli.core.util import CLIError
+
+    if not is_supported():
+        raise CLIError('The az daemon requires Python 3 on a platform with Unix sockets.')
+    socket_path = socket_path or get_socket_path()
+    status = _control({'control': 'status'}, socket_path)
+    if status:
+        return status
+    with open(os.devnull, 'r+') as devnull:
+        process = subprocess.Popen([sys.executable, '-m', _MODULE_NAME, 'serve'],
+                                   stdin=devnull, stdout=devnull, stderr=devnull,
+                                   start_new_session=True)
+    deadline = time.time() + _START_TIMEOUT
+    while time.time() < deadline:
+        status = _control({'control': 'status'}, socket_path)
+        if status:
+            return status
+        if process.poll() is not None:
+            break
+        time.sleep(0.2)
+    raise CLIError('The az daemon did not start. Run `python -m {} serve` to see why.'.format(
+        _MODULE_NAME))
+
+
+def stop(socket_path=None):
+    return _control({'control': 'stop'}, socket_path)
+
+
+def main(args):
+    import azure.cli.core.azlogging as azlogging
+    from azure.cli.core.util import CLIError, handle_exception
+
+    commands = {'start': start, 'stop': stop, 'serve': serve,
+                'status': lambda: _control({'control': 'status'})}
+    if len(args) != 1 or args[0] not in commands:
+        print('usage: python -m {} {{{}}}'.format(_MODULE_NAME, ','.join(sorted(commands))),
+              file=sys.stderr)
+        return 2
+    azlogging.configure_logging([])
+    try:
+        result = commands[args[0]]()
+    except CLIError as ex:
+        return handle_exception(ex)
+    if args[0] in ('start', 'status'):
+        if not result:
+            print('The az daemon is not running.', file=sys.stderr)
+            return 1
+        print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -8,39 +8,59 @@ import sys
 
 from azure.cli.core.application import APPLICATION, Configuration
 import azure.cli.core.azlogging as azlogging
-from azure.cli.core._session import ACCOUNT, CONFIG, SESSION
+from azure.cli.core._session import ACCOUNT, CONFIG, SESSION, INDEX
 from azure.cli.core.util import (show_version_info_exit, handle_exception)
 from azure.cli.core._environment import get_config_dir
+import azure.cli.core.profiler as profiler
 import azure.cli.core.telemetry as telemetry
 
 logger = azlogging.get_az_logger(__name__)
 
 
+BATCH_RUN_COMMAND = 'batch-run'
+
+
+def initialize():
+    with profiler.phase('session'):
+        azure_folder = get_config_dir()
+        if not os.path.exists(azure_folder):
+            os.makedirs(azure_folder)
+        ACCOUNT.load(os.path.join(azure_folder, 'azureProfile.json'))
+        CONFIG.load(os.path.join(azure_folder, 'az.json'))
+        SESSION.load(os.path.join(azure_folder, 'az.sess'), max_age=3600)
+        INDEX.load(os.path.join(azure_folder, 'commandIndex.json'))
+
+    with profiler.phase('application_init'):
+        APPLICATION.initialize(Configuration())
+
+
 def main(args, file=sys.stdout):  # pylint: disable=redefined-builtin
+    profiler.enable_from_args(args)
     azlogging.configure_logging(args)
     logger.debug('Command arguments %s', args)
 
     if len(args) > 0 and (args[0] == '--version' or args[0] == '-v'):
         show_version_info_exit(file)
 
-    azure_folder = get_config_dir()
-    if not os.path.exists(azure_folder):
-        os.makedirs(azure_folder)
-    ACCOUNT.load(os.path.join(azure_folder, 'azureProfile.json'))
-    CONFIG.load(os.path.join(azure_folder, 'az.json'))
-    SESSION.load(os.path.join(azure_folder, 'az.sess'), max_age=3600)
-
-    APPLICATION.initialize(Configuration())
+    initialize()
 
     try:
-        cmd_result = APPLICATION.execute(args)
+        if len(args) > 0 and args[0] == BATCH_RUN_COMMAND:
+            from azure.cli.batch_run import run_batch
+            return run_batch(args[1:], file)
+
+        cmd_result = APPLICATION.execute(args, stream_output=True)
 
         # Commands can return a dictionary/list of results
         # If they do, we print the results.
         if cmd_result and cmd_result.result is not None:
-            from azure.cli.core._output import OutputProducer
-            formatter = OutputProducer.get_formatter(APPLICATION.configuration.output_format)
-            OutputProducer(formatter=formatter, file=file).out(cmd_result)
+            with profiler.phase('output'):
+                from azure.cli.core._output import OutputProducer
+                formatter = OutputProducer.get_formatter(APPLICATION.configuration.output_format)
+                OutputProducer(formatter=formatter, file=file).out(cmd_result)
+
+        if cmd_result and cmd_result.exit_code:
+            return cmd_result.exit_code
 
     except Exception as ex:  # pylint: disable=broad-except
 
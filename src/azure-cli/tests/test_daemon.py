@@ -0,0 +1,186 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+import mock
+
+import azure.cli.daemon as daemon
+# Imported before the commands run, like the server does when it warms up
+from azure.cli.core.application import APPLICATION
+
+
+def _report_command(argv):
+    """ Stands in for running a command in the forked process. """
+    report = {'argv': argv,
+              'cwd': os.getcwd(),
+              'value': os.environ.get('AZ_DAEMON_TEST_VALUE'),
+              'output': APPLICATION.global_parser.get_default('_output_format')}
+    os.write(1, json.dumps(report).encode('utf-8'))
+    return 3
+
+
+@unittest.skipUnless(daemon.is_supported(), 'The az daemon requires Unix sockets')
+class TestDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = os.path.realpath(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.socket_path = os.path.join(self.temp_dir, 'daemon.sock')
+        self.stdout_path = os.path.join(self.temp_dir, 'stdout')
+        stdin = open(os.devnull, 'r')
+        stdout = open(self.stdout_path, 'w')
+        self.addCleanup(stdin.close)
+        self.addCleanup(stdout.close)
+        patcher = mock.patch.multiple('sys', stdin=stdin, stdout=stdout, stderr=stdout)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _start_client(self, target):
+        outcome = {}
+
+        def _run():
+            try:
+                outcome['result'] = target()
+            except BaseException as ex:  # pylint: disable=broad-except
+                outcome['error'] = ex
+        thread = threading.Thread(target=_run)
+        thread.daemon = True
+        thread.start()
+        return thread, outcome
+
+    def _wait_for_server(self):
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            if daemon._control({'control': 'status'}, self.socket_path):
+                return True
+            time.sleep(0.05)
+        return False
+
+    @mock.patch('atexit._run_exitfuncs')
+    @mock.patch('azure.cli.daemon._run_command', side_effect=_report_command)
+    def test_command_runs_with_the_callers_environment(self, _, __):
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(server.close)
+        server.bind(self.socket_path)
+        server.listen(1)
+
+        cwd = os.getcwd()
+        env = {'AZ_DAEMON_TEST_VALUE': 'caller', 'AZURE_CORE_OUTPUT': 'table'}
+        try:
+            os.chdir(self.temp_dir)
+            with mock.patch.dict(os.environ, env):
+                thread, outcome = self._start_client(
+                    lambda: daemon.run_client(['vm', 'list'], self.socket_path))
+                conn, _ = server.accept()
+                request, fds = daemon._recv_request(conn)
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(request['argv'], ['vm', 'list'])
+        self.assertEqual(request['cwd'], self.temp_dir)
+        self.assertEqual(request['env']['AZ_DAEMON_TEST_VALUE'], 'caller')
+        self.assertEqual(len(fds), 3)
+        self.assertNotIn('AZ_DAEMON_TEST_VALUE', os.environ)
+
+        pid = os.fork()
+        if pid == 0:
+            daemon._serve_request(conn, request, fds)
+        for fd in fds:
+            os.close(fd)
+        conn.close()
+        os.waitpid(pid, 0)
+        thread.join(10)
+
+        self.assertEqual(outcome['result'], 3)
+        with open(self.stdout_path) as f:
+            report = json.load(f)
+        self.assertEqual(report, {'argv': ['vm', 'list'], 'cwd': self.temp_dir,
+                                  'value': 'caller', 'output': 'table'})
+
+    @mock.patch('os.execv')
+    @mock.patch('signal.signal')
+    @mock.patch('azure.cli.core.azlogging.configure_logging')
+    @mock.patch('azure.cli.daemon._warm_up')
+    def test_server_restarts_when_modules_change(self, _, __, ___, execv):
+        stamps = [{'modules': {'vm': 1}}, {'modules': {'vm': 2}}]
+
+        def _client():
+            self.assertTrue(self._wait_for_server())
+            try:
+                return daemon.run_client(['vm', 'list'], self.socket_path)
+            finally:
+                daemon.stop(self.socket_path)
+
+        with mock.patch('azure.cli.daemon._get_stamp', side_effect=stamps):
+            thread, outcome = self._start_client(_client)
+            daemon.serve(self.socket_path)
+        thread.join(10)
+
+        # the server did not run the command, so az runs it itself
+        self.assertIsNone(outcome.get('error'))
+        self.assertIsNone(outcome['result'])
+        execv.assert_called_once_with(sys.executable,
+                                      [sys.executable, '-m', 'azure.cli.daemon', 'serve'])
+        self.assertFalse(os.path.exists(self.socket_path))
+
+    @mock.patch('os.execv')
+    @mock.patch('signal.signal')
+    @mock.patch('azure.cli.core.azlogging.configure_logging')
+    @mock.patch('azure.cli.daemon._warm_up')
+    @mock.patch('azure.cli.daemon._get_stamp', return_value={'modules': {'vm': 1}})
+    def test_server_stops(self, _, __, ___, ____, execv):
+        def _client():
+            self.assertTrue(self._wait_for_server())
+            return daemon.stop(self.socket_path)
+
+        thread, outcome = self._start_client(_client)
+        daemon.serve(self.socket_path)
+        thread.join(10)
+
+        self.assertEqual(outcome['result'], {'pid': os.getpid()})
+        self.assertFalse(execv.called)
+        self.assertIsNone(daemon._control({'control': 'status'}, self.socket_path))
+
+    @mock.patch('azure.cli.daemon._REQUEST_TIMEOUT', 0.2)
+    @mock.patch('os.execv')
+    @mock.patch('signal.signal')
+    @mock.patch('azure.cli.core.azlogging.configure_logging')
+    @mock.patch('azure.cli.daemon._warm_up')
+    @mock.patch('azure.cli.daemon._get_stamp', return_value={'modules': {'vm': 1}})
+    def test_server_survives_bad_clients(self, _, __, ___, ____, execv):
+        def _client():
+            self.assertTrue(self._wait_for_server())
+            silent = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            silent.connect(self.socket_path)
+            try:
+                for data in (b'not json\n', b'["control"]\n', b'\xff\n'):
+                    malformed = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    malformed.connect(self.socket_path)
+                    malformed.sendall(data)
+                    malformed.close()
+                # the server moves on from the silent client and still answers
+                return daemon._control({'control': 'status'}, self.socket_path)
+            finally:
+                silent.close()
+                daemon.stop(self.socket_path)
+
+        thread, outcome = self._start_client(_client)
+        daemon.serve(self.socket_path)
+        thread.join(10)
+
+        self.assertEqual(outcome['result']['pid'], os.getpid())
+        self.assertFalse(execv.called)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -13,3 +13,6 @@ def load_params(_):
 
 def load_commands():
     import azure.cli.command_modules.acs.commands  # pylint: disable=redefined-outer-name
+    # registers the SSH key file handler, which must not depend on the custom commands or
+    # params being imported
+    import azure.cli.command_modules.acs._actions  # pylint: disable=redefined-outer-name
@@ -18,6 +18,7 @@ from azclishell.az_lexer import AzLexer
 from azclishell.color_styles import style_factory
 
 from azure.cli.core.application import APPLICATION
+from azure.cli.core._profile import refresh_tokens_ahead_of_expiry
 from azure.cli.core._session import ACCOUNT, CONFIG, SESSION
 from azure.cli.core._environment import get_config_dir as cli_config_dir
 from azure.cli.core.commands.client_factory import ENV_ADDITIONAL_USER_AGENT
@@ -28,6 +29,7 @@ SHELL_CONFIGURATION = azclishell.configuration.CONFIGURATION
 
 def main(style=None):
     os.environ[ENV_ADDITIONAL_USER_AGENT] = 'AZURECLISHELL/' + __version__
+    refresh_tokens_ahead_of_expiry()
 
     azure_folder = cli_config_dir()
     if not os.path.exists(azure_folder):
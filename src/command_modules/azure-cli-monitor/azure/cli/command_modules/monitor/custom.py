@@ -139,11 +139,37 @@ def list_activity_log(client, filters=None, correlation_id=None, resource_group=
     if max_events:
         max_events = int(max_events)
 
-    select_filters = _activity_log_select_filter_builder(select)
+    pushdown = _get_activity_log_query_pushdown(filters, caller, status)
+    if pushdown.filter:
+        odata_filters = '{} and {}'.format(odata_filters, pushdown.filter)
+    if pushdown.limit is not None:
+        max_events = min(max_events, pushdown.limit) if max_events else pushdown.limit
+    select_filters = _activity_log_select_filter_builder(select or pushdown.select)
     activity_log = client.list(filter=odata_filters, select=select_filters)
     return _limit_results(activity_log, max_events)
 
 
+# Properties of the events that the service can return selectively
+_ACTIVITY_LOG_FIELDS = ['authorization', 'caller', 'category', 'claims', 'correlationId',
+                        'description', 'eventDataId', 'eventName', 'eventTimestamp',
+                        'httpRequest', 'id', 'level', 'operationId', 'operationName',
+                        'properties', 'resourceGroupName', 'resourceId',
+                        'resourceProviderName', 'resourceType', 'status', 'subStatus',
+                        'submissionTimestamp', 'subscriptionId', 'tenantId']
+
+
+def _get_activity_log_query_pushdown(filters=None, caller=None, status=None):
+    '''Let the service answer the parts of --query that it can, e.g. [?caller=='me'].eventName
+    '''
+    from azure.cli.core.extensions.query import get_query_pushdown
+    filter_fields = {}
+    if not filters and not caller:
+        filter_fields['caller'] = 'caller'
+    if not filters and not status:
+        filter_fields['status.value'] = 'status'
+    return get_query_pushdown(filter_fields, {f: f for f in _ACTIVITY_LOG_FIELDS})
+
+
 def _single(collection):
     return len([x for x in collection if x]) == 1
 
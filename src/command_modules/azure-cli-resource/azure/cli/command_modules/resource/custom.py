@@ -27,6 +27,8 @@ from azure.cli.core.util import CLIError, get_file_json, shell_safe_json_parse
 import azure.cli.core.azlogging as azlogging
 from azure.cli.core.commands.client_factory import get_mgmt_service_client
 from azure.cli.core.commands.arm import is_valid_resource_id, parse_resource_id
+from azure.cli.core.commands.provider_cache import (get_api_versions, invalidate_api_versions,
+                                                    is_api_version_error)
 from azure.cli.core.profiles import get_sdk, ResourceType
 
 from ._client_factory import (_resource_client_factory,
@@ -416,8 +418,30 @@ def list_resources(resource_group_name=None,
     odata_filter = _list_resources_odata_filter_builder(resource_group_name,
                                                         resource_provider_namespace,
                                                         resource_type, name, tag, location)
-    resources = rcf.resources.list(filter=odata_filter)
-    return list(resources)
+    pushdown = _get_list_resources_query_pushdown(resource_group_name, resource_type, name, tag,
+                                                  location)
+    if pushdown.limit == 0:
+        # ARM does not accept $top=0
+        return []
+    if pushdown.filter:
+        odata_filter = ' and '.join(f for f in (odata_filter, pushdown.filter) if f)
+    resources = rcf.resources.list(filter=odata_filter, top=pushdown.limit)
+    return list(pushdown.limit_results(resources))
+
+
+def _get_list_resources_query_pushdown(resource_group_name=None, resource_type=None, name=None,
+                                       tag=None, location=None):
+    """Let the service answer the parts of --query that it can, e.g. [?location=='westus']
+    """
+    from azure.cli.core.extensions.query import get_query_pushdown
+    # The tag filter can't be combined with other filters
+    filter_fields = {} if tag else {
+        'resourceGroup': None if resource_group_name else 'resourceGroup',
+        'name': None if name else 'name',
+        'location': None if location else 'location',
+        'type': None if resource_type else 'resourceType'
+    }
+    return get_query_pushdown({k: v for k, v in filter_fields.items() if v})
 
 
 def _list_resources_odata_filter_builder(resource_group_name=None,
@@ -965,6 +989,26 @@ def _validate_resource_inputs(resource_group_name, resource_provider_namespace,
         raise CLIError('--namespace is required')
 
 
+def _refresh_api_version_on_error(func):
+    """ Repeats an operation of _ResourceUtils once, with an API version chosen from up-to-date
+    API versions, when the service rejected the cached one. """
+    from functools import wraps
+    from msrestazure.azure_exceptions import CloudError
+
+    @wraps(func)
+    def _wrapper(self, *args, **kwargs):
+        try:
+            return func(self, *args, **kwargs)
+        except CloudError as ex:
+            if not self.api_version_resolved or not is_api_version_error(ex):
+                raise
+        logger.debug("API version '%s' is not supported. Refreshing the API versions.",
+                     self.api_version)
+        self.refresh_api_version()
+        return func(self, *args, **kwargs)
+    return _wrapper
+
+
 class _ResourceUtils(object):  # pylint: disable=too-many-instance-attributes
     def __init__(self,
                  resource_group_name=None, resource_provider_namespace=None,
@@ -979,16 +1023,9 @@ class _ResourceUtils(object):  # pylint: disable=too-many-instance-attributes
                 resource_type = parts[1]
 
         self.rcf = rcf or _resource_client_factory()
-        if api_version is None:
-            if resource_id:
-                api_version = _ResourceUtils._resolve_api_version_by_id(self.rcf, resource_id)
-            else:
-                _validate_resource_inputs(resource_group_name, resource_provider_namespace,
-                                          resource_type, resource_name)
-                api_version = _ResourceUtils.resolve_api_version(self.rcf,
-                                                                 resource_provider_namespace,
-                                                                 parent_resource_path,
-                                                                 resource_type)
+        if api_version is None and not resource_id:
+            _validate_resource_inputs(resource_group_name, resource_provider_namespace,
+                                      resource_type, resource_name)
 
         self.resource_group_name = resource_group_name
         self.resource_provider_namespace = resource_provider_namespace
@@ -996,8 +1033,29 @@ class _ResourceUtils(object):  # pylint: disable=too-many-instance-attributes
         self.resource_type = resource_type
         self.resource_name = resource_name
         self.resource_id = resource_id
-        self.api_version = api_version
+        # API versions chosen from the provider's (cached) API versions are refreshed when the
+        # service rejects them
+        self.api_version_resolved = api_version is None
+        self.api_version = self._resolve_api_version() if api_version is None else api_version
 
+    def _resolve_api_version(self):
+        if self.resource_id:
+            return _ResourceUtils._resolve_api_version_by_id(self.rcf, self.resource_id)
+        return _ResourceUtils.resolve_api_version(self.rcf,
+                                                  self.resource_provider_namespace,
+                                                  self.parent_resource_path,
+                                                  self.resource_type)
+
+    def refresh_api_version(self):
+        if self.resource_id:
+            parts = parse_resource_id(self.resource_id)
+            namespace = parts.get('child_namespace', parts['namespace'])
+        else:
+            namespace = self.resource_provider_namespace
+        invalidate_api_versions(self.rcf, namespace)
+        self.api_version = self._resolve_api_version()
+
+    @_refresh_api_version_on_error
     def create_resource(self, properties, location, is_full_object):
         res = json.loads(properties)
         if not is_full_object:
@@ -1026,6 +1084,7 @@ class _ResourceUtils(object):  # pylint: disable=too-many-instance-attributes
                                                            res)
         return resource
 
+    @_refresh_api_version_on_error
     def get_resource(self):
         if self.resource_id:
             resource = self.rcf.resources.get_by_id(self.resource_id, self.api_version)
@@ -1038,6 +1097,7 @@ class _ResourceUtils(object):  # pylint: disable=too-many-instance-attributes
                                               self.api_version)
         return resource
 
+    @_refresh_api_version_on_error
     def delete(self):
         if self.resource_id:
             return self.rcf.resources.delete_by_id(self.resource_id, self.api_version)
@@ -1049,6 +1109,7 @@ class _ResourceUtils(object):  # pylint: disable=too-many-instance-attributes
                                              self.resource_name,
                                              self.api_version)
 
+    @_refresh_api_version_on_error
     def update(self, parameters):
         if self.resource_id:
             return self.rcf.resources.create_or_update_by_id(self.resource_id,
@@ -1063,6 +1124,7 @@ class _ResourceUtils(object):  # pylint: disable=too-many-instance-attributes
                                                        self.api_version,
                                                        parameters)
 
+    @_refresh_api_version_on_error
     def tag(self, tags):
         resource = self.get_resource()
         # pylint: disable=no-member
@@ -1091,20 +1153,17 @@ class _ResourceUtils(object):  # pylint: disable=too-many-instance-attributes
 
     @staticmethod
     def resolve_api_version(rcf, resource_provider_namespace, parent_resource_path, resource_type):
-        provider = rcf.providers.get(resource_provider_namespace)
-
         # If available, we will use parent resource's api-version
         resource_type_str = (parent_resource_path.split('/')[0]
                              if parent_resource_path else resource_type)
 
-        rt = [t for t in provider.resource_types
-              if t.resource_type.lower() == resource_type_str.lower()]
-        if not rt:
+        api_versions = get_api_versions(rcf, resource_provider_namespace, resource_type_str)
+        if api_versions is None:
             raise IncorrectUsageError('Resource type {} not found.'
                                       .format(resource_type_str))
-        if len(rt) == 1 and rt[0].api_versions:
-            npv = [v for v in rt[0].api_versions if 'preview' not in v.lower()]
-            return npv[0] if npv else rt[0].api_versions[0]
+        if api_versions:
+            npv = [v for v in api_versions if 'preview' not in v.lower()]
+            return npv[0] if npv else api_versions[0]
         else:
             raise IncorrectUsageError(
                 'API version is required and could not be resolved for resource {}'
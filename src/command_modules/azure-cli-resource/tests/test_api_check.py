@@ -6,8 +6,10 @@
 import unittest
 
 try:
+    from unittest import mock
     from unittest.mock import MagicMock
 except ImportError:
+    import mock
     from mock import MagicMock
 
 from azure.cli.core.util import CLIError
@@ -74,6 +76,27 @@ class TestApiCheck(unittest.TestCase):
                                    resource_group_name='rg', rcf=rcf)
         self.assertEqual(res_utils.api_version, "2005-01-01-preview")
 
+    @mock.patch('azure.cli.command_modules.resource.custom.invalidate_api_versions')
+    def test_resolved_api_version_refreshed_on_error(self, invalidate_api_versions):
+        """ Verifies a rejected API version from the provider is resolved again once. """
+        from msrestazure.azure_exceptions import CloudError
+
+        rcf = self._get_mock_client()
+        res_utils = _ResourceUtils(resource_type='Mock/test', resource_name='vnet1',
+                                   resource_group_name='rg', rcf=rcf)
+        error = CloudError(MagicMock(), error='The API version is not supported')
+        error.error = MagicMock(error='NoRegisteredProviderFound')
+        rcf.resources.get.side_effect = [error, 'resource']
+        self.assertEqual(res_utils.get_resource(), 'resource')
+        invalidate_api_versions.assert_called_once_with(rcf, 'Mock')
+        self.assertEqual(rcf.providers.get.call_count, 2)
+
+        rcf.resources.get.side_effect = error
+        res_utils = _ResourceUtils(resource_type='Mock/test', resource_name='vnet1',
+                                   resource_group_name='rg', rcf=rcf, api_version='2017-01-01')
+        self.assertRaises(CloudError, res_utils.get_resource)
+        self.assertEqual(invalidate_api_versions.call_count, 1)
+
     def _get_mock_client(self):
         client = MagicMock()
         provider = MagicMock()
@@ -4,8 +4,13 @@
 # --------------------------------------------------------------------------------------------
 
 import unittest
+import mock
 from azure.cli.command_modules.resource.custom import (_list_resources_odata_filter_builder,
-                                                       _find_missing_parameters)
+                                                       _get_list_resources_query_pushdown,
+                                                       _find_missing_parameters,
+                                                       list_resources)
+from azure.cli.core.application import APPLICATION
+from azure.cli.core.extensions.query import jmespath_type
 from azure.cli.core.parser import IncorrectUsageError
 
 
@@ -72,6 +77,32 @@ class TestListResources(unittest.TestCase):
         with self.assertRaises(IncorrectUsageError):
             _list_resources_odata_filter_builder(tag='foo=bar', name='should not work')
 
+    def test_query_pushdown(self):
+        query = jmespath_type("[?type=='Microsoft.Web/sites' && location=='westus'] | [0:3]")
+        with mock.patch.dict(APPLICATION.session, {'query_expression': query,
+                                                   'invocation_count': 1}):
+            pushdown = _get_list_resources_query_pushdown()
+            self.assertEqual(pushdown.filter,
+                             "resourceType eq 'Microsoft.Web/sites' and location eq 'westus'")
+            # a location given as an argument is already in the filter
+            self.assertEqual(_get_list_resources_query_pushdown(location='westus').filter,
+                             "resourceType eq 'Microsoft.Web/sites'")
+            self.assertIsNone(_get_list_resources_query_pushdown(tag='foo').filter)
+
+    @mock.patch('azure.cli.command_modules.resource.custom._resource_client_factory')
+    def test_query_pushdown_limit(self, client_factory):
+        client_factory.return_value.resources.list.return_value = iter(range(10))
+        with mock.patch.dict(APPLICATION.session, {'query_expression': jmespath_type('[:3]'),
+                                                   'invocation_count': 1}):
+            self.assertEqual(list_resources(), [0, 1, 2])
+        self.assertEqual(client_factory.return_value.resources.list.call_args[1]['top'], 3)
+
+        client_factory.return_value.resources.list.reset_mock()
+        with mock.patch.dict(APPLICATION.session, {'query_expression': jmespath_type('[:0]'),
+                                                   'invocation_count': 1}):
+            self.assertEqual(list_resources(), [])
+        self.assertFalse(client_factory.return_value.resources.list.called)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -5,6 +5,7 @@
 
 # pylint: disable=line-too-long
 import argparse
+from functools import partial
 from argcomplete.completers import FilesCompleter
 from six import u as unicode_string
 
@@ -133,25 +134,29 @@ def _get_client(service, parsed_args):
         service, account_name, account_key, connection_string, sas_token)
 
 
+def _storage_name_completer(service, func, parent, prefix, action, parsed_args, **kwargs):  # pylint: disable=unused-argument
+    client = _get_client(service, parsed_args)
+    if parent:
+        parent_name = getattr(parsed_args, parent)
+        method = getattr(client, func)
+        items = [x.name for x in method(**{parent: parent_name})]
+    else:
+        items = [x.name for x in getattr(client, func)()]
+    return items
+
+
 def get_storage_name_completion_list(service, func, parent=None):
-    def completer(prefix, action, parsed_args, **kwargs):  # pylint: disable=unused-argument
-        client = _get_client(service, parsed_args)
-        if parent:
-            parent_name = getattr(parsed_args, parent)
-            method = getattr(client, func)
-            items = [x.name for x in method(**{parent: parent_name})]
-        else:
-            items = [x.name for x in getattr(client, func)()]
-        return items
-    return completer
+    return partial(_storage_name_completer, service, func, parent)
+
+
+def _storage_acl_name_completer(service, container_param, func, prefix, action, parsed_args, **kwargs):  # pylint: disable=unused-argument
+    client = _get_client(service, parsed_args)
+    container_name = getattr(parsed_args, container_param)
+    return list(getattr(client, func)(container_name))
 
 
 def get_storage_acl_name_completion_list(service, container_param, func):
-    def completer(prefix, action, parsed_args, **kwargs):  # pylint: disable=unused-argument
-        client = _get_client(service, parsed_args)
-        container_name = getattr(parsed_args, container_param)
-        return list(getattr(client, func)(container_name))
-    return completer
+    return partial(_storage_acl_name_completer, service, container_param, func)
 
 
 def dir_path_completer(prefix, action, parsed_args, **kwargs):  # pylint: disable=unused-argument
@@ -360,6 +365,7 @@ register_cli_argument('storage blob download-batch', 'source', options_list=('--
                       validator=process_blob_download_batch_parameters)
 
 register_cli_argument('storage blob download-batch', 'source_container_name', ignore_type)
+register_cli_argument('storage blob download-batch', 'max_workers', type=int)
 
 # BLOB UPLOAD-BATCH PARAMETERS
 register_cli_argument('storage blob upload-batch', 'destination', options_list=('--destination', '-d'))
@@ -388,11 +394,16 @@ register_cli_argument('storage blob upload-batch', 'content_type', arg_group='Co
 register_cli_argument('storage blob upload-batch', 'content_cache_control', arg_group='Content Control')
 register_cli_argument('storage blob upload-batch', 'content_language', arg_group='Content Control')
 register_cli_argument('storage blob upload-batch', 'max_connections', type=int)
+register_cli_argument('storage blob upload-batch', 'max_workers', type=int)
+register_cli_argument('storage blob upload-batch', 'skip_unchanged', action='store_true')
 
 # BLOB COPY-BATCH PARAMETERS
 
 with CommandContext('storage blob copy start-batch') as c:
     c.reg_arg('source_client', ignore_type, validator=get_source_file_or_blob_service_client)
+    c.reg_arg('wait', action='store_true')
+    c.reg_arg('wait_timeout', type=int)
+    c.reg_arg('max_workers', type=int)
 
     with c.arg_group('Copy Source') as group:
         group.reg_extra_arg('source_account_name')
@@ -407,6 +418,8 @@ with CommandContext('storage blob copy start-batch') as c:
 with CommandContext('storage file upload-batch') as c:
     c.reg_arg('source', options_list=('--source', '-s'), validator=process_file_upload_batch_parameters)
     c.reg_arg('destination', options_list=('--destination', '-d'))
+    c.reg_arg('skip_unchanged', action='store_true')
+    c.reg_arg('max_workers', type=int)
 
     with c.arg_group('Download Control') as group:
         group.reg_arg('validate_content')
@@ -419,6 +432,7 @@ register_content_settings_argument('storage file upload-batch', FileContentSetti
 with CommandContext('storage file download-batch') as c:
     c.reg_arg('source', options_list=('--source', '-s'), validator=process_file_download_batch_parameters)
     c.reg_arg('destination', options_list=('--destination', '-d'))
+    c.reg_arg('skip_unchanged', action='store_true')
 
     with c.arg_group('Download Control') as group:
         group.reg_arg('validate_content')
@@ -427,6 +441,9 @@ with CommandContext('storage file download-batch') as c:
 # FILE COPY-BATCH PARAMETERS
 with CommandContext('storage file copy start-batch') as c:
     c.reg_arg('source_client', ignore_type, validator=get_source_file_or_blob_service_client)
+    c.reg_arg('wait', action='store_true')
+    c.reg_arg('wait_timeout', type=int)
+    c.reg_arg('max_workers', type=int)
 
     with c.arg_group('Copy Source') as group:
         group.reg_extra_arg('source_account_name')
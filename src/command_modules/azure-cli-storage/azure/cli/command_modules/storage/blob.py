@@ -14,8 +14,12 @@ from azure.cli.command_modules.storage.util import (create_blob_service_from_sto
                                                     create_file_share_from_storage_client,
                                                     create_short_lived_share_sas,
                                                     create_short_lived_container_sas,
-                                                    filter_none, collect_blobs, collect_files,
-                                                    mkdir_p)
+                                                    collect_blobs, collect_files,
+                                                    collect_blobs_with_properties, mkdir_p)
+from azure.cli.command_modules.storage.transfer import (TransferJournal, run_transfer,
+                                                        local_file_item, remote_file_item)
+from azure.cli.command_modules.storage.sync import SyncState, filter_unchanged
+from azure.cli.command_modules.storage.server_copy import run_copies, get_blob_copy_statuses
 
 
 BlobCopyResult = namedtuple('BlobCopyResult', ['name', 'copy_id'])
@@ -23,8 +27,22 @@ BlobCopyResult = namedtuple('BlobCopyResult', ['name', 'copy_id'])
 
 def storage_blob_copy_batch(client, source_client,
                             destination_container=None, source_container=None, source_share=None,
-                            source_sas=None, pattern=None, dryrun=False):
-    """Copy a group of blob or files to a blob container."""
+                            source_sas=None, pattern=None, dryrun=False, wait=False,
+                            wait_timeout=None, max_workers=None):
+    """Copy a group of blob or files to a blob container.
+
+    :param bool wait:
+        Wait until the server-side copies are done, and start failed copies again (up to twice).
+        Without it, the command returns once the copies are started.
+
+    :param int wait_timeout:
+        With --wait, the maximum wait in seconds. By default the command waits until every copy
+        is done.
+
+    :param int max_workers:
+        The number of copies started at the same time. Defaults to the storage.max_workers
+        configuration, or 8.
+    """
     logger = None
     if dryrun:
         logger = get_az_logger(__name__)
@@ -56,9 +74,11 @@ def storage_blob_copy_batch(client, source_client,
                 return _copy_blob_to_blob_container(client, source_client, destination_container,
                                                     source_container, source_sas, blob_name)
 
-        return list(filter_none(action_blob_copy(blob) for blob in collect_blobs(source_client,
-                                                                                 source_container,
-                                                                                 pattern)))
+        return run_copies(collect_blobs(source_client, source_container, pattern),
+                          action_blob_copy,
+                          get_blob_copy_statuses(client, destination_container, max_workers),
+                          dryrun=dryrun, wait=wait, wait_timeout=wait_timeout,
+                          max_workers=max_workers)
 
     elif source_share:
         # copy blob from file share
@@ -80,16 +100,18 @@ def storage_blob_copy_batch(client, source_client,
                 return _copy_file_to_blob_container(client, source_client, destination_container,
                                                     source_share, source_sas, dir_name, file_name)
 
-        return list(filter_none(action_file_copy(file) for file in collect_files(source_client,
-                                                                                 source_share,
-                                                                                 pattern)))
+        return run_copies(collect_files(source_client, source_share, pattern),
+                          action_file_copy,
+                          get_blob_copy_statuses(client, destination_container, max_workers),
+                          dryrun=dryrun, wait=wait, wait_timeout=wait_timeout,
+                          max_workers=max_workers)
     else:
         raise ValueError('Fail to find source. Neither blob container or file share is specified')
 
 
 # pylint: disable=unused-argument
 def storage_blob_download_batch(client, source, destination, source_container_name, pattern=None,
-                                dryrun=False):
+                                dryrun=False, max_workers=None):
     """
     Download blobs in a container recursively
 
@@ -108,22 +130,35 @@ def storage_blob_download_batch(client, source, destination, source_container_na
     :param str pattern:
         The pattern is used for files globbing. The supported patterns are '*', '?', '[seq]',
         and '[!seq]'.
-    """
-    source_blobs = collect_blobs(client, source_container_name, pattern)
 
+    :param int max_workers:
+        The number of blobs downloaded at the same time. Defaults to the storage.max_workers
+        configuration, or 8. When the command is interrupted or some blobs fail, running it again
+        downloads only the remaining blobs.
+    """
     if dryrun:
         logger = get_az_logger(__name__)
         logger.warning('download action: from %s to %s', source, destination)
         logger.warning('    pattern %s', pattern)
         logger.warning('  container %s', source_container_name)
-        logger.warning('      total %d', len(source_blobs))
         logger.warning(' operations')
-        for b in source_blobs or []:
+        total = 0
+        for b in collect_blobs(client, source_container_name, pattern):
             logger.warning('  - %s', b)
+            total += 1
+        logger.warning('      total %d', total)
         return []
     else:
-        return list(_download_blob(client, source_container_name, destination, blob) for blob in
-                    source_blobs)
+        items = (remote_file_item(blob.name, os.path.join(destination, blob.name),
+                                  blob.properties.content_length, blob.properties.etag)
+                 for blob in collect_blobs_with_properties(client, source_container_name,
+                                                           pattern))
+        journal = TransferJournal('download', client.account_name, source_container_name,
+                                  os.path.realpath(destination), pattern)
+        return run_transfer('Downloaded', items,
+                            lambda item: _download_blob(client, source_container_name,
+                                                        destination, item.source),
+                            journal=journal, max_workers=max_workers)
 
 
 def storage_blob_upload_batch(client, source, destination, pattern=None, source_files=None,
@@ -131,7 +166,8 @@ def storage_blob_upload_batch(client, source, destination, pattern=None, source_
                               content_settings=None, metadata=None, validate_content=False,
                               maxsize_condition=None, max_connections=2, lease_id=None,
                               if_modified_since=None, if_unmodified_since=None, if_match=None,
-                              if_none_match=None, timeout=None, dryrun=False):
+                              if_none_match=None, timeout=None, dryrun=False, max_workers=None,
+                              skip_unchanged=False):
     """
     Upload files to storage container as blobs
 
@@ -159,6 +195,15 @@ def storage_blob_upload_batch(client, source, destination, pattern=None, source_
         operation only if the resource's ETag does not match the value specified. Specify the
         wildcard character (*) to perform the operation only if the resource does not exist,
         and fail the operation if it does exist.
+
+    :param int max_workers:
+        The number of files uploaded at the same time. Defaults to the storage.max_workers
+        configuration, or 8. When the command is interrupted or some files fail, running it again
+        uploads only the remaining files.
+
+    :param bool skip_unchanged:
+        Skip files whose blob has the same size and content MD5, or that an earlier upload-batch
+        from the same directory uploaded and that were not modified since.
     """
     def _append_blob(file_path, blob_name):
         if not client.exists(destination_container_name, blob_name):
@@ -202,6 +247,15 @@ def storage_blob_upload_batch(client, source, destination, pattern=None, source_
 
     upload_action = _upload_blob if blob_type == 'block' or blob_type == 'page' else _append_blob
 
+    sync_state = None
+    if skip_unchanged:
+        sync_state = SyncState('blob-upload', client.account_name, destination_container_name,
+                               source)
+        remote_index = {b.name: (b.properties.content_length,
+                                 b.properties.content_settings.content_md5)
+                        for b in client.list_blobs(destination_container_name)}
+        source_files = filter_unchanged(sync_state, source_files or [], remote_index)
+
     if dryrun:
         logger = get_az_logger(__name__)
         logger.warning('upload action: from %s to %s', source, destination)
@@ -213,9 +267,21 @@ def storage_blob_upload_batch(client, source, destination, pattern=None, source_
         for f in source_files or []:
             logger.warning('  - %s => %s', *f)
     else:
-        for f in source_files or []:
-            print('uploading {}'.format(f[0]))
-            upload_action(*f)
+        def _upload_item(item):
+            upload_action(item.source, item.destination)
+            if sync_state:
+                sync_state.record(item.source)
+            return client.make_blob_url(destination_container_name, item.destination)
+
+        items = [local_file_item(*f) for f in source_files or []]
+        journal = TransferJournal('upload', client.account_name, destination_container_name,
+                                  source, pattern, blob_type)
+        try:
+            return run_transfer('Uploaded', items, _upload_item, journal=journal,
+                                max_workers=max_workers)
+        finally:
+            if sync_state:
+                sync_state.save()
 
 
 def _download_blob(blob_service, container, destination_folder, blob_name):
@@ -235,8 +301,9 @@ def _copy_blob_to_blob_container(blob_service, source_blob_service, destination_
                                                         sas_token=source_sas)
 
     try:
-        blob_service.copy_blob(destination_container, source_blob_name, source_blob_url)
-        return blob_service.make_blob_url(destination_container, source_blob_name)
+        copy = blob_service.copy_blob(destination_container, source_blob_name, source_blob_url)
+        return (source_blob_name,
+                blob_service.make_blob_url(destination_container, source_blob_name), copy)
     except AzureException:
         error_template = 'Failed to copy blob {} to container {}.'
         raise CLIError(error_template.format(source_blob_name, destination_container))
@@ -252,8 +319,9 @@ def _copy_file_to_blob_container(blob_service, source_file_service, destination_
         if source_file_dir else source_file_name
 
     try:
-        blob_service.copy_blob(destination_container, blob_name=blob_name, copy_source=file_url)
-        return blob_service.make_blob_url(destination_container, blob_name)
+        copy = blob_service.copy_blob(destination_container, blob_name=blob_name,
+                                      copy_source=file_url)
+        return blob_name, blob_service.make_blob_url(destination_container, blob_name), copy
     except AzureException as ex:
         error_template = 'Failed to copy file {} to container {}. {}'
         raise CLIError(error_template.format(source_file_name, destination_container, ex))
@@ -12,22 +12,41 @@ import os.path
 from azure.cli.core.azlogging import get_az_logger
 from azure.cli.core.util import CLIError
 from azure.common import AzureException, AzureHttpError
-from azure.cli.command_modules.storage.util import (filter_none, collect_blobs, collect_files,
+from azure.cli.command_modules.storage.util import (collect_blobs, collect_files,
                                                     create_blob_service_from_storage_client,
                                                     create_short_lived_container_sas,
                                                     create_short_lived_share_sas)
+from azure.cli.command_modules.storage.sync import SyncState, filter_unchanged
+from azure.cli.command_modules.storage.server_copy import run_copies, get_file_copy_statuses
+from azure.cli.command_modules.storage.transfer import (TransferJournal, get_max_workers,
+                                                        local_file_item, run_transfer)
 
 
 def storage_file_upload_batch(client, destination, source, pattern=None, dryrun=False,
                               validate_content=False, content_settings=None, max_connections=1,
-                              metadata=None):
+                              metadata=None, skip_unchanged=False, max_workers=None):
     """
     Upload local files to Azure Storage File Share in batch
+
+    :param bool skip_unchanged:
+        Skip files that an earlier upload-batch from the same directory uploaded and that were
+        not modified since, or whose file in the share has the same size and content MD5.
+
+    :param int max_workers:
+        The number of files uploaded, and directories created, at the same time. Defaults to the
+        storage.max_workers configuration, or 8.
     """
 
-    from .util import glob_files_locally
+    from .util import glob_files_locally, walk_files_remotely
     source_files = [c for c in glob_files_locally(source, pattern)]
 
+    sync_state = None
+    if skip_unchanged:
+        sync_state = SyncState('file-upload', client.account_name, destination, source)
+        remote_index = {os.path.join(d, f.name): (f.properties.content_length, None)
+                        for d, f in walk_files_remotely(client, destination)}
+        source_files = filter_unchanged(sync_state, source_files, remote_index)
+
     if dryrun:
         logger = get_az_logger(__name__)
         logger.warning('upload files to file share')
@@ -40,36 +59,62 @@ def storage_file_upload_batch(client, destination, source, pattern=None, dryrun=
 
         return []
 
-    # TODO: Performance improvement
-    # 1. Upload files in parallel
-    def _upload_action(source_pair):
-        dir_name = os.path.dirname(source_pair[1])
-        file_name = os.path.basename(source_pair[1])
+    # the directories are created before the upload, so uploading a file takes one request
+    _create_directories(client, destination, (name for _, name in source_files), max_workers)
+
+    def _upload_action(item):
+        dir_name = os.path.dirname(item.destination)
+        file_name = os.path.basename(item.destination)
 
-        _make_directory_in_files_share(client, destination, dir_name)
         client.create_file_from_path(share_name=destination,
                                      directory_name=dir_name,
                                      file_name=file_name,
-                                     local_file_path=source_pair[0],
+                                     local_file_path=item.source,
                                      content_settings=content_settings,
                                      metadata=metadata,
                                      max_connections=max_connections,
                                      validate_content=validate_content)
+        if sync_state:
+            sync_state.record(item.source)
 
         return client.make_file_url(destination, dir_name, file_name)
 
-    return list(_upload_action(f) for f in source_files)
+    items = [local_file_item(*f) for f in source_files]
+    journal = TransferJournal('file-upload', client.account_name, destination, source, pattern)
+    try:
+        return run_transfer('Uploaded', items, _upload_action, journal=journal,
+                            max_workers=max_workers)
+    finally:
+        if sync_state:
+            sync_state.save()
 
 
 def storage_file_download_batch(client, source, destination, pattern=None, dryrun=False,
-                                validate_content=False, max_connections=1):
+                                validate_content=False, max_connections=1, skip_unchanged=False):
     """
     Download files from file share to local directory in batch
-    """
 
-    from .util import glob_files_remotely, mkdir_p
+    :param bool skip_unchanged:
+        Skip files that an earlier download-batch to the same directory downloaded, when neither
+        the local file nor the size of the file in the share changed since.
+    """
 
-    source_files = glob_files_remotely(client, source, pattern)
+    from .util import glob_files_remotely, walk_files_remotely, mkdir_p
+
+    sync_state = None
+    if skip_unchanged:
+        sync_state = SyncState('file-download', client.account_name, source,
+                               os.path.realpath(destination))
+        remote_files = list(walk_files_remotely(client, source, pattern))
+        remote_index = {os.path.join(d, f.name): (f.properties.content_length, None)
+                        for d, f in remote_files}
+        changed = filter_unchanged(sync_state,
+                                   [(os.path.join(destination, d, f.name), os.path.join(d, f.name))
+                                    for d, f in remote_files],
+                                   remote_index)
+        source_files = [os.path.split(name) for _, name in changed]
+    else:
+        source_files = glob_files_remotely(client, source, pattern)
 
     if dryrun:
         source_files_list = list(source_files)
@@ -96,17 +141,36 @@ def storage_file_download_batch(client, source, destination, pattern=None, dryru
                                 file_path=os.path.join(destination, *pair),
                                 validate_content=validate_content,
                                 max_connections=max_connections)
+        if sync_state:
+            sync_state.record(os.path.join(destination, *pair))
         return client.make_file_url(source, *pair)
 
-    return list(_download_action(f) for f in source_files)
+    try:
+        return list(_download_action(f) for f in source_files)
+    finally:
+        if sync_state:
+            sync_state.save()
 
 
 def storage_file_copy_batch(client, source_client,
                             destination_share=None, destination_path=None,
                             source_container=None, source_share=None, source_sas=None,
-                            pattern=None, dryrun=False, metadata=None, timeout=None):
+                            pattern=None, dryrun=False, metadata=None, timeout=None, wait=False,
+                            wait_timeout=None, max_workers=None):
     """
     Copy a group of files asynchronously
+
+    :param bool wait:
+        Wait until the server-side copies are done, and start failed copies again (up to twice).
+        Without it, the command returns once the copies are started.
+
+    :param int wait_timeout:
+        With --wait, the maximum wait in seconds. By default the command waits until every copy
+        is done.
+
+    :param int max_workers:
+        The number of copies started at the same time. Defaults to the storage.max_workers
+        configuration, or 8.
     """
     logger = None
     if dryrun:
@@ -146,8 +210,11 @@ def storage_file_copy_batch(client, source_client,
                     blob_name, destination_dir=destination_path, metadata=metadata, timeout=timeout,
                     existing_dirs=existing_dirs)
 
-        return list(filter_none(action_blob_copy(blob) for blob in
-                                collect_blobs(source_client, source_container, pattern)))
+        return run_copies(collect_blobs(source_client, source_container, pattern),
+                          action_blob_copy,
+                          get_file_copy_statuses(client, destination_share, max_workers),
+                          dryrun=dryrun, wait=wait, wait_timeout=wait_timeout,
+                          max_workers=max_workers)
 
     elif source_share:
         # copy files from share to share
@@ -177,8 +244,11 @@ def storage_file_copy_batch(client, source_client,
                     file_name, destination_dir=destination_path, metadata=metadata,
                     timeout=timeout, existing_dirs=existing_dirs)
 
-        return list(filter_none(action_file_copy(file) for file in
-                                collect_files(source_client, source_share, pattern)))
+        return run_copies(collect_files(source_client, source_share, pattern),
+                          action_file_copy,
+                          get_file_copy_statuses(client, destination_share, max_workers),
+                          dryrun=dryrun, wait=wait, wait_timeout=wait_timeout,
+                          max_workers=max_workers)
     else:
         # won't happen, the validator should ensure either source_container or source_share is set
         raise ValueError('Fail to find source. Neither blob container or file share is specified.')
@@ -198,8 +268,8 @@ def _create_file_and_directory_from_blob(file_service, blob_service, share, cont
     _make_directory_in_files_share(file_service, share, dir_name, existing_dirs)
 
     try:
-        file_service.copy_file(share, dir_name, file_name, blob_url, metadata, timeout)
-        return file_service.make_file_url(share, dir_name, file_name)
+        copy = file_service.copy_file(share, dir_name, file_name, blob_url, metadata, timeout)
+        return (dir_name, file_name), file_service.make_file_url(share, dir_name, file_name), copy
     except AzureException:
         error_template = 'Failed to copy blob {} to file share {}. Please check if you have ' + \
                          'permission to read source or set a correct sas token.'
@@ -222,8 +292,9 @@ def _create_file_and_directory_from_file(file_service, source_file_service, shar
     _make_directory_in_files_share(file_service, share, dir_name, existing_dirs)
 
     try:
-        file_service.copy_file(share, dir_name, file_name, file_url, metadata, timeout)
-        return file_service.make_file_url(share, dir_name or None, file_name)
+        copy = file_service.copy_file(share, dir_name, file_name, file_url, metadata, timeout)
+        return ((dir_name, file_name),
+                file_service.make_file_url(share, dir_name or None, file_name), copy)
     except AzureException:
         error_template = 'Failed to copy file {} from share {} to file share {}. Please check if ' \
                          'you have right permission to read source or set a correct sas token.'
@@ -249,7 +320,7 @@ def _make_directory_in_files_share(file_service, file_share, directory_path, exi
         p = os.path.dirname(p)
 
     for dir_name in reversed(parents):
-        if existing_dirs and (dir_name in existing_dirs):
+        if existing_dirs is not None and dir_name in existing_dirs:
             continue
 
         try:
@@ -259,5 +330,59 @@ def _make_directory_in_files_share(file_service, file_share, directory_path, exi
         except AzureHttpError:
             raise CLIError('Failed to create directory {}'.format(dir_name))
 
-        if existing_dirs:
-            existing_dirs.add(directory_path)
+        if existing_dirs is not None:
+            existing_dirs.add(dir_name)
+
+
+def _plan_directories(file_paths):
+    """
+    Returns the directories to create for the given file paths, and their parents, grouped by
+    depth. A directory is listed once, and after all its parents.
+    """
+    depths = {}
+    for path in file_paths:
+        parents = []
+        dir_name = os.path.dirname(path)
+        while dir_name and dir_name not in depths:
+            parents.append(dir_name)
+            dir_name = os.path.dirname(dir_name)
+        depth = depths[dir_name] + 1 if dir_name else 0
+        for parent in reversed(parents):
+            depths[parent] = depth
+            depth += 1
+
+    levels = [[] for _ in range(max(depths.values()) + 1)] if depths else []
+    for dir_name, depth in depths.items():
+        levels[depth].append(dir_name)
+    return [sorted(level) for level in levels]
+
+
+def _create_directories(file_service, file_share, file_paths, max_workers=None):
+    """
+    Create the directories of the given file paths in the file share. The directories of a level
+    are created concurrently, once the level above exists.
+
+    Returns the set of created directories, which can serve as the existing_dirs cache of
+    _make_directory_in_files_share.
+    """
+    from multiprocessing.pool import ThreadPool
+
+    def _create(dir_name):
+        try:
+            file_service.create_directory(share_name=file_share,
+                                          directory_name=dir_name,
+                                          fail_on_exist=False)
+        except AzureHttpError:
+            raise CLIError('Failed to create directory {}'.format(dir_name))
+
+    levels = _plan_directories(file_paths)
+    if not levels:
+        return set()
+
+    pool = ThreadPool(min(max_workers or get_max_workers(), max(len(level) for level in levels)))
+    try:
+        for level in levels:
+            pool.map(_create, level)
+    finally:
+        pool.terminate()
+    return set(dir_name for level in levels for dir_name in level)
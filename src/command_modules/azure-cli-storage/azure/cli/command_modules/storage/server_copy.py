@@ -0,0 +1,198 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+"""
+Starts the server-side copies of `copy start-batch` commands on a pool of workers and, with
+`--wait`, waits for the copies to finish.
+
+Waiting polls the copy status of all pending copies at once (listings of the destination
+blobs' virtual directories, or concurrent property requests) with exponential backoff. Failed
+and aborted copies are started again, up to twice. A copy whose status can't be read for
+UNKNOWN_STATUS_POLLS polls in a row counts as failed.
+"""
+
+import os
+
+from azure.cli.core.azlogging import get_az_logger
+from azure.cli.core.util import CLIError
+from azure.cli.command_modules.storage.transfer import TransferItem, run_transfer
+
+logger = get_az_logger(__name__)
+
+COPY_RETRIES = 2
+UNKNOWN_STATUS_POLLS = 5
+
+_POLL_INITIAL_DELAY = 2.0
+_POLL_MAX_DELAY = 30.0
+
+
+class ServerCopy(object):  # pylint: disable=too-few-public-methods
+    """ A copy started by a batch. `destination` identifies the destination blob or file for the
+    status requests, `url` is the URL the command returns. """
+
+    def __init__(self, source, destination, url, copy):
+        self.source = source
+        self.destination = destination
+        self.url = url
+        self.copy_id = copy.id if copy else None
+        self.status = copy.status if copy else 'pending'
+        self.status_description = None
+        self.attempts = 1
+        self.unknown_polls = 0
+
+
+def _start(start_copy, source):
+    return ServerCopy(source, *start_copy(source))
+
+
+def _run_lookups(lookup, lookups, max_workers):
+    """ Runs the lookups concurrently and merges the (destination, copy properties) pairs
+    they return. """
+    from multiprocessing.pool import ThreadPool
+    from azure.cli.command_modules.storage.transfer import get_max_workers
+
+    pool = ThreadPool(min(max_workers or get_max_workers(), len(lookups)))
+    try:
+        return dict(pair for pairs in pool.map(lookup, lookups) for pair in pairs)
+    finally:
+        pool.terminate()
+
+
+def _group_blob_names(names):
+    """ Groups the names of blobs by their virtual directory. Returns the groups that have a
+    common prefix, to be listed, and the names to be requested one by one. """
+    directories = {}
+    for name in names:
+        directories.setdefault(name.rpartition('/')[0], []).append(name)
+    groups, singles = [], []
+    for group in directories.values():
+        if len(group) > 1 and os.path.commonprefix(group):
+            groups.append(group)
+        else:
+            singles.extend(group)
+    return groups, singles
+
+
+def get_blob_copy_statuses(blob_service, container, max_workers=None):
+    """ Returns a function that gets the copy properties of pending blob copies. The blobs of a
+    virtual directory are listed by their common prefix, and the other blobs are requested one
+    by one, with concurrent requests. """
+    from azure.cli.core.profiles import get_sdk, ResourceType
+    Include = get_sdk(ResourceType.DATA_STORAGE, 'blob.models#Include')
+
+    def _lookup(names):
+        try:
+            if isinstance(names, list):
+                wanted = set(names)
+                return [(blob.name, blob.properties.copy) for blob in
+                        blob_service.list_blobs(container, prefix=os.path.commonprefix(names),
+                                                include=Include(copy=True))
+                        if blob.name in wanted]
+            return [(names, blob_service.get_blob_properties(container, names).properties.copy)]
+        except Exception as ex:  # pylint: disable=broad-except
+            logger.debug('Failed to get the copy status of %s: %s', names, ex)
+            return []
+
+    def _get_statuses(destinations):
+        groups, singles = _group_blob_names(destinations)
+        return _run_lookups(_lookup, groups + singles, max_workers)
+    return _get_statuses
+
+
+def get_file_copy_statuses(file_service, share, max_workers=None):
+    """ Returns a function that gets the copy properties of pending file copies with concurrent
+    requests. Destinations are (directory, file name) pairs. """
+
+    def _lookup(destination):
+        try:
+            return [(destination, file_service.get_file_properties(
+                share, destination[0] or None, destination[1]).properties.copy)]
+        except Exception as ex:  # pylint: disable=broad-except
+            logger.debug('Failed to get the copy status of %s: %s', destination, ex)
+            return []
+
+    def _get_statuses(destinations):
+        return _run_lookups(_lookup, list(destinations), max_workers)
+    return _get_statuses
+
+
+def _update(copies, statuses, start_copy):
+    """ Applies the polled statuses (None before the first poll). Restarts failed copies. Returns
+    the copies still pending. """
+    pending = []
+    for copy in copies:
+        status = statuses.get(copy.destination) if statuses is not None else None
+        if status is not None and status.id == copy.copy_id:
+            copy.status = status.status
+            copy.status_description = status.status_description
+            copy.unknown_polls = 0
+        elif statuses is not None:
+            copy.unknown_polls += 1
+            if copy.unknown_polls >= UNKNOWN_STATUS_POLLS:
+                copy.status = 'unknown'
+                copy.status_description = 'The status of the copy could not be read.'
+        if copy.status in ('failed', 'aborted') and copy.attempts <= COPY_RETRIES:
+            logger.warning('Copy of %s %s: %s. Starting it again.', copy.url, copy.status,
+                           copy.status_description)
+            copy.attempts += 1
+            try:
+                restarted = _start(start_copy, copy.source)
+                copy.copy_id, copy.status = restarted.copy_id, restarted.status
+                copy.unknown_polls = 0
+            except Exception as ex:  # pylint: disable=broad-except
+                copy.status, copy.status_description = 'failed', str(ex)
+        if copy.status == 'pending':
+            pending.append(copy)
+    return pending
+
+
+def wait_for_copies(copies, get_statuses, start_copy, timeout=None):
+    """ Polls the pending copies until every copy succeeded or failed for good, or for at most
+    `timeout` seconds. """
+    from azure.cli.core.commands.polling import Backoff, wait_until
+    state = {'pending': _update(copies, None, start_copy), 'reported': None}
+
+    def _poll():
+        pending = state['pending']
+        statuses = get_statuses(set(copy.destination for copy in pending))
+        state['pending'] = pending = _update(pending, statuses, start_copy)
+        counts = _count(copies)
+        if counts != state['reported']:
+            state['reported'] = counts
+            logger.warning('Copies: %d succeeded, %d pending, %d failed', *counts)
+        return not pending, None
+
+    if state['pending'] and \
+            not wait_until(_poll, Backoff(_POLL_INITIAL_DELAY, _POLL_MAX_DELAY), timeout):
+        raise CLIError('{} copies are still pending.'.format(len(state['pending'])))
+    failed = [copy for copy in copies if copy.status != 'success']
+    if failed:
+        for copy in failed:
+            logger.error('%s: %s %s', copy.url, copy.status, copy.status_description or '')
+        raise CLIError('{} of {} copies failed.'.format(len(failed), len(copies)))
+
+
+def _count(copies):
+    succeeded = sum(1 for copy in copies if copy.status == 'success')
+    pending = sum(1 for copy in copies if copy.status == 'pending')
+    return succeeded, pending, len(copies) - succeeded - pending
+
+
+def run_copies(sources, start_copy, get_statuses, dryrun=False, wait=False, wait_timeout=None,
+               max_workers=None):
+    """ Starts a copy for every source on the worker pool and returns the URLs of the
+    destinations. `start_copy` returns the destination, its URL and the CopyProperties of the
+    copy it started, or only reports the copy for a dry run. With `wait`, returns when every copy
+    is done, or raises a CLIError after `wait_timeout` seconds. """
+    if dryrun:
+        for source in sources:
+            start_copy(source)
+        return []
+    items = (TransferItem(source, None, 0, None) for source in sources)
+    copies = run_transfer('Started', items, lambda item: _start(start_copy, item.source),
+                          max_workers=max_workers)
+    if wait and copies:
+        wait_for_copies(copies, get_statuses, start_copy, timeout=wait_timeout)
+    return [copy.url for copy in copies]
@@ -0,0 +1,128 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+"""
+Finds the files of a batch command that do not need to be transferred (`--skip-unchanged`).
+
+The destination is listed once. A file is unchanged when the destination has a file of the same
+size and either
+ - both have the same content MD5 (the local MD5 is cached by path, size and modification time),
+   or
+ - the last run of the same batch transferred the file and it was not modified since.
+
+The state of each batch is kept in a file of its own in the storageSync directory of the
+configuration directory, keyed by local path. Files that no longer exist are dropped from it when
+it is saved.
+"""
+
+import base64
+import hashlib
+import io
+import json
+import os
+import threading
+
+from azure.cli.core.azlogging import get_az_logger
+
+logger = get_az_logger(__name__)
+
+SYNC_DIR_NAME = 'storageSync'
+
+_MD5_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def get_file_md5(path):
+    """ The base64 encoded MD5 of a local file, like the Content-MD5 of blobs and files. """
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_MD5_CHUNK_SIZE), b''):
+            md5.update(chunk)
+    return base64.b64encode(md5.digest()).decode('utf-8')
+
+
+def _get_stat(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime]
+
+
+class SyncState(object):
+    """ The files a batch transferred between a local directory and a container or share, and
+    the MD5 of these local files. """
+
+    def __init__(self, *batch):
+        from azure.cli.core._environment import get_config_dir
+        batch_id = hashlib.sha1(json.dumps(batch).encode('utf-8')).hexdigest()
+        self.path = os.path.join(get_config_dir(), SYNC_DIR_NAME, batch_id + '.json')
+        self._data = self._read()
+        self._lock = threading.Lock()
+        self._transferred = {}
+        self._md5 = {}
+
+    def _read(self):
+        try:
+            with io.open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, IOError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def _get_md5(self, path, stat):
+        cached = self._data.get('md5', {}).get(path)
+        if cached and cached[:2] == stat:
+            return cached[2]
+        md5 = get_file_md5(path)
+        with self._lock:
+            self._md5[path] = stat + [md5]
+        return md5
+
+    def is_unchanged(self, local_path, remote_size, remote_md5=None):
+        """ Returns whether a file needs no transfer. `remote_size` is None when the destination
+        or source does not have the file. """
+        local_path = os.path.abspath(local_path)
+        if remote_size is None or not os.path.isfile(local_path):
+            return False
+        stat = _get_stat(local_path)
+        if stat[0] != remote_size:
+            return False
+        if remote_md5:
+            return self._get_md5(local_path, stat) == remote_md5
+        return self._data.get('transferred', {}).get(local_path) == stat
+
+    def record(self, local_path):
+        """ Records a transferred file, after an upload or download. """
+        local_path = os.path.abspath(local_path)
+        stat = _get_stat(local_path)
+        with self._lock:
+            self._transferred[local_path] = stat
+
+    def save(self):
+        """ Writes the changes of this run, merged with the changes of other runs of the batch
+        since the state was read. """
+        from azure.cli.core._session import file_lock, write_file_atomic
+        from .util import mkdir_p
+        with self._lock:
+            if not self._transferred and not self._md5:
+                return
+            mkdir_p(os.path.dirname(self.path))
+            with file_lock(self.path + '.lock'):
+                data = self._read()
+                for key, changes in (('transferred', self._transferred), ('md5', self._md5)):
+                    entries = data.get(key, {})
+                    entries.update(changes)
+                    data[key] = {path: value for path, value in entries.items()
+                                 if path in changes or os.path.isfile(path)}
+                write_file_atomic(self.path, json.dumps(data).encode('utf-8'))
+            self._data = data
+            self._transferred, self._md5 = {}, {}
+
+
+def filter_unchanged(state, items, remote_index):
+    """ Returns the items that need a transfer. `items` are (local path, name) pairs and
+    `remote_index` maps a name to a (size, content MD5) pair. """
+    changed = [(path, name) for path, name in items
+               if not state.is_unchanged(path, *remote_index.get(name, (None, None)))]
+    if len(changed) < len(items):
+        logger.warning('Skipping %d unchanged files', len(items) - len(changed))
+    return changed
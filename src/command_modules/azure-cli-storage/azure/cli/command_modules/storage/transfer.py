@@ -0,0 +1,302 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+"""
+Transfers the files of batch commands (e.g. `storage blob upload-batch`) with a pool of workers.
+
+Small files are handed to the workers in groups so a worker does not wait for the pool between
+two small files. Every finished file is recorded in a journal in the configuration directory;
+when a batch is interrupted or some files fail, running the same command again skips the files
+the journal lists. The journal is removed once every file of the batch is transferred.
+"""
+
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+from azure.cli.core.azlogging import get_az_logger
+from azure.cli.core.util import CLIError
+
+logger = get_az_logger(__name__)
+
+DEFAULT_MAX_WORKERS = 8
+
+# Files up to this size are transferred by a worker in groups
+SMALL_FILE_SIZE = 1024 * 1024
+_GROUP_MAX_FILES = 32
+_GROUP_MAX_SIZE = 8 * 1024 * 1024
+
+# Seconds between two progress reports
+_PROGRESS_INTERVAL = 10
+
+# Seconds the enumerating thread waits for a free worker before it collects outcomes again
+_QUEUE_TIMEOUT = 0.5
+
+# A file to transfer. `key` identifies the version of the file in the journal, e.g. the name,
+# size and modification time of a local file.
+TransferItem = namedtuple('TransferItem', ['source', 'destination', 'size', 'key'])
+
+
+def get_max_workers():
+    from azure.cli.core._config import az_config
+    return az_config.getint('storage', 'max_workers', fallback=DEFAULT_MAX_WORKERS)
+
+
+def local_file_item(path, destination):
+    """ A local file to upload. The journal key changes when the file is modified. """
+    stat = os.stat(path)
+    return TransferItem(path, destination, stat.st_size,
+                        json.dumps([destination, stat.st_size, stat.st_mtime]))
+
+
+def remote_file_item(name, destination, size, etag):
+    """ A blob or file to download. The journal key changes when the blob or file is
+    modified. """
+    return TransferItem(name, destination, size or 0, json.dumps([name, etag]))
+
+
+def _format_size(size):
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if size < 1024:
+            return '{:.1f} {}'.format(size, unit)
+        size /= 1024.0
+    return '{:.1f} TiB'.format(size)
+
+
+class TransferJournal(object):
+    """ The files of a batch that were transferred. A batch is identified by its operation,
+    account, container or share, local directory and pattern. """
+
+    def __init__(self, *batch):
+        from azure.cli.core._environment import get_config_dir
+        batch_id = hashlib.sha1(json.dumps(batch).encode('utf-8')).hexdigest()
+        self.path = os.path.join(get_config_dir(), 'transfers', batch_id + '.journal')
+        self._file = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """ Returns the keys of the transferred files. """
+        try:
+            with io.open(self.path, 'r', encoding='utf-8') as f:
+                # the last line may be incomplete if the command was killed while writing it
+                return set(line.rstrip('\n') for line in f if line.endswith('\n'))
+        except (OSError, IOError):
+            return set()
+
+    def record(self, keys):
+        with self._lock:
+            if self._file is None:
+                from .util import mkdir_p
+                mkdir_p(os.path.dirname(self.path))
+                self._file = io.open(self.path, 'a', encoding='utf-8')
+            for key in keys:
+                self._file.write(key + u'\n')
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def remove(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class TransferProgress(object):
+    """ Reports the throughput of a batch and, once all its files are known, the estimated time
+    left. """
+
+    def __init__(self, operation):
+        self.operation = operation
+        self.total_count = 0
+        self.total_size = 0
+        self.enumerated = False
+        self.count = 0
+        self.size = 0
+        self.start = time.time()
+        self._last_report = self.start
+
+    def add_total(self, count, size):
+        self.total_count += count
+        self.total_size += size
+
+    def add(self, count, size):
+        self.count += count
+        self.size += size
+        now = time.time()
+        if now - self._last_report >= _PROGRESS_INTERVAL and self.count < self.total_count:
+            self._last_report = now
+            logger.warning('%s', self.report())
+
+    def _rate(self):
+        elapsed = max(time.time() - self.start, 0.001)
+        return elapsed, self.size / elapsed
+
+    def report(self):
+        elapsed, rate = self._rate()
+        total = '{}{}'.format(self.total_count, '' if self.enumerated else '+')
+        if not rate:
+            # e.g. server-side copies, which transfer no data here
+            return '{} {}/{} files in {:.0f}s'.format(self.operation, self.count, total, elapsed)
+        if not self.enumerated:
+            return '{} {}/{} files ({}), {}/s'.format(self.operation, self.count, total,
+                                                      _format_size(self.size), _format_size(rate))
+        return '{} {}/{} files ({}/{}), {}/s, about {:.0f}s left'.format(
+            self.operation, self.count, total, _format_size(self.size),
+            _format_size(self.total_size), _format_size(rate),
+            (self.total_size - self.size) / rate)
+
+    def summary(self):
+        elapsed, rate = self._rate()
+        if not rate:
+            return '{} {} files in {:.1f}s'.format(self.operation, self.count, elapsed)
+        return '{} {} files ({}) in {:.1f}s, {}/s'.format(
+            self.operation, self.count, _format_size(self.size), elapsed, _format_size(rate))
+
+
+def group_items(items, small_file_size=SMALL_FILE_SIZE):
+    """ Groups small files so each task of a worker transfers about the same amount of data.
+    Larger files are transferred alone. """
+    group, group_size = [], 0
+    for item in items:
+        if item.size > small_file_size:
+            yield [item]
+            continue
+        group.append(item)
+        group_size += item.size
+        if len(group) >= _GROUP_MAX_FILES or group_size >= _GROUP_MAX_SIZE:
+            yield group
+            group, group_size = [], 0
+    if group:
+        yield group
+
+
+def run_transfer(operation, items, action, journal=None, max_workers=None):
+    """ Calls `action` on every item that the journal does not list, on at most `max_workers`
+    threads, and returns the results. `operation` (e.g. 'Uploaded') prefixes progress reports.
+    Items may be a generator, e.g. of a listing: transfers start while it is iterated, and at
+    most two groups of items per worker wait for a worker.
+    Raises a CLIError when an item failed, after the other items were transferred. """
+    max_workers = max_workers or get_max_workers()
+    done = journal.load() if journal else set()
+    progress = TransferProgress(operation)
+    counts = {'items': 0, 'skipped': 0}
+    results, failures = [], []
+
+    def _pending():
+        for item in items:
+            counts['items'] += 1
+            if item.key in done:
+                counts['skipped'] += 1
+            else:
+                progress.add_total(1, item.size)
+                yield item
+        progress.enumerated = True
+
+    def _transfer(group):
+        outcomes = []
+        for item in group:
+            try:
+                outcomes.append((item, action(item), None))
+            except Exception as ex:  # pylint: disable=broad-except
+                logger.debug('Failed to transfer %s', item.source, exc_info=True)
+                outcomes.append((item, None, ex))
+        return outcomes
+
+    def _collect(outcomes):
+        finished = [(item, result) for item, result, ex in outcomes if ex is None]
+        failures.extend((item, ex) for item, _, ex in outcomes if ex is not None)
+        if journal and finished:
+            journal.record([item.key for item, _ in finished])
+        results.extend(result for _, result in finished)
+        progress.add(len(finished), sum(item.size for item, _ in finished))
+
+    groups = group_items(_pending())
+    try:
+        if max_workers <= 1:
+            for group in groups:
+                _collect(_transfer(group))
+        else:
+            _run_on_workers(groups, _transfer, _collect, max_workers)
+    finally:
+        if journal:
+            journal.close()
+
+    if counts['skipped']:
+        logger.warning('Skipped %d files transferred by an earlier run of this command',
+                       counts['skipped'])
+    if progress.count or failures:
+        logger.warning('%s', progress.summary())
+    if failures:
+        for item, ex in failures:
+            logger.error('%s: %s', item.source, ex)
+        message = '{} of {} files failed.'.format(len(failures), counts['items'])
+        if journal:
+            message += ' Run the command again to transfer them; the other files are skipped.'
+        raise CLIError(message)
+    if journal:
+        journal.remove()
+    return results
+
+
+def _run_on_workers(groups, transfer, collect, max_workers):
+    """ Transfers the groups on worker threads while they are enumerated. Outcomes are collected
+    on the calling thread. """
+    try:
+        from queue import Queue, Empty, Full
+    except ImportError:
+        from Queue import Queue, Empty, Full  # pylint: disable=import-error
+
+    tasks = Queue(maxsize=2 * max_workers)
+    outcomes = Queue()
+    stopped = threading.Event()
+
+    def _work():
+        while True:
+            group = tasks.get()
+            if group is None or stopped.is_set():
+                return
+            outcomes.put(transfer(group))
+
+    def _drain(timeout=None):
+        try:
+            collect(outcomes.get(timeout=timeout) if timeout else outcomes.get_nowait())
+            while True:
+                collect(outcomes.get_nowait())
+        except Empty:
+            pass
+
+    def _put(task):
+        # keeps collecting, and can be interrupted, while the workers are busy
+        while True:
+            try:
+                tasks.put(task, timeout=_QUEUE_TIMEOUT)
+                return
+            except Full:
+                _drain()
+
+    workers = [threading.Thread(target=_work) for _ in range(max_workers)]
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+    try:
+        for group in groups:
+            _put(group)
+            _drain()
+        for _ in workers:
+            _put(None)
+        while any(worker.is_alive() for worker in workers):
+            _drain(timeout=_QUEUE_TIMEOUT)
+        _drain()
+    except BaseException:
+        stopped.set()
+        raise
@@ -7,17 +7,15 @@ import os
 import os.path
 from fnmatch import fnmatch
 
-from azure.cli.core.profiles import get_sdk, ResourceType
+from azure.cli.core.profiles import get_sdk, supported_api_version, ResourceType
 
 
 def collect_blobs(blob_service, container, pattern=None):
     """
     List the blobs in the given blob container, filter the blob by comparing their path to the given
-    pattern.
+    pattern. Only the blobs that start with the literal prefix of the pattern are listed, page by
+    page as the result is iterated.
     """
-    # TODO: deal with container which contains more that 5000 files.
-    #       In that case, the listing operation will page the results.
-
     if not blob_service:
         raise ValueError('missing parameter blob_service')
 
@@ -27,8 +25,18 @@ def collect_blobs(blob_service, container, pattern=None):
     if not _pattern_has_wildcards(pattern):
         return [pattern]
     else:
-        return (blob.name for blob in blob_service.list_blobs(container)
-                if _match_path(pattern, blob.name))
+        blobs = blob_service.list_blobs(container, prefix=get_pattern_prefix(pattern))
+        return (blob.name for blob in blobs if _match_path(pattern, blob.name))
+
+
+def collect_blobs_with_properties(blob_service, container, pattern=None):
+    """
+    List the blobs in the given blob container that match the pattern, with their properties.
+    """
+    if not _pattern_has_wildcards(pattern):
+        return [blob_service.get_blob_properties(container, pattern)]
+    return (blob for blob in blob_service.list_blobs(container, prefix=get_pattern_prefix(pattern))
+            if _match_path(pattern, blob.name))
 
 
 def collect_files(file_service, share, pattern=None):
@@ -83,19 +91,46 @@ def glob_files_locally(folder_path, pattern):
 
 def glob_files_remotely(client, share_name, pattern):
     """glob the files in remote file share based on the given pattern"""
+    for current_dir, f in walk_files_remotely(client, share_name, pattern):
+        yield current_dir, f.name
+
+
+def walk_files_remotely(client, share_name, pattern=None):
+    """list the files in remote file share that match the pattern, as tuples of the directory and
+    the File, which has the size of the file. The walk starts at the directory the literal prefix
+    of the pattern names, and lists only its entries that start with the rest of the prefix.
+
+    File service API versions before 2016-05-31 can't list the entries of a directory by prefix,
+    so with them the entries of the start directory are filtered here."""
     from collections import deque
+    from azure.common import AzureMissingResourceHttpError
     Directory, File = get_sdk(ResourceType.DATA_STORAGE,
                               'file.models#Directory',
                               'file.models#File')
 
-    queue = deque([""])
+    start_dir, name_prefix = os.path.split(get_pattern_prefix(pattern) or '')
+    list_kwargs = {'prefix': name_prefix} if name_prefix and \
+        supported_api_version(ResourceType.DATA_STORAGE, min_api='2016-05-31') else {}
+    queue = deque([start_dir])
     while len(queue) > 0:
         current_dir = queue.pop()
-        for f in client.list_directories_and_files(share_name, current_dir):
+        try:
+            if current_dir == start_dir:
+                entries = client.list_directories_and_files(share_name, current_dir, **list_kwargs)
+            else:
+                entries = client.list_directories_and_files(share_name, current_dir)
+        except AzureMissingResourceHttpError:
+            if current_dir != start_dir:
+                raise
+            # the directory of the pattern does not exist
+            return
+        for f in entries:
+            if current_dir == start_dir and not f.name.startswith(name_prefix):
+                continue
             if isinstance(f, File):
                 if (pattern and fnmatch(os.path.join(current_dir, f.name), pattern)) or \
                    (not pattern):
-                    yield current_dir, f.name
+                    yield current_dir, f
             elif isinstance(f, Directory):
                 queue.appendleft(os.path.join(current_dir, f.name))
 
@@ -137,6 +172,16 @@ def mkdir_p(path):
             raise
 
 
+def get_pattern_prefix(pattern):
+    """the part of a pattern before its first wildcard, which every matching path starts with"""
+    if not pattern:
+        return None
+    for i, c in enumerate(pattern):
+        if c in '*?[':
+            return pattern[:i] or None
+    return pattern
+
+
 def _pattern_has_wildcards(p):
     return not p or p.find('*') != -1 or p.find('?') != -1 or p.find('[') != -1
 
@@ -0,0 +1,490 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import base64
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from collections import namedtuple
+
+import mock
+from azure.common import AzureMissingResourceHttpError
+
+from azure.cli.core.profiles import get_sdk, ResourceType
+from azure.cli.core.util import CLIError
+from azure.cli.command_modules.storage.blob import (storage_blob_copy_batch,
+                                                    storage_blob_download_batch,
+                                                    storage_blob_upload_batch)
+from azure.cli.command_modules.storage.file import (storage_file_upload_batch,
+                                                    _make_directory_in_files_share,
+                                                    _plan_directories)
+from azure.cli.command_modules.storage.server_copy import (ServerCopy, UNKNOWN_STATUS_POLLS,
+                                                           get_blob_copy_statuses, wait_for_copies)
+from azure.cli.command_modules.storage.transfer import (TransferItem, TransferJournal,
+                                                        group_items, run_transfer)
+from azure.cli.command_modules.storage.util import (glob_files_locally, get_pattern_prefix,
+                                                    walk_files_remotely)
+
+_Properties = namedtuple('_Properties', ['content_length', 'etag', 'content_settings'])
+_ContentSettings = namedtuple('_ContentSettings', ['content_md5'])
+_Blob = namedtuple('_Blob', ['name', 'properties'])
+
+
+class _BlobService(object):
+    """ Keeps the blobs of one account in memory, like the storage emulator. """
+
+    def __init__(self):
+        self.account_name = 'devstoreaccount1'
+        self.blobs = {}
+        self.fail = set()
+        self.threads = set()
+        self.store_md5 = True
+        self.prefixes = []
+        self._lock = threading.Lock()
+
+    def _record(self, blob_name):
+        with self._lock:
+            self.threads.add(threading.current_thread())
+        if blob_name in self.fail:
+            raise IOError('Connection reset')
+
+    def create_blob_from_path(self, container_name, blob_name, file_path, **kwargs):
+        self._record(blob_name)
+        with open(file_path, 'rb') as f:
+            with self._lock:
+                self.blobs[(container_name, blob_name)] = f.read()
+
+    def make_blob_url(self, container_name, blob_name, **kwargs):
+        return 'https://{}/{}/{}'.format(self.account_name, container_name, blob_name)
+
+    def list_blobs(self, container_name, prefix=None):
+        self.prefixes.append(prefix)
+        return [_Blob(name, _Properties(len(content), '"{}"'.format(hash(content)),
+                                        _ContentSettings(self._get_md5(content))))
+                for (container, name), content in sorted(self.blobs.items())
+                if container == container_name and name.startswith(prefix or '')]
+
+    def _get_md5(self, content):
+        if self.store_md5:
+            return base64.b64encode(hashlib.md5(content).digest()).decode('utf-8')
+        return None
+
+    def get_blob_to_path(self, container_name, blob_name, file_path):
+        self._record(blob_name)
+        with open(file_path, 'wb') as f:
+            f.write(self.blobs[(container_name, blob_name)])
+        return _Blob(blob_name, None)
+
+
+class _CopyProperties(object):  # pylint: disable=too-few-public-methods
+
+    def __init__(self, copy_id, status='pending', status_description=None):
+        self.id = copy_id
+        self.status = status
+        self.status_description = status_description
+
+
+class _CopyBlobService(object):
+    """ Server-side copies that finish after `polls` status requests. Copies of blobs in `fail`
+    fail the first time. """
+
+    def __init__(self, polls=2, fail=()):
+        self.account_name = 'devstoreaccount1'
+        self.polls = polls
+        self.fail = set(fail)
+        self.copies = {}
+        self.listings = []
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def copy_blob(self, container_name, blob_name, copy_source):
+        with self._lock:
+            copy_id = '{}-{}'.format(blob_name, len(self.copies))
+            self.copies[blob_name] = [copy_id, 0]
+        return _CopyProperties(copy_id)
+
+    def make_blob_url(self, container_name, blob_name, **kwargs):
+        return 'https://{}/{}/{}'.format(self.account_name, container_name, blob_name)
+
+    def _get_blob(self, name):
+        with self._lock:
+            copy = self.copies[name]
+            copy[1] += 1
+            status = 'pending' if copy[1] < self.polls else 'success'
+            if status == 'success' and name in self.fail:
+                self.fail.remove(name)
+                status = 'failed'
+        blob = mock.MagicMock(properties=mock.MagicMock(
+            copy=_CopyProperties(copy[0], status, 'Server busy')))
+        blob.name = name
+        return blob
+
+    def list_blobs(self, container_name, prefix=None, include=None):
+        self.listings.append(prefix)
+        return [self._get_blob(name) for name in sorted(self.copies)
+                if name.startswith(prefix or '')]
+
+    def get_blob_properties(self, container_name, blob_name):
+        self.requests.append(blob_name)
+        if blob_name not in self.copies:
+            raise AzureMissingResourceHttpError('The specified blob does not exist.', 404)
+        return self._get_blob(blob_name)
+
+
+class _FileService(object):
+    """ A file share in memory that fails requests for files in missing directories. """
+
+    def __init__(self):
+        self.account_name = 'devstoreaccount1'
+        self.directories = set([''])
+        self.files = {}
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def create_directory(self, share_name, directory_name, fail_on_exist=False):
+        with self._lock:
+            self.requests.append(('create_directory', directory_name))
+            if os.path.dirname(directory_name) not in self.directories:
+                raise IOError('ParentNotFound: {}'.format(directory_name))
+            self.directories.add(directory_name)
+
+    def create_file_from_path(self, share_name, directory_name, file_name, local_file_path,
+                              **kwargs):
+        with self._lock:
+            self.requests.append(('create_file', directory_name))
+            if directory_name not in self.directories:
+                raise IOError('ParentNotFound: {}'.format(directory_name))
+        with open(local_file_path, 'rb') as f:
+            self.files[(directory_name, file_name)] = f.read()
+
+    def make_file_url(self, share_name, directory_name, file_name):
+        return 'https://{}/{}/{}/{}'.format(self.account_name, share_name, directory_name,
+                                            file_name)
+
+
+class _FileTreeService(object):
+    """ Lists the directories and files of a share that has the given files. """
+
+    def __init__(self, paths):
+        self.paths = paths
+        self.listings = []
+
+    def _list(self, directory_name, prefix):
+        Directory, File = get_sdk(ResourceType.DATA_STORAGE, 'file.models#Directory',
+                                  'file.models#File')
+        self.listings.append((directory_name, prefix))
+        entries = {}
+        for path in self.paths:
+            if directory_name and not path.startswith(directory_name + '/'):
+                continue
+            name, sep, _ = path[len(directory_name) + 1 if directory_name else 0:].partition('/')
+            if name.startswith(prefix or ''):
+                entries[name] = Directory(name) if sep else File(name)
+        if directory_name and not entries and not any(
+                path.startswith(directory_name + '/') for path in self.paths):
+            raise AzureMissingResourceHttpError('The specified resource does not exist.', 404)
+        return [entries[name] for name in sorted(entries)]
+
+    def list_directories_and_files(self, share_name, directory_name=None, prefix=None):
+        return self._list(directory_name, prefix)
+
+
+class _FileTreeService20150405(_FileTreeService):
+    """ The file service of API version 2015-04-05, which can't list by prefix. """
+
+    def list_directories_and_files(self, share_name, directory_name=None):
+        return self._list(directory_name, None)
+
+
+class TestStorageTransfer(unittest.TestCase):
+
+    def setUp(self):
+        self.config_dir = tempfile.mkdtemp()
+        self.source = tempfile.mkdtemp()
+        self.destination = tempfile.mkdtemp()
+        patcher = mock.patch('azure.cli.core._environment.get_config_dir',
+                             return_value=self.config_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for i in range(50):
+            directory = os.path.join(self.source, 'dir_{}'.format(i % 5))
+            if not os.path.isdir(directory):
+                os.mkdir(directory)
+            with open(os.path.join(directory, 'file_{}'.format(i)), 'wb') as f:
+                f.write(b'x' * i)
+        self.service = _BlobService()
+
+    def tearDown(self):
+        for path in (self.config_dir, self.source, self.destination):
+            shutil.rmtree(path)
+
+    def _upload(self, **kwargs):
+        return storage_blob_upload_batch(self.service, self.source, 'container',
+                                         source_files=list(glob_files_locally(self.source, None)),
+                                         destination_container_name='container',
+                                         blob_type='block', **kwargs)
+
+    def test_upload_and_download_batch(self):
+        urls = self._upload(max_workers=4)
+        self.assertEqual(len(urls), 50)
+        self.assertEqual(len(self.service.blobs), 50)
+        self.assertEqual(self.service.blobs[('container', 'dir_2/file_7')], b'x' * 7)
+
+        self.service.threads.clear()
+        names = storage_blob_download_batch(self.service, 'container', self.destination,
+                                            'container', pattern='dir_1/*', max_workers=4)
+        self.assertEqual(sorted(names), sorted('dir_1/file_{}'.format(i)
+                                               for i in range(1, 50, 5)))
+        with open(os.path.join(self.destination, 'dir_1', 'file_11'), 'rb') as f:
+            self.assertEqual(f.read(), b'x' * 11)
+        # small files are transferred in groups
+        self.assertEqual(len(self.service.threads), 1)
+        self.assertEqual(self.service.prefixes, ['dir_1/'])
+        self.assertEqual(os.listdir(self.config_dir), ['transfers'])
+        self.assertEqual(os.listdir(os.path.join(self.config_dir, 'transfers')), [])
+
+    def test_interrupted_upload_resumes(self):
+        self.service.fail = {'dir_3/file_8', 'dir_4/file_9'}
+        with self.assertRaises(CLIError) as cm:
+            self._upload(max_workers=1)
+        self.assertIn('2 of 50 files failed', str(cm.exception))
+        self.assertEqual(len(self.service.blobs), 48)
+
+        self.service.fail.clear()
+        self.service.blobs.clear()
+        # a modified file is uploaded again
+        with open(os.path.join(self.source, 'dir_0', 'file_0'), 'wb') as f:
+            f.write(b'modified')
+        os.utime(os.path.join(self.source, 'dir_0', 'file_0'), (1, 1))
+        self.assertEqual(len(self._upload()), 3)
+        self.assertEqual(sorted(name for _, name in self.service.blobs),
+                         ['dir_0/file_0', 'dir_3/file_8', 'dir_4/file_9'])
+
+        # the journal was removed, so the next run uploads everything
+        self.assertEqual(len(self._upload()), 50)
+
+    def test_upload_batch_skips_unchanged_files(self):
+        self.assertEqual(len(self._upload(skip_unchanged=True)), 50)
+        self.assertEqual(self._upload(skip_unchanged=True), [])
+
+        # same size, other content
+        with open(os.path.join(self.source, 'dir_3', 'file_3'), 'wb') as f:
+            f.write(b'yyy')
+        self.assertEqual(self._upload(skip_unchanged=True),
+                         ['https://devstoreaccount1/container/dir_3/file_3'])
+
+        # without a content MD5, files uploaded by the last run and not modified are skipped
+        self.service.store_md5 = False
+        self.assertEqual(self._upload(skip_unchanged=True), [])
+        os.utime(os.path.join(self.source, 'dir_3', 'file_3'), (1, 1))
+        self.assertEqual(len(self._upload(skip_unchanged=True)), 1)
+        del self.service.blobs[('container', 'dir_4/file_4')]
+        self.assertEqual(self._upload(skip_unchanged=True),
+                         ['https://devstoreaccount1/container/dir_4/file_4'])
+
+    def test_sync_state_is_kept_per_batch_without_removed_files(self):
+        self._upload(skip_unchanged=True)
+        state_dir = os.path.join(self.config_dir, 'storageSync')
+        state_path = os.path.join(state_dir, [name for name in os.listdir(state_dir)
+                                              if name.endswith('.json')][0])
+        with open(state_path, 'rb') as f:
+            state = f.read()
+
+        # a dry run does not write the state
+        with open(os.path.join(self.source, 'dir_1', 'file_1'), 'wb') as f:
+            f.write(b'z')
+        self.assertEqual(self._upload(skip_unchanged=True, dryrun=True), None)
+        with open(state_path, 'rb') as f:
+            self.assertEqual(f.read(), state)
+
+        removed = os.path.join(self.source, 'dir_0', 'file_5')
+        os.remove(removed)
+        self.assertEqual(self._upload(skip_unchanged=True),
+                         ['https://devstoreaccount1/container/dir_1/file_1'])
+        with open(state_path, 'r') as f:
+            state = json.load(f)
+        self.assertEqual(len(state['transferred']), 49)
+        self.assertEqual(len(state['md5']), 49)
+        self.assertNotIn(removed, state['transferred'])
+
+    @mock.patch('azure.cli.core.commands.polling.Backoff.next_delay', return_value=0)
+    def test_copy_batch_waits_for_copies(self, _):
+        self._upload()
+        destination = _CopyBlobService(fail=['dir_2/file_12'])
+        urls = storage_blob_copy_batch(destination, self.service, destination_container='copies',
+                                       source_container='container', pattern='dir_2/*',
+                                       wait=True, max_workers=4)
+        self.assertEqual(len(urls), 10)
+        # statuses are listed with the common prefix of the pending copies of a directory
+        self.assertEqual(destination.listings, ['dir_2/file_'] * 2)
+        self.assertEqual(destination.requests, ['dir_2/file_12'] * 2)
+        # the failed copy was started again
+        self.assertEqual(destination.copies['dir_2/file_12'][0], 'dir_2/file_12-10')
+
+        destination = _CopyBlobService(polls=1, fail=['dir_2/file_12'] * 3)
+        urls = storage_blob_copy_batch(destination, self.service, destination_container='copies',
+                                       source_container='container', pattern='dir_2/*')
+        self.assertEqual(len(urls), 10)
+        self.assertEqual(destination.listings, [])
+
+    def test_get_blob_copy_statuses(self):
+        destination = _CopyBlobService(polls=5)
+        names = ['a/x/1', 'a/x/2', 'a/y/1', 'b1', 'b2', 'c']
+        for name in names:
+            destination.copy_blob('copies', name, None)
+        statuses = get_blob_copy_statuses(destination, 'copies', max_workers=2)(set(names))
+        self.assertEqual(sorted(statuses), names)
+        # blobs of a directory are listed, other blobs requested, never the whole container
+        self.assertEqual(destination.listings, ['a/x/'])
+        self.assertEqual(sorted(destination.requests), ['a/y/1', 'b1', 'b2', 'c'])
+
+        statuses = get_blob_copy_statuses(destination, 'copies')({'a/x/1', 'missing'})
+        self.assertEqual(sorted(statuses), ['a/x/1'])
+
+    @mock.patch('azure.cli.core.commands.polling.Backoff.next_delay', return_value=0)
+    def test_wait_for_copies_gives_up_on_unknown_statuses(self, _):
+        copies = [ServerCopy('source_1', 'copy_1', 'url_1', _CopyProperties('id_1')),
+                  ServerCopy('source_2', 'copy_2', 'url_2', _CopyProperties('id_2'))]
+        polls = []
+
+        def _get_statuses(destinations):
+            polls.append(destinations)
+            return {'copy_1': _CopyProperties('id_1', 'success')}
+
+        with self.assertRaisesRegexp(CLIError, '1 of 2 copies failed'):
+            wait_for_copies(copies, _get_statuses, None)
+        self.assertEqual(len(polls), UNKNOWN_STATUS_POLLS)
+        self.assertEqual([copy.status for copy in copies], ['success', 'unknown'])
+
+        copies = [ServerCopy('source_1', 'copy_1', 'url_1', _CopyProperties('id_1'))]
+        start = time.time()
+        with self.assertRaisesRegexp(CLIError, '1 copies are still pending'):
+            wait_for_copies(copies, lambda _: {'copy_1': _CopyProperties('id_1')}, None,
+                            timeout=0.5)
+        self.assertTrue(time.time() - start < 5)
+
+    def test_file_upload_batch_creates_each_directory_once(self):
+        for i in range(3):
+            directory = os.path.join(self.source, 'dir_1', 'sub', 'deep_{}'.format(i))
+            os.makedirs(directory)
+            with open(os.path.join(directory, 'file'), 'wb') as f:
+                f.write(b'deep')
+        service = _FileService()
+        urls = storage_file_upload_batch(service, 'share', self.source, max_workers=4)
+        self.assertEqual(len(urls), 53)
+        self.assertEqual(service.files[('dir_1/sub/deep_2', 'file')], b'deep')
+        created = [name for request, name in service.requests if request == 'create_directory']
+        self.assertEqual(sorted(created), sorted(['dir_{}'.format(i) for i in range(5)] +
+                                                 ['dir_1/sub'] +
+                                                 ['dir_1/sub/deep_{}'.format(i)
+                                                  for i in range(3)]))
+        # directories are created before any file is uploaded
+        self.assertEqual(set(request for request, _ in service.requests[:len(created)]),
+                         set(['create_directory']))
+
+    def test_plan_directories(self):
+        self.assertEqual(_plan_directories(['a/b/c/file', 'a/b/file', 'a/d/file', 'e/file',
+                                            'file', 'a/b/c/other']),
+                         [['a', 'e'], ['a/b', 'a/d'], ['a/b/c']])
+        self.assertEqual(_plan_directories(['file']), [])
+
+    def test_make_directory_uses_existing_dirs(self):
+        service = _FileService()
+        existing_dirs = set()
+        _make_directory_in_files_share(service, 'share', 'a/b/c', existing_dirs)
+        _make_directory_in_files_share(service, 'share', 'a/b/d', existing_dirs)
+        self.assertEqual([name for _, name in service.requests], ['a', 'a/b', 'a/b/c', 'a/b/d'])
+        self.assertEqual(existing_dirs, set(['a', 'a/b', 'a/b/c', 'a/b/d']))
+
+    def test_run_transfer_on_workers(self):
+        items = [TransferItem(str(i), None, 2 * 1024 * 1024, str(i)) for i in range(20)]
+        threads = set()
+        lock = threading.Lock()
+
+        def _action(item):
+            with lock:
+                threads.add(threading.current_thread())
+            time.sleep(0.01)
+            return item.source
+
+        journal = TransferJournal('test')
+        self.assertEqual(sorted(run_transfer('Copied', items, _action, journal, max_workers=4),
+                                key=int), [str(i) for i in range(20)])
+        self.assertTrue(1 < len(threads) <= 4)
+        self.assertFalse(os.path.exists(journal.path))
+
+    def test_run_transfer_while_enumerating(self):
+        state = {'listed': 0, 'transferred': 0, 'backlog': 0}
+        lock = threading.Lock()
+
+        def _list():
+            for i in range(2000):
+                with lock:
+                    state['listed'] += 1
+                    state['backlog'] = max(state['backlog'],
+                                           state['listed'] - state['transferred'])
+                yield TransferItem(str(i), None, 10, str(i))
+
+        def _action(item):
+            with lock:
+                state['transferred'] += 1
+                if item.source == '0':
+                    # transfers start before the listing ends
+                    self.assertTrue(state['listed'] < 2000)
+            time.sleep(0.001)
+
+        self.assertEqual(len(run_transfer('Copied', _list(), _action, max_workers=2)), 2000)
+        # two waiting groups per worker, a group per worker, one waiting to be queued and the
+        # one being filled
+        self.assertTrue(state['backlog'] <= (2 * 2 + 2 + 1 + 1) * 32)
+
+    def test_walk_files_remotely(self):
+        paths = ['apple/file_0', 'apple/fig/file_1', 'apple/other/file_2', 'apple/readme',
+                 'banana/file_3', 'file_4']
+
+        def _walk(service, pattern):
+            return sorted(os.path.join(d, f.name) for d, f in
+                          walk_files_remotely(service, 'share', pattern))
+
+        service = _FileTreeService(paths)
+        self.assertEqual(_walk(service, 'apple/f*'), ['apple/fig/file_1', 'apple/file_0'])
+        # the start directory is listed with the rest of the prefix
+        self.assertEqual(service.listings, [('apple', 'f'), ('apple/fig', None)])
+
+        service = _FileTreeService(paths)
+        self.assertEqual(_walk(service, None), sorted(paths))
+        self.assertEqual(service.listings[0], ('', None))
+
+        # a pattern in a directory that does not exist matches nothing
+        service = _FileTreeService(paths)
+        self.assertEqual(_walk(service, 'cherry/*'), [])
+        self.assertEqual(service.listings, [('cherry', None)])
+
+        service = _FileTreeService20150405(paths)
+        with mock.patch('azure.cli.command_modules.storage.util.supported_api_version',
+                        return_value=False):
+            self.assertEqual(_walk(service, 'apple/f*'), ['apple/fig/file_1', 'apple/file_0'])
+        self.assertEqual(service.listings, [('apple', None), ('apple/fig', None)])
+
+    def test_get_pattern_prefix(self):
+        self.assertEqual(get_pattern_prefix('apple/*'), 'apple/')
+        self.assertEqual(get_pattern_prefix('apple/f?le_[0-9]'), 'apple/f')
+        self.assertEqual(get_pattern_prefix('readme'), 'readme')
+        self.assertIsNone(get_pattern_prefix('*/file_0'))
+        self.assertIsNone(get_pattern_prefix(None))
+
+    def test_group_items(self):
+        sizes = [10] * 40 + [5 * 1024 * 1024] + [4 * 1024 * 1024] * 3
+        groups = list(group_items(TransferItem(None, None, size, None) for size in sizes))
+        self.assertEqual([len(g) for g in groups], [32, 1, 1, 1, 1, 8])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -19,20 +19,19 @@ def read_content_if_is_file(string_or_file):
 
 def _resolve_api_version(provider_namespace, resource_type, parent_path):
     from azure.cli.core.commands.client_factory import get_mgmt_service_client
+    from azure.cli.core.commands.provider_cache import get_api_versions
     from azure.cli.core.profiles import ResourceType
     client = get_mgmt_service_client(ResourceType.MGMT_RESOURCE_RESOURCES)
-    provider = client.providers.get(provider_namespace)
 
     # If available, we will use parent resource's api-version
     resource_type_str = (parent_path.split('/')[0] if parent_path else resource_type)
 
-    rt = [t for t in provider.resource_types  # pylint: disable=no-member
-          if t.resource_type.lower() == resource_type_str.lower()]
-    if not rt:
+    api_versions = get_api_versions(client, provider_namespace, resource_type_str)
+    if api_versions is None:
         raise CLIError('Resource type {} not found.'.format(resource_type_str))
-    if len(rt) == 1 and rt[0].api_versions:
-        npv = [v for v in rt[0].api_versions if 'preview' not in v.lower()]
-        return npv[0] if npv else rt[0].api_versions[0]
+    if api_versions:
+        npv = [v for v in api_versions if 'preview' not in v.lower()]
+        return npv[0] if npv else api_versions[0]
     else:
         raise CLIError(
             'API version is required and could not be resolved for resource {}'
@@ -52,9 +51,12 @@ def check_existence(value, resource_group, provider_namespace, resource_type,
                     parent_name=None, parent_type=None):
     # check for name or ID and set the type flags
     from azure.cli.core.commands.client_factory import get_mgmt_service_client
+    from azure.cli.core.commands.provider_cache import (invalidate_api_versions,
+                                                        is_api_version_error)
     from msrestazure.azure_exceptions import CloudError
     from azure.cli.core.profiles import ResourceType
-    resource_client = get_mgmt_service_client(ResourceType.MGMT_RESOURCE_RESOURCES).resources
+    client = get_mgmt_service_client(ResourceType.MGMT_RESOURCE_RESOURCES)
+    resource_client = client.resources
 
     id_parts = parse_resource_id(value)
 
@@ -71,6 +73,16 @@ def check_existence(value, resource_group, provider_namespace, resource_type,
         resource_type = id_parts.get('type', resource_type)
     api_version = _resolve_api_version(provider_namespace, resource_type, parent_path)
 
+    try:
+        resource_client.get(rg, ns, parent_path, resource_type, resource_name, api_version)
+        return True
+    except CloudError as ex:
+        if not is_api_version_error(ex):
+            return False
+
+    # the cached API versions are out of date
+    invalidate_api_versions(client, provider_namespace)
+    api_version = _resolve_api_version(provider_namespace, resource_type, parent_path)
     try:
         resource_client.get(rg, ns, parent_path, resource_type, resource_name, api_version)
         return True
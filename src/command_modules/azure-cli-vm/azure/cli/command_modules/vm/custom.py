@@ -23,6 +23,7 @@ from azure.keyvault import KeyVaultId
 from azure.cli.core.commands import LongRunningOperation
 from azure.cli.core.commands.arm import parse_resource_id, resource_id, is_valid_resource_id
 from azure.cli.core.commands.client_factory import get_mgmt_service_client, get_data_service_client
+from azure.cli.core.extensions.query import get_query_pushdown
 from azure.cli.core.util import CLIError
 import azure.cli.core.azlogging as azlogging
 from azure.cli.core.profiles import get_sdk, ResourceType
@@ -157,8 +158,10 @@ def list_vm(resource_group_name=None, show_details=False):
     ccf = _compute_client_factory()
     vm_list = ccf.virtual_machines.list(resource_group_name=resource_group_name) \
         if resource_group_name else ccf.virtual_machines.list_all()
+    # The service can't filter VMs, but a --query like [:10] needs only the first pages
+    vm_list = get_query_pushdown().limit_results(vm_list)
     if show_details:
-        return [get_vm_details(_parse_rg_name(v.id)[0], v.name) for v in vm_list]
+        return _get_vms_details(list(vm_list), resource_group_name)
     else:
         return list(vm_list)
 
@@ -173,22 +176,76 @@ def show_vm(resource_group_name, vm_name, show_details=False):
 def get_vm_details(resource_group_name, vm_name):
     result = get_instance_view(resource_group_name, vm_name)
     network_client = get_mgmt_service_client(ResourceType.MGMT_NETWORK)
+
+    def _get_nic(nic_id):
+        nic_parts = parse_resource_id(nic_id)
+        return network_client.network_interfaces.get(nic_parts['resource_group'],
+                                                     nic_parts['name'])
+
+    def _get_public_ip(public_ip_id):
+        res = parse_resource_id(public_ip_id)
+        return network_client.public_ip_addresses.get(res['resource_group'], res['name'])
+
+    return _set_vm_details(result, _get_nic, _get_public_ip)
+
+
+def _get_vms_details(vms, resource_group_name=None):
+    ''' Bulk version of get_vm_details: NICs and public IPs are listed once for the resource
+    group of the VMs (or the subscription) and joined by ID, and instance views are retrieved
+    concurrently. '''
+    from concurrent.futures import ThreadPoolExecutor
+    if len(vms) <= 1:
+        return [get_vm_details(_parse_rg_name(v.id)[0], v.name) for v in vms]
+
+    network_client = get_mgmt_service_client(ResourceType.MGMT_NETWORK)
+    with ThreadPoolExecutor(max_workers=40) as executor:
+        if resource_group_name:
+            nics = executor.submit(
+                lambda: list(network_client.network_interfaces.list(resource_group_name)))
+            public_ips = executor.submit(
+                lambda: list(network_client.public_ip_addresses.list(resource_group_name)))
+        else:
+            nics = executor.submit(lambda: list(network_client.network_interfaces.list_all()))
+            public_ips = executor.submit(
+                lambda: list(network_client.public_ip_addresses.list_all()))
+        instance_views = list(executor.map(
+            lambda v: get_instance_view(_parse_rg_name(v.id)[0], v.name), vms))
+        nic_lookup = {n.id.lower(): n for n in nics.result()}
+        public_ip_lookup = {p.id.lower(): p for p in public_ips.result()}
+
+    def _get_nic(nic_id):
+        # Fall back to a GET for anything in another resource group or created after the listing
+        nic = nic_lookup.get(nic_id.lower())
+        if nic is None:
+            nic_parts = parse_resource_id(nic_id)
+            nic = network_client.network_interfaces.get(nic_parts['resource_group'],
+                                                        nic_parts['name'])
+        return nic
+
+    def _get_public_ip(public_ip_id):
+        public_ip = public_ip_lookup.get(public_ip_id.lower())
+        if public_ip is None:
+            res = parse_resource_id(public_ip_id)
+            public_ip = network_client.public_ip_addresses.get(res['resource_group'], res['name'])
+        return public_ip
+
+    return [_set_vm_details(v, _get_nic, _get_public_ip) for v in instance_views]
+
+
+def _set_vm_details(result, get_nic, get_public_ip):
     public_ips = []
     fqdns = []
     private_ips = []
     mac_addresses = []
     # pylint: disable=line-too-long,no-member
     for nic_ref in result.network_profile.network_interfaces:
-        nic_parts = parse_resource_id(nic_ref.id)
-        nic = network_client.network_interfaces.get(nic_parts['resource_group'], nic_parts['name'])
+        nic = get_nic(nic_ref.id)
         if nic.mac_address:
             mac_addresses.append(nic.mac_address)
         for ip_configuration in nic.ip_configurations:
             private_ips.append(ip_configuration.private_ip_address)
             if ip_configuration.public_ip_address:
-                res = parse_resource_id(ip_configuration.public_ip_address.id)
-                public_ip_info = network_client.public_ip_addresses.get(res['resource_group'],
-                                                                        res['name'])
+                public_ip_info = get_public_ip(ip_configuration.public_ip_address.id)
                 if public_ip_info.ip_address:
                     public_ips.append(public_ip_info.ip_address)
                 if public_ip_info.dns_settings:
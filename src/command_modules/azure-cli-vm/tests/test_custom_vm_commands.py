@@ -15,7 +15,7 @@ from azure.cli.command_modules.vm.custom import (_get_access_extension_upgrade_i
                                                  _WINDOWS_ACCESS_EXT,
                                                  _get_extension_instance_name)
 from azure.cli.command_modules.vm.custom import \
-    (attach_unmanaged_data_disk, detach_data_disk, get_vmss_instance_view)
+    (attach_unmanaged_data_disk, detach_data_disk, get_vmss_instance_view, list_vm)
 from azure.cli.command_modules.vm.disk_encryption import (enable,
                                                           disable,
                                                           _check_encrypt_is_supported)
@@ -356,6 +356,70 @@ class Test_Vm_Custom(unittest.TestCase):
         # assert
         self.assertEqual(result, 'extension1')
 
+    @mock.patch('azure.cli.command_modules.vm.custom.get_mgmt_service_client', autospec=True)
+    @mock.patch('azure.cli.command_modules.vm.custom.get_instance_view', autospec=True)
+    @mock.patch('azure.cli.command_modules.vm.custom._compute_client_factory', autospec=True)
+    def test_list_vm_show_details(self, compute_client_factory_mock, get_instance_view_mock,
+                                  network_client_factory_mock):
+        sub = '/subscriptions/00000000-0000-0000-0000-000000000000/resourceGroups/rg1/providers/'
+        vms = [mock.MagicMock(id=sub + 'Microsoft.Compute/virtualMachines/vm' + str(i))
+               for i in range(2)]
+        for i, vm in enumerate(vms):
+            vm.name = 'vm' + str(i)
+        compute_client_factory_mock.return_value.virtual_machines.list_all.return_value = vms
+
+        def _instance_view(resource_group_name, vm_name):
+            view = mock.MagicMock()
+            view.name = vm_name
+            nic_ref = mock.MagicMock(id=sub + 'Microsoft.Network/networkInterfaces/' + vm_name)
+            view.network_profile.network_interfaces = [nic_ref]
+            view.instance_view.statuses = [InstanceViewStatus(code='PowerState/running',
+                                                              display_status='VM running')]
+            return view
+        get_instance_view_mock.side_effect = _instance_view
+
+        public_ip = mock.MagicMock(id=sub + 'Microsoft.Network/publicIPAddresses/ip0',
+                                   ip_address='1.2.3.4')
+        public_ip.dns_settings.fqdn = 'vm0.westus.cloudapp.azure.com'
+        ip_config = mock.MagicMock(private_ip_address='10.0.0.4')
+        # NIC and public IP IDs are matched regardless of casing
+        ip_config.public_ip_address.id = public_ip.id.upper()
+        nic = mock.MagicMock(id=sub + 'Microsoft.Network/networkInterfaces/VM0',
+                             mac_address='00-0D-3A', ip_configurations=[ip_config])
+        network_client = network_client_factory_mock.return_value
+        network_client.network_interfaces.list_all.return_value = [nic]
+        network_client.public_ip_addresses.list_all.return_value = [public_ip]
+        network_client.network_interfaces.get.return_value = mock.MagicMock(
+            mac_address=None, ip_configurations=[])
+
+        # action
+        result = list_vm(show_details=True)
+
+        # assert
+        self.assertEqual([r.name for r in result], ['vm0', 'vm1'])
+        self.assertEqual(result[0].power_state, 'VM running')
+        self.assertEqual(result[0].public_ips, '1.2.3.4')
+        self.assertEqual(result[0].fqdns, 'vm0.westus.cloudapp.azure.com')
+        self.assertEqual(result[0].private_ips, '10.0.0.4')
+        self.assertEqual(result[0].mac_addresses, '00-0D-3A')
+        self.assertEqual(result[1].private_ips, '')
+        # only the NIC missing from the listing is retrieved individually
+        network_client.network_interfaces.get.assert_called_once_with('rg1', 'vm1')
+        self.assertFalse(network_client.public_ip_addresses.get.called)
+
+        # with a resource group, only the NICs and public IPs of that group are listed
+        compute_client_factory_mock.return_value.virtual_machines.list.return_value = vms
+        network_client.reset_mock()
+        network_client.network_interfaces.list.return_value = [nic]
+        network_client.public_ip_addresses.list.return_value = [public_ip]
+        result = list_vm(resource_group_name='rg1', show_details=True)
+        self.assertEqual(result[0].public_ips, '1.2.3.4')
+        network_client.network_interfaces.list.assert_called_once_with('rg1')
+        network_client.public_ip_addresses.list.assert_called_once_with('rg1')
+        self.assertFalse(network_client.network_interfaces.list_all.called)
+        self.assertFalse(network_client.public_ip_addresses.list_all.called)
+        network_client.network_interfaces.get.assert_called_once_with('rg1', 'vm1')
+
 
 class FakedVM:  # pylint: disable=too-few-public-methods,old-style-class
     def __init__(self, nics=None, disks=None, os_disk=None):